@@ -0,0 +1,156 @@
+"""
+批量录入人脸数据的命令行工具。
+
+照片按“学号_姓名.jpg”命名（也支持“学号-姓名.jpg”），放在同一个目录（可含子目录）中。
+程序使用进程池在多个CPU核心上并行提取人脸特征，再分块批量写入数据库，最后生成一份CSV报告，
+列出每张照片的处理结果：saved（已保存）、skipped（文件名不合法，已跳过）、duplicate（学号或姓名重复）、failed（提取特征或写入失败）。
+
+用法：
+    python BatchImport.py 照片目录 [--workers 4] [--chunk-size 500] [--report import_report.csv] [--storage mysql]
+"""
+import argparse
+import concurrent.futures
+import csv
+import os
+import sys
+
+import face_recognition
+
+# 支持的照片扩展名
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def parse_filename(path):
+    """
+    从照片文件名中解析学号和姓名，校验规则与界面中的“提交”按钮一致：学号必须是数字，姓名必须是字母。
+    返回(id, name)；文件名不合法时返回None。
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for sep in ('_', '-'):
+        if sep in stem:
+            id_val, name_val = (part.strip() for part in stem.split(sep, 1))
+            if id_val.isdigit() and name_val and name_val.replace(' ', '').isalpha():
+                return id_val, name_val
+            return None
+    return None
+
+
+def encode_image(path):
+    """
+    在进程池的工作进程中提取一张照片的人脸特征编码。
+
+    照片中必须恰好有一张人脸。返回(path, encoding, 错误信息)，成功时错误信息为None，失败时encoding为None。
+    """
+    try:
+        image = face_recognition.load_image_file(path)
+        locations = face_recognition.face_locations(image)
+        if len(locations) == 0:
+            return path, None, "未检测到人脸"
+        if len(locations) > 1:
+            return path, None, f"检测到{len(locations)}张人脸"
+        return path, face_recognition.face_encodings(image, known_face_locations=locations)[0], None
+    except Exception as e:
+        return path, None, f"无法读取照片: {e}"
+
+
+def find_images(directory):
+    # 递归查找目录中的所有照片，按路径排序保证结果可复现
+    images = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTS):
+                images.append(os.path.join(root, name))
+    return sorted(images)
+
+
+def run_import(directory, facetools, workers=None, chunk_size=500):
+    """
+    执行一次批量录入，返回报告行列表，每行为(照片路径, 学号, 姓名, 状态, 原因)。
+
+    参数:
+    - directory: 照片目录。
+    - facetools: FaceTools实例，通过其add_Faces方法分块写入数据库。
+    - workers: 进程池的进程数，默认为None，表示使用CPU核心数。
+    - chunk_size: 每个事务插入的记录数量。
+    """
+    report = []
+    existing = facetools.facesql.allFaceKeys()
+    if existing is None:
+        raise RuntimeError("无法读取数据库中已有的学号和姓名")
+    seen_ids = {str(row[0]) for row in existing}
+    seen_names = {row[1] for row in existing}
+
+    # 先解析文件名并排除重复，只把需要录入的照片交给进程池
+    pending = {}
+    for path in find_images(directory):
+        key = parse_filename(path)
+        if key is None:
+            report.append((path, "", "", "skipped", "文件名不符合“学号_姓名”格式"))
+            continue
+        id_val, name_val = key
+        if id_val in seen_ids or name_val in seen_names:
+            report.append((path, id_val, name_val, "duplicate", "学号或姓名已存在"))
+            continue
+        seen_ids.add(id_val)
+        seen_names.add(name_val)
+        pending[path] = key
+
+    faces = []
+    paths = {}
+    total = len(pending)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for done, (path, encoding, error) in enumerate(
+                executor.map(encode_image, list(pending), chunksize=8), 1):
+            id_val, name_val = pending[path]
+            if error is not None:
+                report.append((path, id_val, name_val, "failed", error))
+            else:
+                faces.append((encoding, id_val, name_val))
+                paths[(id_val, name_val)] = path
+            if done % 50 == 0 or done == total:
+                print(f"已提取 {done}/{total} 张照片的人脸特征")
+
+    saved, failed = facetools.add_Faces(faces, chunk_size=chunk_size)
+    for key in saved:
+        report.append((paths[key], key[0], key[1], "saved", ""))
+    for key, error in failed:
+        report.append((paths[key], key[0], key[1], "failed", f"写入数据库失败: {error}"))
+    return report
+
+
+def write_report(report, path):
+    # 使用带BOM的UTF-8编码，方便直接用Excel打开
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(["path", "id", "name", "status", "reason"])
+        writer.writerows(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从照片目录批量录入人脸数据")
+    parser.add_argument("directory", help="照片目录，照片按“学号_姓名.jpg”命名")
+    parser.add_argument("--workers", type=int, default=None, help="提取特征使用的进程数，默认为CPU核心数")
+    parser.add_argument("--chunk-size", type=int, default=500, help="每个事务插入的记录数量")
+    parser.add_argument("--report", default="import_report.csv", help="处理结果报告的保存路径")
+    parser.add_argument("--storage", default=os.environ.get("FACE_STORAGE", "mysql"),
+                        help="存储后端：mysql或sqlite:路径，默认读取环境变量FACE_STORAGE")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"照片目录不存在: {args.directory}")
+        sys.exit(1)
+
+    from FaceStorage import open_storage
+    from FaceTool import FaceTools
+    report = run_import(args.directory, FaceTools(open_storage(args.storage)), workers=args.workers, chunk_size=args.chunk_size)
+    write_report(report, args.report)
+
+    counts = {}
+    for row in report:
+        counts[row[3]] = counts.get(row[3], 0) + 1
+    print("录入完成：" + "，".join(f"{status} {count}" for status, count in sorted(counts.items())))
+    print(f"详细结果已保存到 {args.report}")
+
+
+if __name__ == "__main__":
+    main()
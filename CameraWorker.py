@@ -0,0 +1,218 @@
+import threading
+import cv2
+from PyQt5 import QtGui
+from PyQt5.QtCore import QThread, pyqtSignal
+from FaceMetrics import CAPTURE_SECONDS, FRAMES_TOTAL
+# FrameStats和LatestFrameQueue不依赖Qt，放在FrameQueue模块中，无界面的FaceService也可以使用
+from FrameQueue import FrameStats, LatestFrameQueue, READ_FAILURE_LIMIT
+from FramePreview import PreviewRenderer
+
+
+# 定义一个名为CaptureWorker的线程类，在后台线程中持续读取摄像头画面并放入最新帧队列
+class CaptureWorker(QThread):
+    # 摄像头打开失败或读取出错时发出，参数为错误信息
+    error = pyqtSignal(str)
+
+    def __init__(self, frame_queue, device=0, parent=None):
+        """
+        类的构造函数。
+
+        参数:
+        - frame_queue: LatestFrameQueue实例，读取到的画面放入该队列。
+        - device: 摄像头设备编号或视频文件路径，默认为0（默认摄像头）。
+        - parent: Qt父对象。
+
+        摄像头在线程内部打开和释放，cap.read()的阻塞不会影响界面线程。
+        读取失败时逐渐延长等待时间（最长200毫秒），连续失败READ_FAILURE_LIMIT次后发出error信号并退出。
+        """
+        super(CaptureWorker, self).__init__(parent)
+        self.frame_queue = frame_queue
+        self.device = device
+        self.stats = FrameStats("采集")
+        self._running = False
+
+    def start(self):
+        # 在启动线程之前设置运行标志，run开始之前调用stop也能让线程立即退出
+        self._running = True
+        super(CaptureWorker, self).start()
+
+    def run(self):
+        cap = cv2.VideoCapture(self.device)
+        if not cap.isOpened():
+            self.error.emit("无法打开摄像头")
+            return
+        failures = 0
+        try:
+            while self._running:
+                with CAPTURE_SECONDS.time():
+                    ret, frame = cap.read()
+                if not ret:
+                    self.stats.drop()
+                    failures += 1
+                    if failures >= READ_FAILURE_LIMIT:
+                        self.error.emit("无法读取摄像头画面，摄像头可能已断开")
+                        return
+                    self.msleep(min(10 * failures, 200))
+                    continue
+                failures = 0
+                self.stats.tick()
+                FRAMES_TOTAL.inc()
+                self.frame_queue.put(frame)
+        finally:
+            cap.release()
+
+    def stop(self):
+        """
+        通知线程退出循环并等待其结束。
+        """
+        self._running = False
+        self.wait()
+
+
+# 定义一个名为DetectionWorker的线程类，从最新帧队列中取出画面，完成人脸检测和显示图像的转换
+class DetectionWorker(QThread):
+    # 生成一帧预览时发出：显示用的QImage、最近一帧检测到的全部人脸(完整画面, 人脸框列表)（未检测到时为None）
+    frameReady = pyqtSignal(QtGui.QImage, object)
+    # 自动识别模式下确认身份时发出，参数为(学号, 姓名, 距离)
+    recognized = pyqtSignal(object)
+    # 完成一次点击识别（request_recognition）时发出，参数为AutoRecognizer.identify的返回值
+    identified = pyqtSignal(object)
+    # 点击识别出错时发出，参数为错误信息
+    identifyFailed = pyqtSignal(str)
+
+    def __init__(self, frame_queue, detector, preview=None, parent=None):
+        """
+        类的构造函数。
+
+        参数:
+        - frame_queue: LatestFrameQueue实例，从中读取CaptureWorker采集到的画面。
+        - detector: FaceDetector.FaceDetector实例，负责降采样、ROI搜索和静止画面跳帧，只在本线程中使用。
+        - preview: FramePreview.PreviewRenderer实例，决定预览的大小和最高帧率，默认为None，表示640x480、15帧/秒。
+        - parent: Qt父对象。
+
+        人脸检测和预览图像的生成都在本线程中完成，界面线程只负责把QImage设置到标签上。
+        每一帧都做检测（自动识别也按检测帧率进行），预览按preview的最高帧率生成：画面直接缩小到标签大小，
+        Qt支持Format_BGR888时不做颜色转换，QImage直接引用预览缓冲区而不复制。
+        为保证缓冲区在界面线程用完之前不被覆盖，上一帧预览被界面取走（调用preview_shown）之前不会生成新的预览。
+        auto_recognizer为可选的FaceTracker.AutoRecognizer实例，设置后每帧的全部检测结果都会交给它跟踪和识别，
+        只在本线程中使用，界面线程通过set_auto_recognizer切换。
+        点击识别（request_recognition）同样在本线程中提取编码和检索人脸库，结果通过identified信号交给界面线程。
+        """
+        super(DetectionWorker, self).__init__(parent)
+        self.frame_queue = frame_queue
+        self.detector = detector
+        self.auto_recognizer = None
+        self.stats = FrameStats("检测")
+        self.preview_stats = FrameStats("预览")
+        self._bgr888 = hasattr(QtGui.QImage, "Format_BGR888")
+        self.preview = preview if preview is not None else PreviewRenderer()
+        self.preview.bgr = self._bgr888
+        self._preview_pending = False
+        self._running = False
+        # 界面线程请求切换的自动识别器，(识别器,)形式，None表示没有待处理的切换
+        self._auto_switch = None
+        # 界面线程请求的点击识别，(识别器, 完整画面, 人脸框列表)形式，None表示没有待处理的请求
+        self._identify_request = None
+        self._auto_lock = threading.Lock()
+
+    def start(self):
+        # 与CaptureWorker相同，运行标志在启动线程之前设置
+        self._running = True
+        super(DetectionWorker, self).start()
+
+    def run(self):
+        while self._running:
+            # 点击识别的请求在取下一帧之前处理，最多等待一次队列超时（0.1秒）
+            self._handle_identify_request()
+            frame = self.frame_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            faces = self.detector.detect(frame)
+
+            # 自动识别模式：把原始画面和全部检测结果交给自动识别器
+            self._apply_auto_switch()
+            auto_recognizer = self.auto_recognizer
+            if auto_recognizer is not None:
+                for event in auto_recognizer.process(frame, faces):
+                    self.recognized.emit(event)
+
+            boxes = [tuple(int(v) for v in box) for box in faces]
+            self.stats.tick()
+
+            # 预览限速：界面还没有显示上一帧，或距离上一帧预览的时间不足时，本帧只做检测
+            if self._preview_pending or not self.preview.due():
+                continue
+
+            # 人脸框画在缩小后的预览图像上，原始画面保持不变，供后续根据人脸框直接提取特征编码
+            image = self.preview.render(frame, boxes)
+            h, w, ch = image.shape
+            image_format = QtGui.QImage.Format_BGR888 if self._bgr888 else QtGui.QImage.Format_RGB888
+            qimg = QtGui.QImage(image.data, w, h, ch * w, image_format)
+            self._preview_pending = True
+            self.preview_stats.tick()
+            self.frameReady.emit(qimg, (frame, boxes) if boxes else None)
+
+    def set_auto_recognizer(self, recognizer):
+        """
+        开启（recognizer为AutoRecognizer实例）或关闭（recognizer为None）自动识别，由界面线程调用，立即返回。
+
+        切换在检测线程处理下一帧之前完成：新的识别器先在检测线程中清空已有的轨迹再开始使用，
+        因此reset不会与正在进行的process同时执行。
+        """
+        with self._auto_lock:
+            self._auto_switch = (recognizer,)
+
+    def _apply_auto_switch(self):
+        # 在检测线程中执行界面线程请求的切换
+        with self._auto_lock:
+            switch, self._auto_switch = self._auto_switch, None
+        if switch is None:
+            return
+        recognizer, = switch
+        if recognizer is not None:
+            recognizer.reset()
+        self.auto_recognizer = recognizer
+
+    def request_recognition(self, recognizer, frame, boxes):
+        """
+        请求对一帧画面中的全部人脸做一次识别（界面的“识别”按钮），由界面线程调用，立即返回。
+
+        参数:
+        - recognizer: AutoRecognizer实例，在检测线程中调用它的identify方法，与自动识别使用同一个编码器和识别结果缓存。
+        - frame: 完整画面。
+        - boxes: 画面中的人脸框列表。
+
+        提取编码和检索人脸库（必要时从数据库重新加载）都在检测线程中完成，完成后发出identified信号，出错时发出identifyFailed信号。
+        上一次请求尚未处理时被新的请求替换。
+        """
+        with self._auto_lock:
+            self._identify_request = (recognizer, frame, boxes)
+
+    def _handle_identify_request(self):
+        # 在检测线程中执行界面线程请求的点击识别
+        with self._auto_lock:
+            request, self._identify_request = self._identify_request, None
+        if request is None:
+            return
+        recognizer, frame, boxes = request
+        try:
+            outcome = recognizer.identify(frame, boxes)
+        except Exception as e:
+            self.identifyFailed.emit(f"识别失败: {e}")
+            return
+        self.identified.emit(outcome)
+
+    def preview_shown(self):
+        """
+        由界面线程在把预览QImage转换为QPixmap之后调用，表示预览缓冲区可以重新使用。
+        """
+        self._preview_pending = False
+
+    def stop(self):
+        """
+        通知线程退出循环、唤醒可能阻塞在队列上的等待并等待线程结束。
+        """
+        self._running = False
+        self.frame_queue.close()
+        self.wait()
@@ -0,0 +1,150 @@
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 工作进程中缓存的共享内存映射：共享内存名称 -> SharedMemory，同一个槽位只在第一次使用时打开
+_attached = {}
+# 工作进程中使用的编码函数，由_init_worker设置
+_encoder = None
+
+
+def _init_worker(encoder):
+    # 工作进程启动时执行一次：导入编码函数并加载face_recognition的模型，之后每个任务直接调用
+    global _encoder
+    if encoder is None:
+        from FaceEncoder import encode_face, load_models
+        load_models()
+        encoder = encode_face
+    _encoder = encoder
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _encode_in_worker(name, shape, box, margin):
+    # 在工作进程中执行：直接在共享内存上构造画面数组（不复制、不经过pickle），提取一张人脸的特征编码
+    shm = _attach(name)
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    encoding = _encoder(frame, box, margin)
+    # 结果只有128个浮点数，通过pickle返回的开销可以忽略
+    return None if encoding is None else np.asarray(encoding)
+
+
+# 定义一个名为FrameSlot的类，表示进程间共享的一块画面缓冲区
+class FrameSlot:
+    def __init__(self, nbytes):
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.nbytes = nbytes
+
+    def write(self, frame):
+        """
+        把画面复制到共享内存中，返回画面的形状；画面大于缓冲区时先重新分配。
+        """
+        if frame.nbytes > self.nbytes:
+            self.release()
+            self.__init__(frame.nbytes)
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf)
+        np.copyto(view, frame)
+        return frame.shape
+
+    def release(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# 定义一个名为EncoderPool的类，使用进程池在多个CPU核心上并行提取同一帧画面中所有人脸的特征编码
+class EncoderPool:
+    def __init__(self, workers=None, slots=2, frame_bytes=1920 * 1080 * 3, encoder=None, margin=0.25):
+        """
+        类的构造函数。
+
+        参数:
+        - workers: 工作进程数量，默认为None，表示CPU核心数减1（至少为1），给采集和界面线程留出一个核心。
+        - slots: 共享内存画面缓冲区的数量，即可以同时处理的画面数，默认为2。
+        - frame_bytes: 每个缓冲区的初始大小（字节），默认可以容纳一帧1080p的BGR画面，遇到更大的画面时自动扩大。
+        - encoder: 工作进程中使用的编码函数，签名与FaceEncoder.encode_face相同，必须是可以按名称导入的模块级函数；
+          默认为None，表示使用FaceEncoder.encode_face。
+        - margin: 传给编码函数的人脸框外扩比例，默认为0.25。
+
+        画面只复制一次到共享内存，各个工作进程直接在共享内存上读取画面，画面本身不经过pickle；
+        每张人脸作为一个任务提交，只传递共享内存名称、画面形状和人脸框。
+        工作进程以spawn方式启动（Windows上的默认方式），不会继承界面进程中的Qt线程和数据库连接，
+        face_recognition的模型在每个工作进程启动时加载一次。
+        """
+        if workers is None:
+            workers = max(1, (os.cpu_count() or 2) - 1)
+        self.workers = workers
+        self.margin = margin
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(encoder,))
+        self._slots = [FrameSlot(frame_bytes) for _ in range(slots)]
+        self._free = queue.Queue()
+        for slot in self._slots:
+            self._free.put(slot)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        提前启动全部工作进程（进程池默认在第一次提交任务时才启动进程），避免第一次识别时等待模型加载。
+        """
+        futures = [self._executor.submit(os.getpid) for _ in range(self.workers)]
+        concurrent.futures.wait(futures)
+
+    def encode_all(self, frame, boxes):
+        """
+        并行提取一帧画面中多张人脸的特征编码。
+
+        参数:
+        - frame: 完整画面（BGR格式，uint8）。
+        - boxes: 人脸框列表，每个元素为(x, y, w, h)。
+
+        返回与boxes等长的列表，无法提取编码的位置为None。
+        所有缓冲区都在使用中时阻塞等待，直到有画面处理完毕。
+        """
+        if not boxes:
+            return []
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        slot = self._free.get()
+        try:
+            shape = slot.write(frame)
+            futures = [self._executor.submit(_encode_in_worker, slot.shm.name, shape,
+                                             tuple(int(v) for v in box), self.margin)
+                       for box in boxes]
+            encodings = []
+            for future in futures:
+                try:
+                    encodings.append(future.result())
+                except Exception as e:
+                    print(f"提取人脸特征失败: {e}")
+                    encodings.append(None)
+            return encodings
+        finally:
+            # 本帧的所有任务都已结束，缓冲区可以交给下一帧使用
+            self._free.put(slot)
+
+    def close(self):
+        """
+        关闭进程池并释放共享内存，退出程序前调用。
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        for slot in self._slots:
+            slot.release()
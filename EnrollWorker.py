@@ -0,0 +1,230 @@
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from FaceStorage import DuplicateRecordError
+from FaceTemplate import build_template
+
+
+# 定义一个名为RetryJournal的类，把暂时无法写入数据库的录入请求保存在本地文件中，数据库恢复或程序重启后继续写入
+class RetryJournal:
+    def __init__(self, path="enroll_journal.jsonl"):
+        """
+        类的构造函数。
+
+        参数:
+        - path: 日志文件路径，默认为当前目录下的enroll_journal.jsonl。
+
+        文件每行是一条JSON记录，包含学号、姓名、特征编码（浮点数列表）、已尝试写入的次数，
+        多张照片录入的记录还包含质量信息。
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        读取日志中所有待写入的记录，文件不存在时返回空列表；无法解析的行（例如断电时写了一半）会被跳过。
+        """
+        entries = []
+        with self._lock:
+            if not os.path.exists(self.path):
+                return entries
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        print(f"跳过无法解析的录入日志: {line.strip()}")
+        return entries
+
+    def save(self, entries):
+        """
+        用entries替换日志的全部内容；entries为空时删除日志文件。
+        先写入临时文件再重命名，保证日志文件始终是完整的。
+        """
+        with self._lock:
+            if not entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + ".tmp", self.path)
+
+
+# 定义一个名为EnrollWorker的类，继承自QThread，在后台线程中提取人脸特征并写入数据库，界面线程提交后立即返回
+class EnrollWorker(QThread):
+    # 写入成功，参数为学号、姓名
+    saved = pyqtSignal(str, str)
+    # 学号或姓名与已有记录重复，参数为学号、姓名
+    duplicate = pyqtSignal(str, str)
+    # 写入失败且不再重试（例如无法提取人脸特征），参数为学号、姓名、错误信息
+    failed = pyqtSignal(str, str, str)
+    # 因数据库暂时不可用而保存在本地日志中等待重试，参数为日志中的记录数量
+    deferred = pyqtSignal(int)
+
+    def __init__(self, facetools, encoder=None, journal=None, batch_window=0.05, max_batch=100,
+                 retry_interval=5.0, max_attempts=20):
+        """
+        类的构造函数。
+
+        参数:
+        - facetools: FaceTools实例，通过其add_Faces方法批量写入数据库并更新内存人脸库。
+        - encoder: 特征提取函数，调用形式为encoder(frame, box)，默认为None，此时只能提交已经提取好的编码。
+        - journal: RetryJournal实例，默认为None，表示使用当前目录下的enroll_journal.jsonl。
+        - batch_window: 收到一个请求后再等待多久（秒）以合并同时到达的其他请求，默认为0.05秒。
+        - max_batch: 一次事务最多写入的记录数，默认为100。
+        - retry_interval: 数据库不可用时重试本地日志中记录的间隔（秒），默认为5秒。
+        - max_attempts: 一条记录最多尝试写入的次数，超过后发出failed信号并从日志中删除，默认为20。
+
+        同一时间窗口内提交的多个请求合并为一次add_Faces调用，只提交一次事务。
+        学号或姓名重复的记录立即发出duplicate信号；其他原因写入失败的记录保存到本地日志中，
+        之后每隔retry_interval秒重试一次，程序重启后也会从日志继续写入。
+        """
+        super().__init__()
+        self.facetools = facetools
+        self.encoder = encoder
+        self.journal = journal if journal is not None else RetryJournal()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue()
+        # 等待重试的记录，与本地日志的内容保持一致
+        self._pending = self.journal.load()
+        self._last_retry = 0.0
+
+    @property
+    def pending(self):
+        """
+        返回本地日志中等待重试的记录数量。
+        """
+        return len(self._pending)
+
+    def submit(self, id_val, name_val, encoding=None, face=None, faces=None):
+        """
+        提交一个录入请求，立即返回，不访问数据库。
+
+        参数:
+        - id_val, name_val: 学号和姓名。
+        - encoding: 已经提取好的人脸特征编码；为None时由后台线程调用encoder(*face)提取。
+        - face: (frame, box)，即完整画面和人脸框，encoding为None时必须提供face或faces之一。
+        - faces: 连拍得到的多个(frame, box)。后台线程逐个提取特征编码，剔除离群样本后合并为一个模板
+          （见FaceTemplate.build_template），只保存这一条记录，质量信息另外保存到存储后端。
+
+        处理结果通过saved、duplicate、failed或deferred信号通知界面线程。
+        """
+        self._queue.put((id_val, name_val, encoding, face, faces))
+
+    def stop(self):
+        """
+        请求线程退出并等待其结束。队列中尚未处理的请求会先保存到本地日志。
+        """
+        self.requestInterruption()
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            timeout = self.retry_interval if self._pending else None
+            try:
+                job = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                job = None
+            jobs = [] if job is None else [job]
+            # 合并时间窗口内同时到达的其他请求，一起写入
+            deadline = time.monotonic() + self.batch_window
+            while jobs and len(jobs) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    break
+                jobs.append(job)
+            entries = [entry for entry in map(self._encode, jobs) if entry is not None]
+            if self._pending and time.monotonic() - self._last_retry >= self.retry_interval:
+                self._last_retry = time.monotonic()
+                entries = self._pending + entries
+                self._pending = []
+            if entries:
+                self._write(entries)
+        # 退出前把队列中剩余的请求保存到本地日志，下次启动时继续写入
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                entry = self._encode(job)
+                if entry is not None:
+                    self._pending.append(entry)
+        self.journal.save(self._pending)
+
+    def _encode(self, job):
+        # 把请求转换为日志记录格式，需要时在后台线程中提取人脸特征
+        id_val, name_val, encoding, face, faces = job
+        if faces:
+            return self._encode_template(id_val, name_val, faces)
+        if encoding is None:
+            try:
+                encoding = self.encoder(*face)
+            except Exception as e:
+                print(f"提取人脸特征失败: {e}")
+                encoding = None
+            if encoding is None:
+                self.failed.emit(id_val, name_val, "无法提取人脸特征，请重试。")
+                return None
+        return {"id": id_val, "name": name_val, "encoding": [float(v) for v in encoding], "attempts": 0}
+
+    def _encode_template(self, id_val, name_val, faces):
+        # 多张照片录入：逐帧提取特征编码，剔除离群样本后合并为一个模板
+        encodings = []
+        for face in faces:
+            try:
+                encodings.append(self.encoder(*face))
+            except Exception as e:
+                print(f"提取人脸特征失败: {e}")
+        try:
+            template, quality = build_template(encodings)
+        except ValueError as e:
+            self.failed.emit(id_val, name_val, str(e))
+            return None
+        return {"id": id_val, "name": name_val, "encoding": [float(v) for v in template], "attempts": 0,
+                "quality": quality}
+
+    def _write(self, entries):
+        # 一次事务写入全部记录，按结果分别发出信号，暂时失败的记录写回本地日志
+        faces = [(np.asarray(entry["encoding"]), entry["id"], entry["name"]) for entry in entries]
+        try:
+            saved, failed = self.facetools.add_Faces(faces, chunk_size=self.max_batch)
+        except Exception as e:
+            saved, failed = [], [((entry["id"], entry["name"]), e) for entry in entries]
+        by_key = {(entry["id"], entry["name"]): entry for entry in entries}
+        for id_val, name_val in saved:
+            quality = by_key[(id_val, name_val)].get("quality")
+            if quality is not None:
+                self.facetools.facesql.saveFaceQuality(id_val, quality)
+            self.saved.emit(id_val, name_val)
+        for key, error in failed:
+            if isinstance(error, DuplicateRecordError):
+                self.duplicate.emit(*key)
+                continue
+            entry = by_key[key]
+            entry["attempts"] += 1
+            if entry["attempts"] >= self.max_attempts:
+                self.failed.emit(key[0], key[1], f"数据插入失败：{error}")
+            else:
+                self._pending.append(entry)
+        self.journal.save(self._pending)
+        if self._pending:
+            self.deferred.emit(len(self._pending))
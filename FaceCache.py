@@ -0,0 +1,190 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+from FaceMetrics import METRICS
+
+CACHE_HITS_TOTAL = METRICS.counter("face_cache_hits_total", "识别结果缓存命中（跳过人脸库检索）的次数")
+CACHE_MISSES_TOTAL = METRICS.counter("face_cache_misses_total", "识别结果缓存未命中的次数")
+DEBOUNCED_TOTAL = METRICS.counter("face_debounced_total", "在防抖时间内被忽略的重复开锁或提示次数")
+
+
+# 定义一个名为RecognitionCache的类，缓存最近的识别结果：与最近识别过的编码足够接近的新编码直接返回缓存的身份，不再检索人脸库
+class RecognitionCache:
+    def __init__(self, gallery=None, epsilon=0.2, ttl=5.0, maxsize=32, clock=time.monotonic):
+        """
+        类的构造函数。
+
+        参数:
+        - gallery: 可选的FaceGallery，人脸库的版本号变化（录入、删除、同步）时清空缓存，避免返回已删除人员的身份。
+        - epsilon: 新编码与缓存编码的距离不超过该值时视为同一个人，默认为0.2，远小于识别阈值0.6。
+        - ttl: 缓存条目的有效时间（秒），默认为5秒，超过后重新检索人脸库。
+        - maxsize: 最多缓存的条目数，超过时淘汰最久未使用的条目，默认为32。
+        - clock: 获取当前时间的函数，默认为time.monotonic。
+
+        同一个人站在门前反复识别时，相邻两次的编码距离通常在0.1左右，直接命中缓存；
+        没有匹配到任何人的结果（None）连同当时人脸库中的最近距离一起缓存，陌生人反复点击识别时同样不再检索人脸库。
+        命中时还要满足三角不等式给出的界（见lookup），保证缓存返回的结果与检索人脸库的结果一致。
+        条目数很少，查找时对所有条目做一次向量化的距离计算即可。
+        """
+        self.gallery = gallery
+        self.epsilon = epsilon
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        # 条目编号 -> (编码, 识别结果, 写入时间, 人脸库中的最近距离)，按最近使用的顺序排列
+        self._entries = collections.OrderedDict()
+        self._next_key = 0
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        # 人脸库内容发生变化后，缓存的识别结果可能已经不正确，全部丢弃
+        if self.gallery is not None and self.gallery.version != self._version:
+            self._entries.clear()
+            self._version = self.gallery.version
+
+    def _expire(self, now):
+        expired = [key for key, (_, _, stored, _) in self._entries.items() if now - stored > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, encoding, tolerance=0.6):
+        """
+        查找与encoding距离不超过epsilon的缓存条目。
+
+        参数:
+        - encoding: 待识别的特征编码。
+        - tolerance: 识别阈值，默认为0.6，与search_gallery相同。
+
+        返回(是否命中, 识别结果)，识别结果为(学号, 姓名, 距离)，未匹配到已知人脸时为None。
+        缓存条目是已匹配的结果时，encoding到该人脸库记录的距离不超过“缓存的距离 + encoding到缓存编码的距离”，
+        只有这个上界不超过tolerance时才命中，返回的距离也是这个上界（不小于实际距离），而不是缓存编码自己的距离。
+        缓存条目是未匹配的结果（None）时，encoding到任意人脸库记录的距离不小于“缓存的最近距离 - encoding到缓存编码的距离”，
+        只有这个下界仍大于tolerance时才命中，保证靠近阈值的陌生人编码不会被当作未匹配而跳过检索。
+        其余情况视为未命中，由调用方检索人脸库。
+        """
+        encoding = np.asarray(encoding, dtype=np.float64)
+        with self._lock:
+            self._check_version()
+            self._expire(self.clock())
+            if self._entries:
+                keys = list(self._entries)
+                matrix = np.vstack([self._entries[key][0] for key in keys])
+                dist = np.linalg.norm(matrix - encoding, axis=1)
+                best = int(dist.argmin())
+                _, result, _, best_distance = self._entries[keys[best]]
+                if result is not None:
+                    id_val, name_val, distance = result
+                    result = (id_val, name_val, distance + float(dist[best]))
+                    bounded = result[2] <= tolerance
+                else:
+                    bounded = best_distance is not None and best_distance - float(dist[best]) > tolerance
+                if dist[best] <= self.epsilon and bounded:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    CACHE_HITS_TOTAL.inc()
+                    return True, result
+            self.misses += 1
+            CACHE_MISSES_TOTAL.inc()
+            return False, None
+
+    def store(self, encoding, result, best_distance=None):
+        """
+        缓存一次检索的结果，result为(学号, 姓名, 距离)或None。
+
+        result为None时，best_distance为该编码到人脸库中最近一条记录的距离，lookup据此判断新编码是否同样匹配不到任何人；
+        默认为None（例如人脸库为空），这样的未匹配结果只占用缓存条目，不会被命中。
+        """
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_key] = (np.asarray(encoding, dtype=np.float64), result, self.clock(), best_distance)
+            self._next_key += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        """
+        返回缓存命中率（0到1之间），尚未查找过时返回0。
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self):
+        return f"缓存命中 {self.hits}/{self.hits + self.misses}（{self.hit_rate:.0%}）"
+
+
+def search_gallery(gallery, encodings, tolerance=0.6, cache=None):
+    """
+    检索一个或多个特征编码对应的身份，先查缓存，只把未命中的编码交给人脸库一次检索。
+
+    参数:
+    - gallery: FaceGallery人脸库。
+    - encodings: 特征编码列表。
+    - tolerance: 识别阈值，默认为0.6。
+    - cache: 可选的RecognitionCache，默认为None，表示不使用缓存。
+
+    返回与encodings等长的列表，每个元素为(学号, 姓名, 距离)，未匹配到已知人脸时为None。
+    """
+    results = [None] * len(encodings)
+    pending = []
+    for i, encoding in enumerate(encodings):
+        if cache is not None:
+            hit, result = cache.lookup(encoding, tolerance)
+            if hit:
+                results[i] = result
+                continue
+        pending.append(i)
+    if not pending:
+        return results
+    matches, ids, names = gallery.search(np.vstack([encodings[i] for i in pending]), k=1)
+    for i, match in zip(pending, matches):
+        if match and match[0][1] <= tolerance:
+            index, distance = match[0]
+            results[i] = (ids[index], names[index], distance)
+        if cache is not None:
+            cache.store(encodings[i], results[i], match[0][1] if match else None)
+    return results
+
+
+# 定义一个名为Debouncer的类，在一段时间内只允许同一件事发生一次，例如防止串口被重复的开锁指令刷屏
+class Debouncer:
+    def __init__(self, interval=3.0, clock=time.monotonic):
+        """
+        类的构造函数。
+
+        参数:
+        - interval: 同一个键两次被允许之间的最短间隔（秒），默认为3秒。
+        - clock: 获取当前时间的函数，默认为time.monotonic。
+        """
+        self.interval = interval
+        self.clock = clock
+        self._last = {}
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def allow(self, key=None):
+        """
+        距离键key上一次被允许已超过interval秒时返回True并记录本次时间，否则返回False。
+        """
+        now = self.clock()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self.suppressed += 1
+                DEBOUNCED_TOTAL.inc()
+                return False
+            self._last[key] = now
+            # 只保留仍在防抖时间内的键，避免长时间运行后字典无限增长
+            if len(self._last) > 256:
+                self._last = {k: t for k, t in self._last.items() if now - t < self.interval}
+            return True
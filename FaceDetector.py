@@ -0,0 +1,149 @@
+import collections
+import time
+import cv2
+from FaceMetrics import DETECT_SECONDS, DETECTIONS_TOTAL
+
+
+def face_size_from_geometry(focal_px, distance_m, face_width_m=0.15):
+    """
+    根据摄像头几何参数估算人脸在画面中的宽度（像素）。
+
+    参数:
+    - focal_px: 摄像头焦距（像素），可由标定得到，也可以近似为 画面宽度 / (2 * tan(水平视场角 / 2))。
+    - distance_m: 人脸到摄像头的距离（米）。
+    - face_width_m: 人脸的实际宽度（米），默认为0.15。
+
+    门禁摄像头只拍摄门前固定区域，用最近和最远站立距离分别计算，即可得到检测器的最大和最小人脸尺寸。
+    """
+    return int(round(focal_px * face_width_m / distance_m))
+
+
+# 定义一个名为FaceDetector的类，在Haar检测器外层实现降采样、感兴趣区域（ROI）搜索以及静止画面跳帧
+class FaceDetector:
+    def __init__(self, face_cascade, scale=0.5, scale_factor=1.3, min_neighbors=5,
+                 min_face=None, max_face=None, roi_margin=0.5, full_scan_interval=15,
+                 motion_threshold=2.0):
+        """
+        类的构造函数。
+
+        参数:
+        - face_cascade: 已加载的OpenCV人脸检测器。
+        - scale: 检测前对画面的缩放比例，默认为0.5，即在1/4像素数的画面上检测。
+        - scale_factor, min_neighbors: 传给detectMultiScale的参数，默认与原来保持一致（1.3和5）。
+        - min_face, max_face: 原始画面中人脸的最小/最大宽度（像素），可由face_size_from_geometry根据摄像头几何参数得到，
+                              默认为None表示不限制。
+        - roi_margin: 上一次人脸框向四周扩展的比例，扩展后的区域作为下一帧的搜索范围，默认为0.5。
+        - full_scan_interval: 使用ROI搜索时，每隔多少帧强制做一次全画面扫描，以发现新进入画面的人脸，默认为15。
+        - motion_threshold: 当前帧与最近一次执行检测的画面（均为缩小后的灰度图）平均绝对差低于该值时认为画面静止，
+                            直接沿用上一次的检测结果，默认为2.0；
+                            设置为0表示不跳帧。
+
+        检测结果始终换算回原始画面的坐标，调用方无需关心内部的缩放和裁剪。
+        """
+        self.face_cascade = face_cascade
+        self.scale = scale
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face = min_face
+        self.max_face = max_face
+        self.roi_margin = roi_margin
+        self.full_scan_interval = full_scan_interval
+        self.motion_threshold = motion_threshold
+        self._prev_small = None
+        self._last_faces = []
+        self._since_full_scan = 0
+        # 统计信息：处理的帧数、静止跳过的帧数、ROI搜索的帧数，以及最近若干帧的CPU耗时（毫秒）
+        self.frames = 0
+        self.skipped = 0
+        self.roi_scans = 0
+        self._cpu_ms = collections.deque(maxlen=100)
+
+    @property
+    def cpu_ms(self):
+        """
+        返回最近100帧平均每帧消耗的CPU时间（毫秒，只统计检测线程自身）。
+        """
+        return sum(self._cpu_ms) / len(self._cpu_ms) if self._cpu_ms else 0.0
+
+    def reset(self):
+        self._prev_small = None
+        self._last_faces = []
+        self._since_full_scan = 0
+
+    def detect(self, frame):
+        """
+        在一帧画面（BGR格式）中检测人脸，返回原始画面坐标下的人脸框列表，每个元素为(x, y, w, h)。
+        """
+        start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            faces = self._detect(frame)
+        finally:
+            self._cpu_ms.append((time.thread_time() - start) * 1000)
+            DETECT_SECONDS.observe(time.perf_counter() - wall_start)
+        DETECTIONS_TOTAL.inc(len(faces))
+        return faces
+
+    def _detect(self, frame):
+        self.frames += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = gray
+
+        # 与最近一次真正执行检测的画面相比变化很小时，认为画面静止，沿用上一次的检测结果
+        # （与参照帧而不是上一帧比较，避免缓慢移动时每一帧的差异都低于阈值而一直跳过）
+        prev_small = self._prev_small
+        if (self.motion_threshold > 0 and prev_small is not None and prev_small.shape == small.shape
+                and cv2.absdiff(small, prev_small).mean() < self.motion_threshold):
+            self.skipped += 1
+            return self._last_faces
+        self._prev_small = small
+
+        faces = None
+        self._since_full_scan += 1
+        # 上一帧检测到人脸且未到强制全画面扫描的时间时，只在上一次人脸附近的区域内搜索
+        if self._last_faces and self._since_full_scan < self.full_scan_interval:
+            self.roi_scans += 1
+            faces = self._scan(small, self._roi(small.shape))
+        # ROI内没有找到人脸（人脸可能移出了区域），立即改为全画面扫描
+        if not faces:
+            self._since_full_scan = 0
+            faces = self._scan(small, (0, 0, small.shape[1], small.shape[0]))
+
+        self._last_faces = [
+            tuple(int(round(v / self.scale)) for v in face) for face in faces
+        ]
+        return self._last_faces
+
+    def _roi(self, shape):
+        # 计算上一次所有人脸框的外接矩形，按roi_margin向四周扩展，并换算到缩小后的画面坐标
+        xs = [x for x, _, w, _ in self._last_faces] + [x + w for x, _, w, _ in self._last_faces]
+        ys = [y for _, y, _, h in self._last_faces] + [y + h for _, y, _, h in self._last_faces]
+        pad_x = (max(xs) - min(xs)) * self.roi_margin
+        pad_y = (max(ys) - min(ys)) * self.roi_margin
+        left = max(0, int((min(xs) - pad_x) * self.scale))
+        top = max(0, int((min(ys) - pad_y) * self.scale))
+        right = min(shape[1], int((max(xs) + pad_x) * self.scale) + 1)
+        bottom = min(shape[0], int((max(ys) + pad_y) * self.scale) + 1)
+        return left, top, right - left, bottom - top
+
+    def _scan(self, small, roi):
+        # 在缩小后画面的roi区域内运行Haar检测，返回缩小后画面坐标下的人脸框列表
+        x0, y0, w, h = roi
+        min_size = (0, 0)
+        max_size = (0, 0)
+        if self.min_face:
+            side = max(1, int(self.min_face * self.scale))
+            min_size = (side, side)
+        if self.max_face:
+            side = max(1, int(self.max_face * self.scale))
+            max_size = (side, side)
+        if w < max(min_size[0], 1) or h < max(min_size[1], 1):
+            return []
+        faces = self.face_cascade.detectMultiScale(
+            small[y0:y0 + h, x0:x0 + w], self.scale_factor, self.min_neighbors,
+            minSize=min_size, maxSize=max_size
+        )
+        return [(x + x0, y + y0, fw, fh) for (x, y, fw, fh) in faces]
@@ -0,0 +1,129 @@
+import threading
+import time
+import cv2
+import numpy as np
+from FaceMetrics import ENCODE_SECONDS, MODEL_LOAD_SECONDS
+
+# face_recognition和dlib在第一次使用时才导入（导入时会把几十MB的模型读入内存，需要数秒），
+# 界面程序在后台线程中调用load_models提前加载，窗口不必等待模型加载完成就可以显示
+face_recognition = None
+dlib = None
+_models_lock = threading.Lock()
+
+
+def load_models():
+    """
+    导入face_recognition和dlib并预热特征提取网络，重复调用时直接返回。
+
+    对一张空白图像提取一次特征编码，使网络权重真正读入内存，第一次识别不会因此变慢。
+    多个线程同时调用时只加载一次，其他线程等待加载完成。返回本次加载的耗时（秒），已经加载过时返回0。
+    """
+    global face_recognition, dlib
+    if face_recognition is not None:
+        return 0.0
+    with _models_lock:
+        if face_recognition is not None:
+            return 0.0
+        start = time.perf_counter()
+        import dlib as _dlib
+        import face_recognition as _face_recognition
+        _face_recognition.face_encodings(np.zeros((150, 150, 3), dtype=np.uint8),
+                                         known_face_locations=[(25, 125, 125, 25)])
+        dlib = _dlib
+        face_recognition = _face_recognition
+        elapsed = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.observe(elapsed)
+        return elapsed
+
+
+def models_loaded():
+    """
+    返回特征提取模型是否已经加载完成。
+    """
+    return face_recognition is not None
+
+
+def box_to_location(box):
+    """
+    将OpenCV的人脸框(x, y, w, h)转换为face_recognition使用的(top, right, bottom, left)格式。
+    """
+    x, y, w, h = (int(v) for v in box)
+    return (y, x + w, y + h, x)
+
+
+def encode_face(frame, box, margin=0.25):
+    """
+    根据已知的人脸框提取特征编码，face_recognition内部不再重新检测人脸。
+
+    参数:
+    - frame: 完整的摄像头画面（BGR格式）。
+    - box: Haar检测器得到的人脸框(x, y, w, h)。
+    - margin: 在人脸框四周额外保留的边距（相对于人脸框宽高的比例），默认为0.25，保证关键点定位不受裁剪边缘影响。
+
+    只把人脸框加上边距的区域转换为face_recognition库要求的RGB格式，并通过known_face_locations直接告诉编码器人脸的位置，
+    省去face_encodings内部的第二次人脸检测，也避免了在过紧的裁剪图上检测失败的问题。
+    返回128维编码；如果没有成功提取到特征编码，返回None。
+    """
+    with ENCODE_SECONDS.time():
+        return _encode_face(frame, box, margin)
+
+
+def _crop_face(frame, box, margin):
+    # 裁剪出人脸框加上边距的区域并转换为RGB格式，返回(RGB图像, 人脸在裁剪图中的位置)
+    x, y, w, h = (int(v) for v in box)
+    frame_h, frame_w = frame.shape[:2]
+    left = max(0, x - int(w * margin))
+    top = max(0, y - int(h * margin))
+    right = min(frame_w, x + w + int(w * margin))
+    bottom = min(frame_h, y + h + int(h * margin))
+    rgb_face = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2RGB)
+    return rgb_face, box_to_location((x - left, y - top, w, h))
+
+
+def _encode_face(frame, box, margin):
+    load_models()
+    rgb_face, location = _crop_face(frame, box, margin)
+    face_encs = face_recognition.face_encodings(rgb_face, known_face_locations=[location])
+    if len(face_encs) == 0:
+        return None
+    return face_encs[0]
+
+
+def encode_faces(faces, margin=0.25):
+    """
+    批量提取多张人脸的特征编码。
+
+    参数:
+    - faces: 由(frame, box)组成的列表，可以来自不同的画面。
+    - margin: 含义与encode_face相同。
+
+    先逐张定位人脸关键点（与face_recognition.face_encodings默认一样使用5点模型），
+    再把所有人脸一次交给dlib的批量接口compute_face_descriptor计算编码，
+    深度网络一次处理整批图像，比逐张调用encode_face更能利用多核CPU。
+    安装的dlib版本不支持批量接口时，退回逐张调用encode_face。
+    返回与faces等长的列表，无法提取编码的位置为None。
+    """
+    if not faces:
+        return []
+    load_models()
+    start = time.perf_counter()
+    try:
+        crops = []
+        landmarks = []
+        for frame, box in faces:
+            rgb_face, location = _crop_face(frame, box, margin)
+            crops.append(rgb_face)
+            shapes = dlib.full_object_detections()
+            shapes.append(face_recognition.api._raw_face_landmarks(rgb_face, [location], model="small")[0])
+            landmarks.append(shapes)
+        # num_jitters为1，与face_recognition.face_encodings的默认值一致；每张图像只有一张人脸，取各自的第一个编码
+        descriptors = face_recognition.api.face_encoder.compute_face_descriptor(crops, landmarks, 1)
+        encodings = [np.array(d[0]) for d in descriptors]
+    except (AttributeError, TypeError, RuntimeError) as e:
+        print(f"批量提取人脸特征失败，改为逐张提取: {e}")
+        return [encode_face(frame, box, margin) for frame, box in faces]
+    # 直方图记录的是单张人脸的耗时，批量调用时按人脸数平均
+    per_face = (time.perf_counter() - start) / len(faces)
+    for _ in faces:
+        ENCODE_SECONDS.observe(per_face)
+    return encodings
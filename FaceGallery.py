@@ -0,0 +1,267 @@
+import threading
+import numpy as np
+from FaceMatcher import FaceMatcher
+from FaceMetrics import DB_LOAD_SECONDS, MATCH_SECONDS
+
+# 人脸特征向量的维度，face_recognition输出的编码固定为128维
+FACE_DIM = 128
+
+
+# 定义一个名为FaceGallery的类，作为常驻内存的人脸库，避免每次识别都重新查询并解析整张face表
+class FaceGallery:
+    def __init__(self, facetools, dtype=np.float64, index=None):
+        """
+        类的构造函数，用于初始化内存人脸库。
+
+        参数:
+        - facetools: 一个FaceTools类的实例，人脸库通过它从数据库加载并解码人脸特征编码。
+        - dtype: 特征矩阵的数据类型，默认为float64，与face_recognition输出的编码保持一致，也可以传入float32以节省内存。
+        - index: 可选的FaceIndex检索索引（例如FaceIndex.IVFIndex），默认为None，表示使用精确的暴力比对。
+                 设置后人脸库加载和增量添加时会同步更新索引，search方法改为通过索引检索。
+
+        人脸库内部维护学号列表、姓名列表以及一块连续的(N, 128)特征矩阵，
+        矩阵按容量成倍扩展，新增记录时只需写入末尾一行，而不必重新拼接整个矩阵。
+        version为版本号，人脸库内容每发生一次变化就加1，调用方可据此判断缓存的数据是否已经过期。
+        """
+        self.facetools = facetools
+        self.dtype = np.dtype(dtype)
+        self.ids = []
+        self.names = []
+        # 学号到矩阵行号的映射，增量同步时按学号O(1)定位记录
+        self._row_of = {}
+        # 预分配的特征矩阵缓冲区，只有前len(self.ids)行是有效数据
+        self._buffer = np.empty((0, FACE_DIM), dtype=self.dtype)
+        self.version = 0
+        # 标记人脸库是否需要从数据库重新加载（例如其他进程写入了新的记录）
+        self._stale = True
+        # 缓存的比对器及其对应的人脸库版本号，人脸库未变化时重复使用，避免每次识别重新计算平方范数
+        self._matcher = None
+        self._matcher_version = -1
+        self.index = index
+        # 标记缓冲区是否已经通过snapshot交给了调用方，原地修改前需要先复制一份，保证已发出的快照不被改动
+        self._shared = False
+        # 可重入锁，保证界面线程与后台线程同时读写人脸库时数据一致
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def matrix(self):
+        """
+        返回当前有效的(N, 128)特征矩阵（缓冲区前N行的视图，不会发生复制）。
+        """
+        with self._lock:
+            return self._buffer[:len(self.ids)]
+
+    def load(self, progress=None, index=None):
+        """
+        从数据库加载全部人脸数据，替换人脸库当前的内容。
+
+        参数:
+        - progress: 可选的进度回调函数，原样传给load_face_matrix，调用形式为progress(已加载数量, 总数量)。
+        - index: 可选的、从磁盘加载的检索索引，原样传给replace方法。
+
+        通过facetools的load_face_matrix方法按块流式读取学号、姓名以及解码后的特征矩阵，编码直接解码到人脸库数据类型的矩阵中；
+        存储后端为内存映射快照且数据类型一致时，矩阵直接引用映射的文件而不发生复制。加载完成后清除过期标记并将版本号加1。
+        返回加载到的人脸数量。加载失败时抛出异常，人脸库保持原有的内容。
+        """
+        with DB_LOAD_SECONDS.time():
+            face_ids, face_names, matrix = self.facetools.load_face_matrix(progress=progress, dtype=self.dtype)
+        return self.replace(face_ids, face_names, matrix, index=index)
+
+    def replace(self, face_ids, face_names, matrix, index=None):
+        """
+        用给定的学号、姓名和特征矩阵替换人脸库当前的内容，供load方法和从本地快照恢复人脸库（FaceSync.load_snapshot）使用。
+
+        参数:
+        - face_ids, face_names, matrix: 新的学号列表、姓名列表和(N, 128)特征矩阵。
+        - index: 可选的、从磁盘加载的检索索引（FaceIndex.load_index），默认为None。
+                 与人脸库配置的索引参数相同（FaceIndex.matches_config），并且编码与matrix逐行相同时直接使用，不再重新训练；
+                 否则忽略。
+
+        矩阵的数据类型与人脸库一致时（例如float32人脸库和内存映射的快照）直接引用而不复制，
+        之后第一次修改人脸库时才复制一份。设置了检索索引时重新构建索引（IVF索引只在这里重新训练）。
+        清除过期标记并将版本号加1，返回人脸数量。
+        """
+        buffer = np.asarray(matrix, dtype=self.dtype).reshape(-1, FACE_DIM)
+        if index is not None and not self._index_matches(index, buffer):
+            print("保存的检索索引与人脸库内容或当前配置不一致，重新构建索引")
+            index = None
+        with self._lock:
+            self.ids = list(face_ids)
+            self.names = list(face_names)
+            self._row_of = {face_id: row for row, face_id in enumerate(self.ids)}
+            self._buffer = buffer
+            self._shared = True
+            if index is not None:
+                self.index = index
+            elif self.index is not None:
+                self.index.rebuild(buffer)
+            self._stale = False
+            self.version += 1
+            return len(self.ids)
+
+    def _index_matches(self, index, buffer):
+        # 判断从磁盘加载的索引能否直接用于给定的特征矩阵：参数与当前配置的索引相同，行数和每一行的编码都一致
+        return (self.index is not None and index.matches_config(self.index) and len(index) == len(buffer)
+                and np.array_equal(index.vectors, buffer.astype(np.float32)))
+
+    def save_index(self, path):
+        """
+        把检索索引保存到path（文件路径或已打开的文件对象），保存期间持有锁，保证索引与人脸库的内容对应。
+        没有设置检索索引时返回False。
+        """
+        with self._lock:
+            if self.index is None:
+                return False
+            self.index.save(path)
+            return True
+
+    def refresh(self):
+        """
+        显式刷新人脸库，用于其他进程（例如另一台录入终端）向数据库写入了新记录的情况。
+        等价于重新调用load方法。
+        """
+        return self.load()
+
+    def invalidate(self):
+        """
+        将人脸库标记为过期，下一次调用ensure_loaded时会从数据库重新加载。
+        与refresh不同，该方法本身不访问数据库，适合在无法确定何时读取的场景下调用。
+        """
+        with self._lock:
+            self._stale = True
+
+    def ensure_loaded(self):
+        """
+        如果人脸库尚未加载或已被标记为过期，则从数据库重新加载。
+        加载失败时打印错误信息并继续使用原有的内容，过期标记保留，下一次调用时再次尝试。
+        """
+        if self._stale:
+            try:
+                self.load()
+            except Exception as e:
+                print(f"重新加载人脸库失败: {e}")
+
+    def contains(self, id_val, name_val):
+        """
+        在内存中检查人脸库是否已有该学号或姓名的记录，不访问数据库，供界面在提交前快速提示重复。
+        """
+        with self._lock:
+            return id_val in self._row_of or name_val in self.names
+
+    def add(self, image_face_encoding, id_val, name_val):
+        """
+        向人脸库中增量添加或更新一条人脸记录，通常在add_Face成功写入数据库后或FaceSync拉取到新记录时调用。
+
+        参数:
+        - image_face_encoding: 以numpy数组形式表示的面部特征编码。
+        - id_val: 学号。
+        - name_val: 姓名。
+
+        学号不存在时追加到末尾：缓冲区容量不足时按两倍扩容，已经交给调用方的矩阵视图不受影响，
+        设置了检索索引时同时把该编码增量插入索引。学号已存在时原地更新该行，内容相同则什么也不做，
+        因此同一条记录被重复同步是安全的。
+        人脸库发生变化时版本号加1并返回True，否则返回False。
+        """
+        encoding = np.asarray(image_face_encoding, dtype=self.dtype).reshape(FACE_DIM)
+        with self._lock:
+            row = self._row_of.get(id_val)
+            if row is not None:
+                if self.names[row] == name_val and np.array_equal(self._buffer[row], encoding):
+                    return False
+                self._make_private()
+                self._buffer[row] = encoding
+                self.names[row] = name_val
+                if self.index is not None:
+                    self.index.update(row, encoding)
+                self.version += 1
+                return True
+            count = len(self.ids)
+            if count == self._buffer.shape[0]:
+                capacity = max(16, count * 2)
+                buffer = np.empty((capacity, FACE_DIM), dtype=self.dtype)
+                buffer[:count] = self._buffer[:count]
+                self._buffer = buffer
+                self._shared = False
+            self._buffer[count] = encoding
+            if self.index is not None:
+                self.index.add(encoding)
+            self.ids.append(id_val)
+            self.names.append(name_val)
+            self._row_of[id_val] = count
+            self.version += 1
+            return True
+
+    def remove(self, id_val):
+        """
+        从人脸库中删除指定学号的记录，通常在FaceSync拉取到删除标记（tombstone）时调用。
+
+        把最后一行移动到被删除的位置，不需要移动其余的行。设置了检索索引时索引按同样的方式删除该行（FaceIndex.remove），
+        只修改相关的倒排列表，不重新训练。
+        学号存在时版本号加1并返回True，否则返回False。
+        """
+        with self._lock:
+            row = self._row_of.pop(id_val, None)
+            if row is None:
+                return False
+            self._make_private()
+            if self.index is not None:
+                self.index.remove(row)
+            last = len(self.ids) - 1
+            if row != last:
+                self._buffer[row] = self._buffer[last]
+                self.ids[row] = self.ids[last]
+                self.names[row] = self.names[last]
+                self._row_of[self.ids[row]] = row
+            self.ids.pop()
+            self.names.pop()
+            self.version += 1
+            return True
+
+    def _make_private(self):
+        # 原地修改缓冲区之前调用：缓冲区已通过快照交给调用方或者是只读的内存映射时，先复制一份
+        if self._shared or not self._buffer.flags.writeable:
+            self._buffer = self._buffer.copy()
+            self._shared = False
+
+    def snapshot(self):
+        """
+        返回人脸库当前内容的一致性快照(ids, names, matrix, version)。
+
+        学号和姓名返回列表副本，矩阵返回只读视图，调用方在比对过程中即使人脸库被其他线程修改，
+        拿到的数据也始终相互对应。
+        """
+        with self._lock:
+            matrix = self._buffer[:len(self.ids)]
+            matrix.flags.writeable = False
+            self._shared = True
+            return list(self.ids), list(self.names), matrix, self.version
+
+    def matcher(self):
+        """
+        返回与人脸库当前版本对应的FaceMatcher比对器，同时返回对应的学号、姓名列表。
+
+        比对器按版本号缓存，人脸库内容未发生变化时直接复用，否则基于最新快照重新构建。
+        返回(matcher, ids, names)，三者始终来自同一个快照，索引一一对应。
+        """
+        with self._lock:
+            if self._matcher is None or self._matcher_version != self.version:
+                ids, names, matrix, version = self.snapshot()
+                self._matcher = (FaceMatcher(matrix), ids, names)
+                self._matcher_version = version
+            return self._matcher
+
+    def search(self, probes, k=1):
+        """
+        在人脸库中检索一个或多个待识别编码距离最近的k条记录。
+
+        设置了检索索引时通过索引检索，否则使用按版本缓存的FaceMatcher做精确比对。
+        返回(results, ids, names)，results的格式与FaceMatcher.top_k一致，其中的行号对应ids和names中的位置。
+        """
+        with MATCH_SECONDS.time(), self._lock:
+            if self.index is None:
+                matcher, ids, names = self.matcher()
+                return matcher.top_k(probes, k), ids, names
+            return self.index.search(probes, k), list(self.ids), list(self.names)
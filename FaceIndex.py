@@ -0,0 +1,384 @@
+import numpy as np
+from FaceMatcher import FaceMatcher
+
+# 人脸特征向量的维度
+FACE_DIM = 128
+
+
+# 定义一个名为FaceIndex的基类，规定人脸检索索引需要实现的接口，FaceGallery通过该接口调用具体的索引实现
+class FaceIndex:
+    # 索引类型名称，保存到磁盘时写入文件，加载时据此选择对应的索引类
+    kind = None
+
+    def __init__(self):
+        """
+        类的构造函数，初始化一块按容量成倍扩展的特征矩阵缓冲区，只有前self.count行是有效数据。
+        """
+        self._vectors = np.empty((0, FACE_DIM), dtype=np.float32)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def vectors(self):
+        """
+        返回索引中当前有效的(N, 128)特征矩阵视图。
+        """
+        return self._vectors[:self.count]
+
+    def add(self, encodings):
+        """
+        向索引中增量添加一个或多个人脸编码，新编码的行号依次接在已有记录之后，与FaceGallery中的行号一一对应。
+
+        参数:
+        - encodings: 单个128维编码，或形状为(M, 128)的多个编码。
+
+        返回新添加的第一条记录的行号。
+        """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, FACE_DIM)
+        start = self.count
+        end = start + encodings.shape[0]
+        if end > self._vectors.shape[0]:
+            buffer = np.empty((max(16, end, start * 2), FACE_DIM), dtype=np.float32)
+            buffer[:start] = self._vectors[:start]
+            self._vectors = buffer
+        self._vectors[start:end] = encodings
+        self.count = end
+        self._on_add(start, end)
+        return start
+
+    def update(self, row, encoding):
+        """
+        原地替换第row行的编码，通常在FaceGallery更新已有学号的记录时调用，不重新构建整个索引。
+        """
+        self._vectors[row] = np.asarray(encoding, dtype=np.float32).reshape(FACE_DIM)
+        self._on_update(row)
+
+    def remove(self, row):
+        """
+        删除第row行：把最后一行移动到第row行，与FaceGallery.remove的做法一致，两边的行号保持一一对应。
+        """
+        last = self.count - 1
+        self._on_remove(row, last)
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+        self.count = last
+
+    def rebuild(self, matrix):
+        """
+        清空索引并用给定的特征矩阵重新构建，通常在FaceGallery从数据库整体加载后调用。
+        """
+        self._vectors = np.empty((0, FACE_DIM), dtype=np.float32)
+        self.count = 0
+        self._reset()
+        if len(matrix):
+            self.add(matrix)
+
+    def search(self, probes, k=1):
+        """
+        对一个或多个待识别编码检索距离最近的k条记录。
+
+        返回一个列表，每个元素是按距离从小到大排列的(index, distance)元组列表，格式与FaceMatcher.top_k一致。
+        """
+        raise NotImplementedError
+
+    def save(self, path):
+        """
+        将索引保存到磁盘（numpy的.npz格式），之后可通过load_index函数重新加载。
+        path可以是文件路径，也可以是已经打开的文件对象（FaceSync先写入临时文件再重命名）。
+        """
+        np.savez(path, kind=np.array(self.kind), vectors=self.vectors, **self._state())
+
+    def matches_config(self, configured):
+        """
+        判断从磁盘加载的本索引能否代替configured（按当前配置新建的索引）使用，参数不同时需要重新构建。
+        """
+        return type(self) is type(configured)
+
+    def _on_add(self, start, end):
+        # 子类在新记录写入缓冲区之后更新自身的辅助结构
+        pass
+
+    def _on_update(self, row):
+        # 子类在第row行的编码被替换之后更新自身的辅助结构
+        pass
+
+    def _on_remove(self, row, last):
+        # 子类在第row行被删除、最后一行last即将移动到row之前更新自身的辅助结构
+        pass
+
+    def _reset(self):
+        # 子类在rebuild时清空自身的辅助结构
+        pass
+
+    def _state(self):
+        # 子类返回需要额外保存到磁盘的数组
+        return {}
+
+
+# 定义一个名为BruteForceIndex的类，对所有记录做精确的暴力检索，适用于教室规模的人脸库，也作为近似索引召回率的参照
+class BruteForceIndex(FaceIndex):
+    kind = 'brute'
+
+    def __init__(self):
+        super(BruteForceIndex, self).__init__()
+        self._matcher = None
+
+    def search(self, probes, k=1):
+        # 比对器在索引内容变化后的第一次检索时重新构建
+        if self._matcher is None:
+            self._matcher = FaceMatcher(self.vectors)
+        return self._matcher.top_k(probes, k)
+
+    def _on_add(self, start, end):
+        self._matcher = None
+
+    def _on_update(self, row):
+        self._matcher = None
+
+    def _on_remove(self, row, last):
+        self._matcher = None
+
+    def _reset(self):
+        self._matcher = None
+
+
+# 定义一个名为IVFIndex的类，使用倒排文件（IVF）粗聚类实现近似最近邻检索，只依赖CPU和NumPy
+class IVFIndex(FaceIndex):
+    kind = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, train_iters=10, seed=0):
+        """
+        类的构造函数，用于初始化IVF索引。
+
+        参数:
+        - nlist: 聚类中心的数量，默认为None，表示训练时取sqrt(N)（至少为1）。
+        - nprobe: 检索时访问的最近聚类数量，越大召回率越高、速度越慢，默认为8。
+        - train_iters: k-means训练的迭代次数，默认为10。
+        - seed: 随机数种子，保证训练结果可复现。
+
+        检索时先找到与待识别编码最近的nprobe个聚类中心，再只在这些聚类的成员中计算精确距离，
+        因此每次检索只需扫描人脸库的一小部分。索引尚未训练时退化为对全部记录的暴力检索。
+        """
+        super(IVFIndex, self).__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._lists = []
+        # 基于聚类中心构建的比对器，训练或加载完成后缓存，检索时不再重复计算聚类中心的平方范数
+        self._centroid_matcher = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, sample=None):
+        """
+        使用k-means训练聚类中心，并把索引中已有的全部记录分配到各个聚类。
+
+        参数:
+        - sample: 用于训练的样本矩阵，默认为None，表示使用索引中当前的全部记录。
+        """
+        data = self.vectors if sample is None else np.asarray(sample, dtype=np.float32)
+        if len(data) == 0:
+            return
+        nlist = self.nlist or max(1, int(np.sqrt(len(data))))
+        nlist = min(nlist, len(data))
+        rng = np.random.default_rng(self.seed)
+        centroids = data[rng.choice(len(data), nlist, replace=False)].astype(np.float32)
+        for _ in range(self.train_iters):
+            labels = self._assign(data, FaceMatcher(centroids))
+            sizes = np.bincount(labels, minlength=nlist)
+            # 按聚类排序后用reduceat分段求和，空聚类保留原来的中心，避免除以0
+            nonempty = np.flatnonzero(sizes)
+            order = np.argsort(labels, kind='stable')
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])[nonempty]
+            sums = np.add.reduceat(data[order].astype(np.float64), starts, axis=0)
+            centroids[nonempty] = (sums / sizes[nonempty, None]).astype(np.float32)
+        self.centroids = centroids
+        self._centroid_matcher = FaceMatcher(centroids)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._lists = [[] for _ in range(nlist)]
+        self._on_add(0, self.count)
+
+    def rebuild(self, matrix):
+        # 重新构建时丢弃旧的聚类中心，并基于新数据重新训练
+        super(IVFIndex, self).rebuild(matrix)
+        self.train()
+
+    def search(self, probes, k=1):
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, FACE_DIM)
+        if not self.is_trained:
+            return FaceMatcher(self.vectors).top_k(probes, k)
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_dist = self._centroid_matcher.distances(probes)
+        nearest = np.argpartition(centroid_dist, nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for probe, lists in zip(probes, nearest):
+            candidates = np.concatenate([self._list_array(c) for c in lists])
+            if len(candidates) == 0:
+                results.append([])
+                continue
+            matches = FaceMatcher(self._vectors[candidates]).top_k(probe, k)[0]
+            results.append([(int(candidates[i]), d) for i, d in matches])
+        return results
+
+    def matches_config(self, configured):
+        # 聚类数量由配置指定时必须一致；检索参数nprobe不同时也重新构建，保证运行时使用的是配置的参数
+        return (super(IVFIndex, self).matches_config(configured) and configured.nprobe == self.nprobe
+                and configured.nlist in (None, self.nlist))
+
+    def _assign(self, data, matcher, chunk=8192):
+        # 分块计算每条记录最近的聚类中心（matcher为基于聚类中心构建的比对器），避免百万级人脸库一次性生成过大的距离矩阵
+        labels = np.empty(len(data), dtype=np.int32)
+        for start in range(0, len(data), chunk):
+            labels[start:start + chunk] = matcher.distances(data[start:start + chunk]).argmin(axis=1)
+        return labels
+
+    def _list_array(self, c):
+        # 倒排列表以Python列表形式增量维护，检索时按需转换为numpy数组并缓存
+        members = self._lists[c]
+        if not isinstance(members, np.ndarray):
+            members = np.asarray(members, dtype=np.int64)
+            self._lists[c] = members
+        return members
+
+    def _members(self, c):
+        # 返回可以增量修改的倒排列表（Python列表），检索时转换成的numpy数组在这里转换回来
+        members = self._lists[c]
+        if isinstance(members, np.ndarray):
+            members = members.tolist()
+            self._lists[c] = members
+        return members
+
+    def _on_add(self, start, end):
+        if not self.is_trained or start == end:
+            return
+        labels = self._assign(self._vectors[start:end], self._centroid_matcher)
+        self.assignments = np.concatenate([self.assignments, labels])
+        for row, c in enumerate(labels, start):
+            self._members(c).append(row)
+
+    def _on_update(self, row):
+        # 只把这一行重新分配到最近的聚类，不重新训练聚类中心
+        if not self.is_trained:
+            return
+        old = self.assignments[row]
+        new = self._assign(self._vectors[row:row + 1], self._centroid_matcher)[0]
+        if new != old:
+            self._members(old).remove(row)
+            self._members(new).append(row)
+            self.assignments[row] = new
+
+    def _on_remove(self, row, last):
+        # 从所在的倒排列表中删除row，最后一行的行号在其倒排列表中改为row
+        if not self.is_trained:
+            return
+        self._members(self.assignments[row]).remove(row)
+        if row != last:
+            members = self._members(self.assignments[last])
+            members[members.index(last)] = row
+            self.assignments[row] = self.assignments[last]
+        self.assignments = self.assignments[:last]
+
+    def _reset(self):
+        self.centroids = None
+        self._centroid_matcher = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._lists = []
+
+    def _state(self):
+        state = {'nprobe': np.array(self.nprobe)}
+        if self.is_trained:
+            state['centroids'] = self.centroids
+            state['assignments'] = self.assignments
+        return state
+
+    def _restore(self, data):
+        # 从磁盘加载时直接恢复聚类中心与分配结果，不需要重新训练
+        self.nprobe = int(data['nprobe'])
+        if 'centroids' in data:
+            self.centroids = data['centroids']
+            self._centroid_matcher = FaceMatcher(self.centroids)
+            self.nlist = len(self.centroids)
+            self.assignments = data['assignments'].astype(np.int32)
+            order = np.argsort(self.assignments, kind='stable')
+            bounds = np.searchsorted(self.assignments[order], np.arange(self.nlist + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.nlist)]
+
+
+# 索引类型名称与索引类的对应关系
+INDEX_TYPES = {cls.kind: cls for cls in (BruteForceIndex, IVFIndex)}
+
+
+def create_index(kind='brute', **kwargs):
+    """
+    根据类型名称创建索引，kind可以是'brute'（精确暴力检索）或'ivf'（倒排文件近似检索），其余参数传给对应的构造函数。
+    """
+    return INDEX_TYPES[kind](**kwargs)
+
+
+def open_index(spec=""):
+    """
+    根据字符串描述创建人脸库使用的检索索引，与FaceStorage.open_storage的写法相同：
+    - ""或"none"：不使用索引，返回None，FaceGallery使用精确的暴力比对（默认）；
+    - "brute"：BruteForceIndex；
+    - "ivf"：IVFIndex，可以在冒号后给出构造参数，例如"ivf:nprobe=16,nlist=256"。
+    """
+    kind, _, arg = spec.partition(':')
+    if kind in ("", "none"):
+        return None
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"未知的检索索引: {spec}")
+    kwargs = {}
+    for item in filter(None, arg.split(',')):
+        key, _, value = item.partition('=')
+        try:
+            kwargs[key.strip()] = int(value)
+        except ValueError:
+            raise ValueError(f"检索索引参数格式错误: {item}") from None
+    try:
+        return create_index(kind, **kwargs)
+    except TypeError as e:
+        raise ValueError(f"检索索引参数错误: {spec}（{e}）") from None
+
+
+def load_index(path):
+    """
+    从save方法保存的.npz文件中加载索引。
+    """
+    with np.load(path) as data:
+        index = INDEX_TYPES[str(data['kind'])]()
+        vectors = data['vectors']
+        index._vectors = np.array(vectors, dtype=np.float32)
+        index.count = len(vectors)
+        if hasattr(index, '_restore'):
+            index._restore(data)
+    return index
+
+
+def measure_recall(index, queries, k=1):
+    """
+    测量近似索引相对于精确暴力检索的召回率。
+
+    参数:
+    - index: 待测量的索引。
+    - queries: 形状为(M, 128)的查询编码。
+    - k: 每个查询比较的前k个结果，默认为1。
+
+    对每个查询分别用index和基于同一份数据的FaceMatcher做检索，统计精确结果中的前k条有多少出现在近似结果中，
+    返回平均召回率（0到1之间的浮点数）。
+    """
+    exact = FaceMatcher(index.vectors).top_k(queries, k)
+    approx = index.search(queries, k)
+    hits = 0
+    total = 0
+    for exact_row, approx_row in zip(exact, approx):
+        expected = {i for i, _ in exact_row}
+        hits += len(expected & {i for i, _ in approx_row})
+        total += len(expected)
+    return hits / total if total else 1.0
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+# 定义一个名为FaceMatcher的类，基于预先构建好的人脸特征矩阵进行向量化的最近邻比对
+class FaceMatcher:
+    def __init__(self, gallery_matrix):
+        """
+        类的构造函数，用于初始化比对器。
+
+        参数:
+        - gallery_matrix: 形状为(N, 128)的人脸特征矩阵，一般来自FaceGallery的快照。
+
+        构造时将矩阵转换为float64并预先计算每一行的平方范数，之后每次比对只需一次矩阵乘法：
+        ||g - p||^2 = ||g||^2 - 2 * g·p + ||p||^2
+        从而避免compare_faces与face_distance对同一组数据重复计算距离，也不必每次把列表重新堆叠成矩阵。
+        """
+        self.matrix = np.asarray(gallery_matrix, dtype=np.float64).reshape(-1, 128)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def distances(self, probes):
+        """
+        计算一个或多个待识别编码与人脸库中所有编码之间的欧氏距离。
+
+        参数:
+        - probes: 单个128维编码，或形状为(M, 128)的多个编码（例如一帧画面中的所有人脸）。
+
+        返回形状为(M, N)的距离矩阵。由于浮点误差，展开式计算出的平方距离可能略小于0，因此先截断到0再开方。
+        """
+        probes = np.asarray(probes, dtype=np.float64).reshape(-1, 128)
+        probe_sq = np.einsum('ij,ij->i', probes, probes)
+        sq = self.sq_norms[None, :] - 2.0 * (probes @ self.matrix.T) + probe_sq[:, None]
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def top_k(self, probes, k=1):
+        """
+        对一个或多个待识别编码，返回各自距离最近的k个人脸库记录。
+
+        参数:
+        - probes: 单个128维编码，或形状为(M, 128)的多个编码。
+        - k: 每个编码返回的候选数量，默认为1，超过人脸库大小时按人脸库大小处理。
+
+        先通过argpartition在O(N)时间内选出每行最小的k个距离，再只对这k个候选排序。
+        返回一个长度为M的列表，每个元素是按距离从小到大排列的(index, distance)元组列表；人脸库为空时每个元素都是空列表。
+        """
+        dist = self.distances(probes)
+        count = dist.shape[1]
+        k = min(k, count)
+        if k <= 0:
+            return [[] for _ in range(dist.shape[0])]
+        if k < count:
+            candidates = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(count), dist.shape)
+        candidate_dist = np.take_along_axis(dist, candidates, axis=1)
+        order = np.argsort(candidate_dist, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_dist = np.take_along_axis(candidate_dist, order, axis=1)
+        return [
+            [(int(i), float(d)) for i, d in zip(row_idx, row_dist)]
+            for row_idx, row_dist in zip(candidates, candidate_dist)
+        ]
+
+    def best_match(self, probe, tolerance=0.6):
+        """
+        返回单个待识别编码的最佳匹配(index, distance)，如果最近距离超过容忍度tolerance或人脸库为空则返回None。
+        tolerance的含义与face_recognition.compare_faces相同，默认为0.6。
+        """
+        result = self.top_k(probe, k=1)[0]
+        if result and result[0][1] <= tolerance:
+            return result[0]
+        return None
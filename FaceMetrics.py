@@ -0,0 +1,300 @@
+import bisect
+import http.server
+import os
+import threading
+import time
+
+# 耗时直方图默认的桶上界（秒），覆盖从1毫秒的检测到数秒的全量加载；相邻桶的比例约为1.5，分位数估算误差在同一量级以内
+DEFAULT_BUCKETS = (0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075, 0.1,
+                   0.15, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0)
+# 导出时附带计算的分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# 定义一个名为Counter的类，表示只增不减的计数器，例如处理的帧数、识别成功次数
+class Counter:
+    def __init__(self, registry, name, help_text):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+
+# 定义一个名为_Timer的类，作为Histogram.time()返回的上下文管理器，退出时把经过的时间记录到直方图中
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+# 定义一个名为Histogram的类，按固定的桶统计耗时分布，并据此估算p50/p95/p99等分位数
+class Histogram:
+    def __init__(self, registry, name, help_text, buckets=DEFAULT_BUCKETS):
+        """
+        类的构造函数。
+
+        参数:
+        - registry: 所属的MetricsRegistry。
+        - name: 指标名称，按Prometheus的习惯以_seconds结尾。
+        - help_text: 指标说明。
+        - buckets: 递增的桶上界列表，默认为DEFAULT_BUCKETS。
+
+        每次记录只做一次二分查找和几次加法，不保存原始样本，内存占用与记录次数无关。
+        """
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # 最后一个元素对应+Inf桶
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        记录一个观测值（秒）。
+        """
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        """
+        返回计时用的上下文管理器，用法为 with histogram.time(): ...
+        """
+        return _Timer(self)
+
+    def quantile(self, q):
+        """
+        根据各个桶的计数估算分位数q（0到1之间），在所在的桶内做线性插值。
+        落在+Inf桶中的分位数返回最大的有限桶上界；尚无观测值时返回0。
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count > 0:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        # 返回(各桶计数, 总次数, 总和)的一致性副本
+        with self._lock:
+            return list(self._counts), self.count, self.sum
+
+
+# 定义一个名为MetricsRegistry的类，集中管理所有指标，并以Prometheus文本格式导出
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        """
+        类的构造函数。
+
+        参数:
+        - enabled: 是否记录指标，默认为True。设置为False后各个指标的记录方法直接返回。
+        """
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text):
+        """
+        返回名为name的计数器，不存在时创建。
+        """
+        return self._get(name, lambda: Counter(self, name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """
+        返回名为name的耗时直方图，不存在时创建。
+        """
+        return self._get(name, lambda: Histogram(self, name, help_text, buckets))
+
+    def _get(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def export(self):
+        """
+        返回所有指标的Prometheus文本格式（text/plain; version=0.0.4）。
+        直方图除了各个桶的累计计数以外，还额外导出一个名为<name>_quantile的gauge，给出估算的p50/p95/p99。
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            if isinstance(metric, Counter):
+                lines.append(f"# TYPE {metric.name} counter")
+                lines.append(f"{metric.name} {metric.value}")
+                continue
+            counts, total, total_sum = metric.snapshot()
+            lines.append(f"# TYPE {metric.name} histogram")
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{metric.name}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f"{metric.name}_sum {total_sum}")
+            lines.append(f"{metric.name}_count {total}")
+            lines.append(f"# HELP {metric.name}_quantile {metric.help}（由直方图估算的分位数）")
+            lines.append(f"# TYPE {metric.name}_quantile gauge")
+            for q in QUANTILES:
+                lines.append(f'{metric.name}_quantile{{quantile="{q}"}} {metric.quantile(q)}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        返回一行便于阅读的摘要，列出每个直方图的p50/p95/p99（毫秒）以及各个计数器的值，用于状态栏或日志。
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        parts = []
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                parts.append(f"{metric.name}={metric.value}")
+            elif metric.count:
+                p50, p95, p99 = (metric.quantile(q) * 1000 for q in QUANTILES)
+                parts.append(f"{metric.name} p50={p50:.1f} p95={p95:.1f} p99={p99:.1f}ms")
+        return "  ".join(parts)
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """
+        在后台线程中启动HTTP服务，Prometheus可以从 http://host:port/metrics 抓取指标。
+        默认只监听本机地址。返回HTTP服务器对象，调用其shutdown方法即可停止。
+        """
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.export().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 不在控制台打印每一次抓取请求
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="MetricsHTTP", daemon=True).start()
+        return server
+
+
+# 定义一个名为RollingFileExporter的类，定期把指标追加写入本地文件，文件超过大小上限时轮转，适合没有部署Prometheus的门禁终端
+class RollingFileExporter:
+    def __init__(self, registry, path="face_metrics.prom", interval=60.0, max_bytes=1024 * 1024, backups=3):
+        """
+        类的构造函数。
+
+        参数:
+        - registry: 要导出的MetricsRegistry。
+        - path: 指标文件路径，默认为当前目录下的face_metrics.prom。
+        - interval: 写入间隔（秒），默认为60秒。
+        - max_bytes: 单个文件的大小上限，超过后依次重命名为path.1、path.2……，默认为1MB。
+        - backups: 保留的历史文件数量，默认为3。
+
+        每次写入以“# 时间戳”注释行开头，后面是该时刻完整的Prometheus文本格式指标。
+        """
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        """
+        立即把当前指标追加写入文件，必要时先轮转。
+        """
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            for index in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(self.registry.export())
+
+    def start(self):
+        """
+        启动后台写入线程。
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="MetricsFile", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止后台写入线程，退出前再写入一次。
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"写入指标文件失败: {e}")
+
+
+# 全局指标注册表以及门禁系统各个阶段的指标，各模块直接导入使用
+METRICS = MetricsRegistry()
+CAPTURE_SECONDS = METRICS.histogram("face_capture_seconds", "从摄像头读取一帧画面的耗时")
+DETECT_SECONDS = METRICS.histogram("face_detect_seconds", "Haar人脸检测每帧的耗时")
+ENCODE_SECONDS = METRICS.histogram("face_encode_seconds", "face_recognition提取一张人脸特征编码的耗时")
+MATCH_SECONDS = METRICS.histogram("face_match_seconds", "在人脸库中检索最近记录的耗时")
+DB_LOAD_SECONDS = METRICS.histogram("face_db_load_seconds", "从数据库全量加载人脸库的耗时")
+DB_WRITE_SECONDS = METRICS.histogram("face_db_write_seconds", "向数据库写入人脸记录的耗时（单条或一批）")
+SYNC_SECONDS = METRICS.histogram("face_sync_poll_seconds", "一次增量同步轮询的耗时")
+SNAPSHOT_LOAD_SECONDS = METRICS.histogram("face_snapshot_load_seconds", "启动时从本地快照恢复人脸库的耗时")
+MODEL_LOAD_SECONDS = METRICS.histogram("face_model_load_seconds", "导入face_recognition并加载特征提取模型的耗时")
+FRAMES_TOTAL = METRICS.counter("face_frames_total", "摄像头读取到的画面数")
+DETECTIONS_TOTAL = METRICS.counter("face_detections_total", "检测到的人脸数")
+MATCHES_TOTAL = METRICS.counter("face_matches_total", "识别成功（距离在阈值内）的次数")
+MISSES_TOTAL = METRICS.counter("face_misses_total", "识别失败（人脸库中没有足够接近的记录）的次数")
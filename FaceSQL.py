@@ -1,33 +1,236 @@
-import sys
+import contextlib
+import json
+import queue
+import threading
+import time
 import pymysql
+import pymysql.cursors
+from FaceStorage import FaceStorage, DuplicateRecordError
 
-# 定义一个名为FaceSQL的类，用于操作与面部数据相关的数据库操作
-class FaceSQL:
-    def __init__(self):
+# 数据库连接参数，FaceSQL默认使用这些参数创建连接池
+DB_CONFIG = dict(
+    host="127.0.0.1",
+    user="root",
+    password="cekay383",
+    db="db",
+    charset="utf8mb4",
+    port=3306
+)
+
+# face表的结构迁移列表，每项为(版本号, 说明, SQL语句列表)，按版本号从小到大依次执行，
+# 已执行到的版本号记录在schema_version表中。新增迁移时只需在末尾追加一项，不要修改已发布的迁移。
+SCHEMA_MIGRATIONS = [
+    (1, "为id和name添加唯一索引", [
+        "ALTER TABLE {table} ADD UNIQUE KEY uk_face_id (id)",
+        "ALTER TABLE {table} ADD UNIQUE KEY uk_face_name (name)",
+    ]),
+    (2, "添加删除标记表和删除触发器，用于多终端增量同步", [
+        "CREATE TABLE IF NOT EXISTS face_tombstone ("
+        "tombstone_number INT NOT NULL AUTO_INCREMENT PRIMARY KEY, "
+        "face_number INT NOT NULL, "
+        "id VARCHAR(20) NOT NULL, "
+        "deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP) ENGINE=InnoDB",
+        "CREATE TRIGGER face_after_delete AFTER DELETE ON {table} FOR EACH ROW "
+        "INSERT INTO face_tombstone (face_number, id) VALUES (OLD.face_number, OLD.id)",
+    ]),
+    (3, "添加录入质量信息表，保存多张照片录入的样本数和离散程度", [
+        "CREATE TABLE IF NOT EXISTS face_quality ("
+        "id VARCHAR(20) NOT NULL PRIMARY KEY, "
+        "quality VARCHAR(255) NOT NULL) ENGINE=InnoDB",
+    ]),
+]
+
+# MySQL错误码：索引名重复（索引已存在）、唯一约束冲突，以及触发器已存在
+ER_DUP_KEYNAME = 1061
+ER_DUP_ENTRY = 1062
+ER_TRG_ALREADY_EXISTS = 1359
+
+
+# 定义一个名为ConnectionPool的类，实现线程安全、容量有限的数据库连接池
+class ConnectionPool:
+    def __init__(self, maxsize=4, timeout=10.0, retries=3, backoff=0.5, max_backoff=8.0, **connect_kwargs):
+        """
+        类的构造函数。
+
+        参数:
+        - maxsize: 连接池中最多同时存在的连接数量，默认为4。
+        - timeout: 所有连接都被占用时，等待可用连接的最长时间（秒），默认为10秒。
+        - retries: 建立连接或重连失败时的最大重试次数，默认为3。
+        - backoff: 第一次重试前等待的时间（秒），之后每次翻倍，默认为0.5秒。
+        - max_backoff: 两次重试之间的最长等待时间（秒），默认为8秒。
+        - connect_kwargs: 传给pymysql.connect的连接参数。
+
+        连接按需创建，空闲连接放回池中复用。每次取出连接时先通过ping检查连接是否可用，
+        连接已被MySQL的wait_timeout断开时自动重连，因此长时间空闲后也不需要重启程序。
+        """
+        self.connect_kwargs = connect_kwargs
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # 空闲连接栈（后进先出，优先复用最近使用过的连接），以及限制连接总数的信号量
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(maxsize)
+
+    def _retry(self, func):
+        # 按指数退避重试func，用于建立连接和重连，超过重试次数后抛出最后一次的异常
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                return func()
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"数据库连接失败，{delay:.1f}秒后重试: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _checkout(self):
+        # 取出一个空闲连接并检查其可用性，没有空闲连接时新建一个
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._retry(lambda: pymysql.connect(**self.connect_kwargs))
+        try:
+            self._retry(lambda: conn.ping(reconnect=True))
+        except Exception:
+            self._discard(conn)
+            raise
+        return conn
+
+    def _discard(self, conn):
+        # 关闭一个已损坏的连接，不再放回池中
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextlib.contextmanager
+    def connection(self):
         """
-        类的构造函数，用于初始化数据库连接和设置相关属性。
+        从连接池中借出一个连接，用法为 with pool.connection() as conn: ...
 
-        尝试建立与MySQL数据库的连接，连接的相关参数包括主机地址、用户名、密码、数据库名称、字符编码以及端口号。
-        如果连接过程中出现异常，将打印错误信息并终止程序（通过sys.exit(1)）。
+        所有连接都被占用时最多等待timeout秒，超时抛出TimeoutError。
+        with代码块中出现异常时先回滚事务；如果是连接本身出现问题，则关闭该连接，下次使用时重新建立。
+        代码块结束后连接归还到池中。
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("等待数据库连接超时")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except BaseException as e:
+            if conn is not None:
+                if isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+                    self._discard(conn)
+                    conn = None
+                else:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        self._discard(conn)
+                        conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def close(self):
+        """
+        关闭连接池中所有的空闲连接。
+        """
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+# 定义一个名为FaceSQL的类，用于操作与面部数据相关的数据库操作，是FaceStorage存储接口的MySQL实现
+class FaceSQL(FaceStorage):
+    SUPPORTS_SYNC = True
+
+    def __init__(self, pool=None, pool_size=4, migrate=True, connect=True):
+        """
+        类的构造函数，用于初始化数据库连接池和设置相关属性。
+
+        参数:
+        - pool: 可选的ConnectionPool实例，默认为None，表示使用DB_CONFIG中的连接参数新建一个连接池。
+        - pool_size: 新建连接池时的最大连接数，默认为4。
+        - migrate: 是否在连接成功后执行尚未执行的表结构迁移（见migrateSchema方法），默认为True。
+        - connect: 是否在构造时建立第一个连接，默认为True。为False时构造立即返回，由调用方稍后在后台线程中调用checkConnection，
+          数据库不可达时界面不必等待连接超时和重试。
+
+        界面线程和后台的采集、比对线程可以同时调用FaceSQL的方法，每次调用从连接池中借出各自的连接，互不阻塞。
+        构造时会尝试建立第一个连接以便尽早发现配置错误；连接失败只打印错误信息而不再终止程序，
+        之后的每次数据库操作都会自动重连。
         同时初始化要操作的表名，这里默认为'face'表。
         """
+        self.pool = pool if pool is not None else ConnectionPool(maxsize=pool_size, **DB_CONFIG)
+        # 设置要操作的表名，初始化为'face'表，后续的数据库操作基本围绕此表展开
+        self.table_name = 'face'
+        self.migrate = migrate
+        self._migrated = False
+        if connect:
+            self.checkConnection()
+
+    def checkConnection(self):
+        """
+        尝试建立一个连接，第一次连接成功时执行表结构迁移（构造时指定了migrate=True）。
+        连接成功返回True；连接失败打印错误信息并返回False。
+        """
         try:
-            # 使用pymysql库建立与MySQL数据库的连接
-            self.conn = pymysql.connect(
-                host="127.0.0.1",
-                user="root",
-                password="cekay383",
-                db="db",
-                charset="utf8mb4",
-                port=3306
-            )
-            # 设置要操作的表名，初始化为'face'表，后续的数据库操作基本围绕此表展开
-            self.table_name = 'face'
+            with self.pool.connection():
+                pass
         except Exception as e:
             # 如果连接数据库出现异常，打印出详细的错误信息
             print(f"数据库连接错误: {e}")
-            # 终止程序，返回状态码1表示出现错误
-            sys.exit(1)
+            return False
+        if self.migrate and not self._migrated:
+            self.migrateSchema()
+            self._migrated = True
+        return True
+
+    def migrateSchema(self):
+        """
+        执行表结构迁移的方法，由FaceSQL统一管理face表的结构版本。
+
+        首先确保schema_version表存在并读取当前版本号，然后按顺序执行SCHEMA_MIGRATIONS中版本号更大的迁移，
+        每执行完一个迁移就把版本号写回schema_version表，因此迁移可以中断后重复执行。
+        添加索引或触发器时如果它已经存在（例如按README中的建表语句新建的表），视为该语句已执行。
+        某个迁移失败时（例如表中已有重复的学号或姓名，无法添加唯一索引），打印错误信息并停止后续迁移。
+        返回迁移完成后的版本号。
+        """
+        version = 0
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT NOT NULL) ENGINE=InnoDB")
+                    cursor.execute("SELECT MAX(version) FROM schema_version")
+                    version = cursor.fetchone()[0] or 0
+                    for target, description, statements in SCHEMA_MIGRATIONS:
+                        if target <= version:
+                            continue
+                        print(f"执行表结构迁移 {target}: {description}")
+                        for statement in statements:
+                            try:
+                                cursor.execute(statement.format(table=self.table_name))
+                            except pymysql.err.OperationalError as e:
+                                if e.args[0] not in (ER_DUP_KEYNAME, ER_TRG_ALREADY_EXISTS):
+                                    raise
+                        cursor.execute("DELETE FROM schema_version")
+                        cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (target,))
+                        conn.commit()
+                        version = target
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"表结构迁移失败: {e}")
+        return version
 
     def processFaceData(self, sqlstr, args=()):
         """
@@ -37,26 +240,28 @@ class FaceSQL:
         - sqlstr: 要执行的SQL语句字符串。
         - args: SQL语句中占位符对应的参数元组，默认为空元组。
 
-        此方法首先会打印出即将执行的SQL语句以及对应的参数，方便调试查看。
-        然后获取数据库游标对象，尝试执行SQL语句并提交事务。
+        此方法从连接池借出一个连接并获取数据库游标对象，尝试执行SQL语句并提交事务。
+        （执行耗时由FaceMetrics中的face_db_write_seconds统计，不再逐条打印SQL语句和参数。）
         如果执行过程中出现异常，将回滚事务以保证数据一致性，并打印出错误信息。
         无论执行成功与否，最后都会关闭游标。
+        执行成功返回True，失败返回False。
         """
-        # 打印即将执行的SQL语句以及对应的参数，方便调试时查看执行情况
-        print(f"Executing SQL: {sqlstr} | Args: {args}")
-        cursor = self.conn.cursor()
         try:
-            # 使用游标执行SQL语句，传入参数（如果有）
-            cursor.execute(sqlstr, args)
-            # 提交事务，使数据库的修改生效（例如插入、更新等操作）
-            self.conn.commit()
+            # 从连接池借出一个连接，执行出现异常时连接池会回滚事务，撤销当前事务中对数据库的所有修改操作
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # 使用游标执行SQL语句，传入参数（如果有）
+                    cursor.execute(sqlstr, args)
+                    # 提交事务，使数据库的修改生效（例如插入、更新等操作）
+                    conn.commit()
+                    return True
+                finally:
+                    # 关闭游标，释放资源
+                    cursor.close()
         except Exception as e:
-            # 如果执行SQL语句出现异常，回滚事务，撤销当前事务中对数据库的所有修改操作
-            self.conn.rollback()
             print(f"执行SQL失败: {e}")
-        finally:
-            # 关闭游标，释放资源
-            cursor.close()
+            return False
 
     def saveFaceData(self, id_val, name_val, encoding_str):
         """
@@ -67,33 +272,88 @@ class FaceSQL:
         - name_val: 与面部数据相关联的名称值。
         - encoding_str: 面部特征编码的字符串表示形式。
 
-        调用processFaceData方法，传入插入数据的SQL语句以及对应的数据值，
-        将包含id、name、encoding三个字段的数据插入到指定的表（self.table_name）中。
+        执行插入数据的SQL语句，将包含id、name、encoding三个字段的数据插入到指定的表（self.table_name）中。
+        id和name上有唯一索引，重复性由数据库约束保证：即使两个终端同时通过了record_exists检查，
+        也只有一条记录能插入成功，另一条会抛出DuplicateRecordError异常。
+        其他错误打印错误信息后返回False，插入成功返回True。
         """
-        self.processFaceData(
-            f"INSERT INTO {self.table_name}(id, name, encoding) VALUES (%s, %s, %s)",
-            (id_val, name_val, encoding_str)
-        )
+        sql = f"INSERT INTO {self.table_name}(id, name, encoding) VALUES (%s, %s, %s)"
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(sql, (id_val, name_val, encoding_str))
+                    conn.commit()
+                    return True
+                finally:
+                    cursor.close()
+        except pymysql.err.IntegrityError as e:
+            if e.args[0] == ER_DUP_ENTRY:
+                raise DuplicateRecordError("该学号或姓名已存在") from e
+            print(f"执行SQL失败: {e}")
+            return False
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
 
     def allFaceData(self):
         """
         用于获取数据库中所有面部数据记录的方法。
 
-        首先获取数据库游标对象，然后执行查询语句，从指定表（self.table_name）中获取所有的id、name、encoding字段数据。
+        首先从连接池借出连接并获取数据库游标对象，然后执行查询语句，从指定表（self.table_name）中获取所有的id、name、encoding字段数据。
         如果查询执行成功，将获取到的所有结果返回；如果出现异常，会回滚事务以保证数据一致性，打印错误信息，并返回一个空列表。
         最后关闭游标释放资源。
         """
-        cursor = self.conn.cursor()
         try:
-            cursor.execute(f"SELECT id, name, encoding FROM {self.table_name}")
-            result = cursor.fetchall()
-            return result
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"SELECT id, name, encoding FROM {self.table_name}")
+                    result = cursor.fetchall()
+                    return result
+                finally:
+                    cursor.close()
         except Exception as e:
-            self.conn.rollback()
             print(f"执行SQL失败: {e}")
             return []
-        finally:
-            cursor.close()
+
+    def countFaceData(self):
+        """
+        用于获取face表记录总数的方法，加载人脸库时据此预先分配特征矩阵。
+        如果出现异常，打印错误信息并返回None。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"SELECT COUNT(*) FROM {self.table_name}")
+                    return cursor.fetchone()[0]
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def iterFaceData(self, chunk_size=1000):
+        """
+        用于流式读取所有面部数据记录的生成器方法，每次返回最多chunk_size条(id, name, encoding)组成的列表。
+
+        使用服务器端游标（SSCursor），结果集留在MySQL服务器上，客户端每次只接收一块数据，
+        内存占用只与chunk_size有关，与表的大小无关，而且第一块数据到达后调用方即可开始处理。
+        读取期间借出的连接一直被占用，调用方提前结束迭代时，关闭游标会读完剩余的结果，连接随后归还到池中。
+        出现异常时直接抛出，由调用方处理。
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+            try:
+                cursor.execute(f"SELECT id, name, encoding FROM {self.table_name} ORDER BY face_number")
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
 
     def record_exists(self, id_val, name_val):
         """
@@ -103,20 +363,250 @@ class FaceSQL:
         - id_val: 要检查的面部数据记录的唯一标识符值。
         - name_val: 要检查的与面部数据相关联的名称值。
 
-        构造一个查询语句，通过COUNT(*)统计符合条件（id等于给定值或者name等于给定值）的记录数量。
-        获取数据库游标对象并执行该查询语句，获取查询结果中的计数值（第一条记录的第一个字段值），
-        判断该计数值是否大于0来确定是否存在对应的记录。
+        构造一个查询语句，分别对id和name做EXISTS点查询，两个条件各自可以直接命中唯一索引，
+        找到第一条记录即停止，而不必像COUNT(*) ... WHERE id = %s OR name = %s那样扫描整张表。
+        从连接池借出连接，获取数据库游标对象并执行该查询语句，查询结果为1表示存在对应的记录。
         如果执行过程中出现异常，打印错误信息并返回False表示检查失败。
         最后关闭游标释放资源。
         """
-        sql = f"SELECT COUNT(*) FROM {self.table_name} WHERE id = %s OR name = %s"
-        cursor = self.conn.cursor()
+        sql = (f"SELECT EXISTS(SELECT 1 FROM {self.table_name} WHERE id = %s) "
+               f"OR EXISTS(SELECT 1 FROM {self.table_name} WHERE name = %s)")
         try:
-            cursor.execute(sql, (id_val, name_val))
-            count = cursor.fetchone()[0]
-            return count > 0
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(sql, (id_val, name_val))
+                    return bool(cursor.fetchone()[0])
+                finally:
+                    cursor.close()
         except Exception as e:
             print(f"执行SQL失败: {e}")
             return False
-        finally:
-            cursor.close()
\ No newline at end of file
+
+    def encodingColumnIsBinary(self):
+        """
+        用于判断face表的encoding字段是否已经迁移为二进制（BLOB）类型的方法。
+
+        通过information_schema查询当前数据库中encoding字段的数据类型，
+        类型名称以blob结尾（BLOB、MEDIUMBLOB等）时返回True，否则返回False。
+        如果查询出现异常，打印错误信息并返回None，表示暂时无法判断，调用方不应缓存这个结果。
+        """
+        sql = ("SELECT DATA_TYPE FROM information_schema.COLUMNS "
+               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'encoding'")
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(sql, (self.table_name,))
+                    row = cursor.fetchone()
+                    return row is not None and row[0].lower().endswith('blob')
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def convertEncodingColumnToBlob(self):
+        """
+        将face表的encoding字段从TEXT修改为BLOB类型的方法，是二进制编码迁移的第一步。
+
+        MySQL在修改字段类型时会原样保留已有数据的字节内容，因此旧的逗号分隔字符串仍然可以被读取，
+        之后再由FaceTools逐行改写为二进制格式。返回执行是否成功。
+        """
+        return self.processFaceData(
+            f"ALTER TABLE {self.table_name} MODIFY encoding BLOB NOT NULL"
+        )
+
+    def allFaceEncodings(self):
+        """
+        用于获取所有记录的自增主键face_number以及encoding字段的方法，供编码格式迁移时逐行改写使用。
+        如果出现异常，打印错误信息并返回一个空列表。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"SELECT face_number, encoding FROM {self.table_name}")
+                    return cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return []
+
+    def updateFaceEncodings(self, rows):
+        """
+        批量改写人脸编码的方法。
+
+        参数:
+        - rows: 由(encoding, face_number)元组组成的列表。
+
+        使用executemany在同一个事务中执行全部UPDATE语句，成功后统一提交；
+        出现异常时回滚整个批次并打印错误信息。返回执行是否成功。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.executemany(
+                        f"UPDATE {self.table_name} SET encoding = %s WHERE face_number = %s", rows
+                    )
+                    conn.commit()
+                    return True
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def saveFaceDataBatch(self, rows, chunk_size=500):
+        """
+        批量向数据库中保存面部数据的方法，用于一次录入大量人员。
+
+        参数:
+        - rows: 由(id, name, encoding)元组组成的列表。
+        - chunk_size: 每个事务插入的记录数量，默认为500。
+
+        按chunk_size把记录分块，每块使用executemany插入并提交一次事务，避免逐条提交带来的大量往返。
+        如果某一块插入失败（例如其中某条记录违反约束），回滚该块后逐条重新插入，以便准确找出失败的记录；
+        如果是数据库连接不可用，整块记录直接记为失败，不再逐条重试。
+        返回(成功插入的记录列表, 失败列表)，失败列表的每个元素为(记录, 异常)，学号或姓名重复的记录对应的异常为DuplicateRecordError。
+        """
+        sql = f"INSERT INTO {self.table_name}(id, name, encoding) VALUES (%s, %s, %s)"
+        saved = []
+        failed = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = list(rows[start:start + chunk_size])
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.executemany(sql, chunk)
+                        conn.commit()
+                    finally:
+                        cursor.close()
+                saved.extend(chunk)
+                continue
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError, TimeoutError) as e:
+                print(f"批量插入失败，数据库连接不可用: {e}")
+                failed.extend((row, e) for row in chunk)
+                continue
+            except Exception as e:
+                print(f"批量插入失败，改为逐条插入: {e}")
+            for row in chunk:
+                try:
+                    with self.pool.connection() as conn:
+                        cursor = conn.cursor()
+                        try:
+                            cursor.execute(sql, row)
+                            conn.commit()
+                        finally:
+                            cursor.close()
+                    saved.append(row)
+                except pymysql.err.IntegrityError as e:
+                    if e.args[0] == ER_DUP_ENTRY:
+                        e = DuplicateRecordError("该学号或姓名已存在")
+                    failed.append((row, e))
+                except Exception as e:
+                    failed.append((row, e))
+        return saved, failed
+
+    def allFaceKeys(self):
+        """
+        用于获取数据库中所有记录的id和name的方法，批量录入时据此一次性判断重复，而不必逐条查询。
+        如果出现异常，打印错误信息并返回None。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"SELECT id, name FROM {self.table_name}")
+                    return cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def deleteFaceData(self, id_val):
+        """
+        用于删除指定学号记录的方法。face表上的删除触发器会同时写入一条删除标记，其他终端通过FaceSync同步这次删除。
+        删除成功返回True；记录不存在或出现异常时返回False。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    deleted = cursor.execute(f"DELETE FROM {self.table_name} WHERE id = %s", (id_val,))
+                    conn.commit()
+                    return deleted > 0
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def saveFaceQuality(self, id_val, quality):
+        """
+        用于保存录入质量信息的方法，quality为字典，以JSON格式写入face_quality表，同一学号重复保存时覆盖。
+        保存成功返回True；出现异常时打印错误信息并返回False。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("REPLACE INTO face_quality (id, quality) VALUES (%s, %s)",
+                                   (id_val, json.dumps(quality)))
+                    conn.commit()
+                    return True
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def syncWatermarks(self):
+        """
+        用于获取增量同步起始水位线的方法，返回(face表最大记录编号, 最大删除标记编号)。
+        如果出现异常，打印错误信息并返回None。
+        """
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(f"SELECT COALESCE(MAX(face_number), 0) FROM {self.table_name}")
+                    face_watermark = cursor.fetchone()[0]
+                    cursor.execute("SELECT COALESCE(MAX(tombstone_number), 0) FROM face_tombstone")
+                    tombstone_watermark = cursor.fetchone()[0]
+                    return face_watermark, tombstone_watermark
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def changesSince(self, face_watermark, tombstone_watermark, limit=1000):
+        """
+        用于读取水位线之后的新记录和删除标记的方法，两条查询都走主键索引的范围扫描，耗时只与变化的数量有关，与表的大小无关。
+        返回(rows, tombstones)，格式见FaceStorage.changesSince。出现异常时直接抛出，由调用方决定何时重试。
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    f"SELECT face_number, id, name, encoding FROM {self.table_name} "
+                    "WHERE face_number > %s ORDER BY face_number LIMIT %s",
+                    (face_watermark, limit)
+                )
+                rows = cursor.fetchall()
+                cursor.execute(
+                    "SELECT tombstone_number, face_number, id FROM face_tombstone "
+                    "WHERE tombstone_number > %s ORDER BY tombstone_number LIMIT %s",
+                    (tombstone_watermark, limit)
+                )
+                tombstones = cursor.fetchall()
+                # 结束本次只读事务，下一次轮询才能看到其他终端新提交的记录（InnoDB默认的可重复读隔离级别）
+                conn.commit()
+                return rows, tombstones
+            finally:
+                cursor.close()
\ No newline at end of file
@@ -0,0 +1,321 @@
+"""
+无界面的门禁识别服务，适用于没有显示器的门禁终端。
+
+与界面版本共用FaceTools、存储后端、FaceGallery、FaceDetector和AutoRecognizer，
+在一个循环中完成 采集 → 检测 → 特征提取 → 比对 → 开锁，不导入任何Qt模块。
+cv2和face_recognition在真正开始处理画面时才导入，--help和参数检查可以立即返回。
+
+用法：
+    python FaceService.py [--source 0 | --source 录像.mp4] [--storage mysql] [--serial /dev/ttyUSB0]
+                          [--tolerance 0.6] [--confirm-hits 3] [--max-frames N] [--dry-run]
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+
+from FaceStorage import open_storage
+from FaceTool import FaceTools
+from FaceGallery import FaceGallery
+from FaceSync import FaceSync
+from FaceIndex import open_index
+from FaceTracker import AutoRecognizer
+from FrameQueue import FrameStats, LatestFrameQueue, READ_FAILURE_LIMIT
+from FaceMetrics import METRICS, CAPTURE_SECONDS, FRAMES_TOTAL, RollingFileExporter
+from FaceCache import RecognitionCache, Debouncer
+from SerialChannel import SerialChannel, PySerialTransport
+
+
+# 定义一个名为SerialUnlocker的类，通过串口向门锁控制器发送开锁指令，与界面版本的sendOpenSignal发送相同的数据
+class SerialUnlocker:
+    def __init__(self, port=None, baudrate=115200, require_ack=False):
+        """
+        类的构造函数。
+
+        参数:
+        - port: 串口名称，例如"COM3"或"/dev/ttyUSB0"，为None或"auto"时自动选择。
+        - baudrate: 波特率，默认为115200，数据位、校验位、停止位与界面版本相同（8N1，无流控）。
+        - require_ack: 是否等待控制器回复ok后才认为开锁完成，默认为False。
+
+        使用pyserial访问串口（见SerialChannel.PySerialTransport），串口在后台线程中打开、写入并在断开后自动重连，
+        识别循环调用本对象时只把开锁请求放入队列，不会被串口阻塞。
+        """
+        self.port = port
+        self.channel = SerialChannel(PySerialTransport(None if port == "auto" else port, baudrate),
+                                     require_ack=require_ack)
+        self.channel.on_unlocked = lambda latency: print(f"开锁完成，耗时 {latency * 1000:.1f} ms")
+        self.channel.on_failed = lambda message: print(f"开锁失败: {message}")
+        self.channel.start()
+
+    def __call__(self, event):
+        self.channel.send_open()
+
+    def close(self):
+        self.channel.stop()
+
+
+def parse_source(text):
+    # 纯数字表示摄像头设备编号，否则视为视频文件路径
+    return int(text) if text.isdigit() else text
+
+
+# 定义一个名为FaceService的类，在无界面环境中运行完整的识别流程
+class FaceService:
+    def __init__(self, gallery, source=0, cascade_path=None, tolerance=0.6, confirm_hits=3, unlock=None,
+                 detector_options=None, encode_workers=0, unlock_debounce=3.0):
+        """
+        类的构造函数。
+
+        参数:
+        - gallery: 已加载的FaceGallery人脸库。
+        - source: 摄像头设备编号或视频文件路径，默认为0。
+        - cascade_path: Haar人脸检测器文件路径，默认为XML/haarcascade_frontalface_default.xml。
+        - tolerance, confirm_hits: 传给AutoRecognizer的识别阈值和确认所需的连续命中次数。
+        - unlock: 确认身份后调用的函数，参数为(学号, 姓名, 距离)，默认为None表示只打印日志。
+        - detector_options: 传给FaceDetector的其他参数（例如scale、min_face），默认为None。
+        - encode_workers: 并行提取特征编码的工作进程数（见EncoderPool），默认为0，表示在识别循环中逐张提取。
+        - unlock_debounce: 两次开锁之间的最短间隔（秒），默认为3秒；同一个人离开画面又回来、或几个人同时确认身份时只开锁一次。
+
+        摄像头输入时由单独的采集线程读取画面并放入最新帧队列，处理速度跟不上时丢弃旧帧，保证识别的总是当前画面；
+        视频文件输入时按顺序处理每一帧，不丢帧，便于用录像复现问题。
+        """
+        self.gallery = gallery
+        self.source = source
+        self.cascade_path = cascade_path or os.path.join('XML', 'haarcascade_frontalface_default.xml')
+        self.tolerance = tolerance
+        self.confirm_hits = confirm_hits
+        self.unlock = unlock
+        self.detector_options = detector_options or {}
+        self.encode_workers = encode_workers
+        self.encoder_pool = None
+        self.cache = RecognitionCache(gallery)
+        self.debouncer = Debouncer(unlock_debounce)
+        self.capture_stats = FrameStats("采集")
+        self.detect_stats = FrameStats("检测")
+        # 实际发出的开锁指令次数
+        self.unlocks = 0
+        # 特征提取模型加载失败时的错误信息，run方法据此结束识别循环并抛出RuntimeError
+        self._model_error = None
+        self._running = False
+
+    def _setup(self):
+        # 在这里才导入cv2和face_recognition，启动和参数检查不受这两个库的导入时间影响；
+        # 摄像头输入时特征提取模型（以及进程池各个工作进程中的模型）在后台线程中加载，与打开摄像头同时进行，
+        # 加载完成之前识别器只跟踪人脸、不提取特征；视频文件输入时先加载完模型再开始处理，保证每一帧都会提取特征
+        import cv2
+        from FaceDetector import FaceDetector
+        from FaceEncoder import encode_face, models_loaded
+        face_cascade = cv2.CascadeClassifier(self.cascade_path)
+        if face_cascade.empty():
+            raise RuntimeError(f"无法加载人脸检测器文件: {self.cascade_path}")
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise RuntimeError(f"无法打开视频源: {self.source}")
+        detector = FaceDetector(face_cascade, **self.detector_options)
+        if self.encode_workers > 1:
+            from EncoderPool import EncoderPool
+            self.encoder_pool = EncoderPool(workers=self.encode_workers)
+        self._model_error = None
+        if isinstance(self.source, int):
+            threading.Thread(target=self._load_models, args=(self.encoder_pool,), name="ModelLoader",
+                             daemon=True).start()
+        elif not self._load_models(self.encoder_pool):
+            cap.release()
+            if self.encoder_pool is not None:
+                self.encoder_pool.close()
+                self.encoder_pool = None
+            raise RuntimeError(self._model_error)
+        recognizer = AutoRecognizer(self.gallery, encode_face, tolerance=self.tolerance,
+                                    confirm_hits=self.confirm_hits,
+                                    batch_encoder=self.encoder_pool.encode_all if self.encoder_pool else None,
+                                    cache=self.cache, ready=models_loaded)
+        return cap, detector, recognizer
+
+    def run(self, max_frames=None):
+        """
+        运行识别循环，直到视频结束、处理了max_frames帧或调用了stop方法。返回处理的帧数。
+        无法打开视频源或加载特征提取模型失败（包括摄像头输入时在后台加载失败）时抛出RuntimeError。
+        """
+        cap, detector, recognizer = self._setup()
+        self._running = True
+        processed = 0
+        frame_queue = None
+        capture_thread = None
+        if isinstance(self.source, int):
+            frame_queue = LatestFrameQueue(maxsize=1, stats=self.capture_stats)
+            capture_thread = threading.Thread(target=self._capture, args=(cap, frame_queue), daemon=True)
+            capture_thread.start()
+        try:
+            while self._running and self._model_error is None and (max_frames is None or processed < max_frames):
+                if frame_queue is not None:
+                    frame = frame_queue.get(timeout=0.5)
+                    if frame is None:
+                        continue
+                else:
+                    with CAPTURE_SECONDS.time():
+                        ret, frame = cap.read()
+                    if not ret:
+                        break
+                    self.capture_stats.tick()
+                    FRAMES_TOTAL.inc()
+                faces = detector.detect(frame)
+                for event in recognizer.process(frame, faces):
+                    self._on_recognized(event)
+                self.detect_stats.tick()
+                processed += 1
+        finally:
+            self._running = False
+            if frame_queue is not None:
+                frame_queue.close()
+                capture_thread.join()
+            cap.release()
+            if self.encoder_pool is not None:
+                self.encoder_pool.close()
+                self.encoder_pool = None
+        if self._model_error is not None:
+            raise RuntimeError(self._model_error)
+        return processed
+
+    def _load_models(self, encoder_pool):
+        # 加载模型：先加载当前进程的模型，再启动进程池的全部工作进程。
+        # 成功时返回True；失败时记录错误信息并返回False，识别循环随之结束，由run方法抛出RuntimeError
+        from FaceEncoder import load_models
+        try:
+            seconds = load_models()
+            if encoder_pool is not None:
+                encoder_pool.warm_up()
+        except Exception as e:
+            self._model_error = f"加载人脸特征提取模型失败: {e}"
+            return False
+        print(f"人脸特征提取模型加载完成，用时 {seconds:.1f} 秒")
+        return True
+
+    def _capture(self, cap, frame_queue):
+        # 摄像头采集线程：持续读取画面放入最新帧队列，连续读取失败时逐渐延长等待时间，失败次数过多时结束运行
+        failures = 0
+        while self._running:
+            with CAPTURE_SECONDS.time():
+                ret, frame = cap.read()
+            if not ret:
+                self.capture_stats.drop()
+                failures += 1
+                if failures >= READ_FAILURE_LIMIT:
+                    print("无法读取摄像头画面，摄像头可能已断开")
+                    self._running = False
+                    return
+                time.sleep(min(0.01 * failures, 0.2))
+                continue
+            failures = 0
+            self.capture_stats.tick()
+            FRAMES_TOTAL.inc()
+            frame_queue.put(frame)
+
+    def _on_recognized(self, event):
+        id_val, name_val, distance = event
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} 识别到学号 {id_val} 的人脸：{name_val}（距离 {distance:.3f}）")
+        # 只统计真正发出的开锁指令，防抖时间内被忽略的识别结果不计入
+        if self.unlock is not None and self.debouncer.allow("open"):
+            self.unlocks += 1
+            self.unlock(event)
+
+    def stop(self):
+        """
+        请求识别循环退出，可以在其他线程或信号处理函数中调用。
+        """
+        self._running = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无界面的人脸识别门禁服务")
+    parser.add_argument("--source", default="0", help="摄像头设备编号或视频文件路径，默认为0")
+    parser.add_argument("--storage", default=os.environ.get("FACE_STORAGE", "mysql"),
+                        help="存储后端：mysql、sqlite:路径或snapshot:目录，默认读取环境变量FACE_STORAGE")
+    parser.add_argument("--cascade", default=os.path.join('XML', 'haarcascade_frontalface_default.xml'),
+                        help="Haar人脸检测器文件路径")
+    parser.add_argument("--serial", default=None, help="门锁控制器的串口，例如COM3或/dev/ttyUSB0，auto表示自动选择")
+    parser.add_argument("--baudrate", type=int, default=115200, help="串口波特率")
+    parser.add_argument("--serial-ack", action="store_true", help="等待门锁控制器回复ok后才认为开锁完成（需要固件支持）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印识别结果，不发送开锁指令")
+    parser.add_argument("--tolerance", type=float, default=0.6, help="识别阈值")
+    parser.add_argument("--confirm-hits", type=int, default=3, help="确认身份所需的连续命中次数")
+    parser.add_argument("--scale", type=float, default=0.5, help="检测前画面的缩放比例")
+    parser.add_argument("--encode-workers", type=int, default=0,
+                        help="画面中有多张人脸时并行提取特征编码的工作进程数，0或1表示不使用进程池")
+    parser.add_argument("--unlock-debounce", type=float, default=3.0, help="两次开锁之间的最短间隔（秒）")
+    parser.add_argument("--sync-interval", type=float, default=5.0, help="人脸库增量同步的间隔（秒）")
+    parser.add_argument("--snapshot-dir", default="gallery_snapshot",
+                        help="本地人脸库快照目录，启动时先从快照恢复再在后台与数据库核对，空字符串表示不使用快照")
+    parser.add_argument("--index", default=os.environ.get("FACE_INDEX", ""),
+                        help="人脸库检索索引：空字符串表示精确暴力比对，brute，或ivf（可带参数，例如ivf:nprobe=16），"
+                             "默认读取环境变量FACE_INDEX")
+    parser.add_argument("--index-path", default=os.environ.get("FACE_INDEX_PATH") or None,
+                        help="检索索引文件的保存位置，默认保存在快照目录中，默认读取环境变量FACE_INDEX_PATH")
+    parser.add_argument("--max-frames", type=int, default=None, help="处理的最大帧数，默认不限制")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="打印统计信息的间隔（秒），0表示不打印")
+    parser.add_argument("--metrics-port", type=int, default=None, help="在本机该端口提供Prometheus格式的/metrics")
+    parser.add_argument("--metrics-file", default=None, help="定期把指标写入该文件")
+    args = parser.parse_args()
+
+    unlock = None
+    if args.serial and not args.dry_run:
+        # 串口暂时不可用时不再退出，后台线程会持续重试连接
+        unlock = SerialUnlocker(args.serial, args.baudrate, require_ack=args.serial_ack)
+    elif not args.dry_run:
+        print("未指定--serial，只打印识别结果")
+
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+    metrics_file = None
+    if args.metrics_file:
+        metrics_file = RollingFileExporter(METRICS, args.metrics_file)
+        metrics_file.start()
+
+    # 从快照恢复人脸库时不等待数据库：连接、迁移和核对都在同步线程中完成，识别循环可以立即开始
+    facesql = open_storage(args.storage, connect=False)
+    gallery = FaceGallery(FaceTools(facesql), index=open_index(args.index))
+    face_sync = FaceSync(gallery, facesql, interval=args.sync_interval, snapshot_dir=args.snapshot_dir or None,
+                         index_path=args.index_path)
+    restored = face_sync.load_snapshot()
+    face_sync.start(background=restored)
+    print(f"人脸库已{'从快照恢复' if restored else '加载'} {len(gallery)} 条记录")
+
+    service = FaceService(gallery, source=parse_source(args.source), cascade_path=args.cascade,
+                          tolerance=args.tolerance, confirm_hits=args.confirm_hits, unlock=unlock,
+                          detector_options=dict(scale=args.scale), encode_workers=args.encode_workers,
+                          unlock_debounce=args.unlock_debounce)
+
+    # Ctrl+C或systemd发送的SIGTERM都让识别循环正常退出
+    signal.signal(signal.SIGINT, lambda *_: service.stop())
+    signal.signal(signal.SIGTERM, lambda *_: service.stop())
+
+    stop_stats = threading.Event()
+
+    def print_stats():
+        while not stop_stats.wait(args.stats_interval):
+            print(f"{service.capture_stats}    {service.detect_stats}    开锁 {service.unlocks} 次    {service.cache}")
+
+    if args.stats_interval > 0:
+        threading.Thread(target=print_stats, daemon=True).start()
+
+    start = time.perf_counter()
+    try:
+        processed = service.run(max_frames=args.max_frames)
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        stop_stats.set()
+        face_sync.stop()
+        if metrics_file is not None:
+            metrics_file.stop()
+        if unlock is not None:
+            unlock.close()
+    elapsed = time.perf_counter() - start
+    print(f"共处理 {processed} 帧，用时 {elapsed:.1f} 秒，开锁 {service.unlocks} 次")
+    print(METRICS.summary())
+
+
+if __name__ == "__main__":
+    main()
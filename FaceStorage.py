@@ -0,0 +1,415 @@
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+
+# 定义一个名为DuplicateRecordError的异常类，插入的记录因学号或姓名重复而违反唯一约束时抛出
+class DuplicateRecordError(Exception):
+    pass
+
+
+# 定义一个名为FaceStorage的基类，规定人脸数据存储后端需要实现的接口，FaceTools只依赖这些方法
+class FaceStorage:
+    # 是否支持按水位线增量同步（syncWatermarks和changesSince），FaceSync据此决定是否启动轮询
+    SUPPORTS_SYNC = False
+
+    def saveFaceData(self, id_val, name_val, encoding_str):
+        """
+        保存一条人脸记录，成功返回True，失败返回False；学号或姓名重复时抛出DuplicateRecordError。
+        """
+        raise NotImplementedError
+
+    def saveFaceDataBatch(self, rows, chunk_size=500):
+        """
+        批量保存(id, name, encoding)记录，返回(成功插入的记录列表, [(记录, 异常), ...])。
+        学号或姓名重复的记录对应的异常为DuplicateRecordError，其余异常（例如数据库连接不可用）由调用方决定是否重试。
+        """
+        raise NotImplementedError
+
+    def allFaceData(self):
+        """
+        返回所有记录的(id, name, encoding)列表。
+        """
+        raise NotImplementedError
+
+    def countFaceData(self):
+        """
+        返回记录总数，用于预先分配特征矩阵；无法获取时返回None。
+        """
+        return None
+
+    def iterFaceData(self, chunk_size=1000):
+        """
+        按记录编号顺序分块返回所有记录的生成器，每块为最多chunk_size条(id, name, encoding)组成的列表。
+        默认实现基于allFaceData，支持流式读取的后端应重写该方法，使内存占用与块大小而不是表的大小相关。
+        """
+        rows = self.allFaceData()
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    def allFaceMatrix(self):
+        """
+        直接返回(ids, names, (N, 128)特征矩阵)的快速加载路径。
+        不支持的后端返回None，此时FaceTools会通过iterFaceData分块读取并解码到预先分配的矩阵中。
+        """
+        return None
+
+    def allFaceKeys(self):
+        """
+        返回所有记录的(id, name)列表，出错时返回None。
+        """
+        raise NotImplementedError
+
+    def record_exists(self, id_val, name_val):
+        """
+        检查是否已存在指定学号或姓名的记录。
+        """
+        raise NotImplementedError
+
+    def encodingColumnIsBinary(self):
+        """
+        返回该后端是否以二进制格式保存人脸编码，暂时无法判断（例如数据库不可用）时返回None。
+        """
+        return True
+
+    def convertEncodingColumnToBlob(self):
+        return True
+
+    def allFaceEncodings(self):
+        """
+        返回所有记录的(记录编号, encoding)列表，供编码格式迁移使用。
+        """
+        return []
+
+    def updateFaceEncodings(self, rows):
+        return True
+
+    def deleteFaceData(self, id_val):
+        """
+        删除指定学号的记录，数据库触发器会同时写入一条删除标记（tombstone），供其他终端增量同步。
+        删除成功返回True。
+        """
+        return False
+
+    def saveFaceQuality(self, id_val, quality):
+        """
+        保存指定学号的录入质量信息（多张照片录入时由FaceTemplate.build_template生成的字典），同一学号重复保存时覆盖。
+        质量信息只用于查看和排查识别效果，不参与比对；不支持的后端直接返回False。
+        """
+        return False
+
+    def checkConnection(self):
+        """
+        检查存储后端是否可用，需要时完成表结构迁移，返回是否可用。
+        嵌入式后端总是可用；FaceSQL在构造时延迟连接（connect=False）时，由FaceSync在后台线程中调用。
+        """
+        return True
+
+    def syncWatermarks(self):
+        """
+        返回当前的(最大记录编号, 最大删除标记编号)，作为增量同步的起始水位线。
+        不支持增量同步的后端（SUPPORTS_SYNC为False）以及读取失败时返回None。
+        """
+        return None
+
+    def changesSince(self, face_watermark, tombstone_watermark, limit=1000):
+        """
+        返回水位线之后的变化(rows, tombstones)：
+        - rows: 记录编号大于face_watermark的新记录，每项为(记录编号, id, name, encoding)，按记录编号升序，最多limit条；
+        - tombstones: 编号大于tombstone_watermark的删除标记，每项为(删除标记编号, 被删除记录的编号, id)，按编号升序，最多limit条。
+        """
+        return [], []
+
+
+# 定义一个名为SQLiteFaceStorage的类，使用嵌入式SQLite数据库（WAL模式）保存人脸数据，门禁终端无需安装MySQL
+class SQLiteFaceStorage(FaceStorage):
+    SUPPORTS_SYNC = True
+
+    def __init__(self, path="face.db"):
+        """
+        类的构造函数。
+
+        参数:
+        - path: SQLite数据库文件路径，默认为当前目录下的face.db，不存在时自动创建。
+
+        数据库以WAL模式打开，读操作不会被写操作阻塞。SQLite连接不能跨线程使用，因此每个线程各自持有一个连接。
+        表结构与MySQL版本一致，id和name上有唯一约束，encoding以二进制格式保存。
+        """
+        self.path = path
+        self.table_name = 'face'
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} ("
+            "face_number INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "id TEXT NOT NULL UNIQUE, "
+            "name TEXT NOT NULL UNIQUE, "
+            "encoding BLOB NOT NULL)"
+        )
+        # 删除标记表和触发器：任何方式删除face表中的记录时都会留下一条删除标记，供FaceSync增量同步
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS face_tombstone ("
+            "tombstone_number INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "face_number INTEGER NOT NULL, "
+            "id TEXT NOT NULL)"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS face_after_delete AFTER DELETE ON {self.table_name} "
+            "BEGIN INSERT INTO face_tombstone (face_number, id) VALUES (OLD.face_number, OLD.id); END"
+        )
+        # 录入质量信息表：多张照片录入时保存样本数、保留数和离散程度（JSON格式），按学号覆盖
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS face_quality ("
+            "id TEXT PRIMARY KEY, "
+            "quality TEXT NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        # 返回当前线程的数据库连接，首次使用时创建
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def saveFaceData(self, id_val, name_val, encoding_str):
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT INTO {self.table_name}(id, name, encoding) VALUES (?, ?, ?)",
+                    (id_val, name_val, encoding_str)
+                )
+            return True
+        except sqlite3.IntegrityError as e:
+            raise DuplicateRecordError("该学号或姓名已存在") from e
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def saveFaceDataBatch(self, rows, chunk_size=500):
+        sql = f"INSERT INTO {self.table_name}(id, name, encoding) VALUES (?, ?, ?)"
+        conn = self._connection()
+        saved = []
+        failed = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = list(rows[start:start + chunk_size])
+            try:
+                with conn:
+                    conn.executemany(sql, chunk)
+                saved.extend(chunk)
+                continue
+            except Exception as e:
+                print(f"批量插入失败，改为逐条插入: {e}")
+            for row in chunk:
+                try:
+                    with conn:
+                        conn.execute(sql, row)
+                    saved.append(row)
+                except sqlite3.IntegrityError:
+                    failed.append((row, DuplicateRecordError("该学号或姓名已存在")))
+                except Exception as e:
+                    failed.append((row, e))
+        return saved, failed
+
+    def allFaceData(self):
+        try:
+            return self._connection().execute(
+                f"SELECT id, name, encoding FROM {self.table_name} ORDER BY face_number"
+            ).fetchall()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return []
+
+    def countFaceData(self):
+        try:
+            return self._connection().execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def iterFaceData(self, chunk_size=1000):
+        # SQLite的游标本身就是逐行从数据库文件读取的，用fetchmany分块即可
+        cursor = self._connection().execute(
+            f"SELECT id, name, encoding FROM {self.table_name} ORDER BY face_number"
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def allFaceKeys(self):
+        try:
+            return self._connection().execute(f"SELECT id, name FROM {self.table_name}").fetchall()
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def record_exists(self, id_val, name_val):
+        try:
+            row = self._connection().execute(
+                f"SELECT EXISTS(SELECT 1 FROM {self.table_name} WHERE id = ?) "
+                f"OR EXISTS(SELECT 1 FROM {self.table_name} WHERE name = ?)",
+                (id_val, name_val)
+            ).fetchone()
+            return bool(row[0])
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def allFaceEncodings(self):
+        return self._connection().execute(
+            f"SELECT face_number, encoding FROM {self.table_name}"
+        ).fetchall()
+
+    def updateFaceEncodings(self, rows):
+        try:
+            with self._connection() as conn:
+                conn.executemany(f"UPDATE {self.table_name} SET encoding = ? WHERE face_number = ?", rows)
+            return True
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def deleteFaceData(self, id_val):
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute(f"DELETE FROM {self.table_name} WHERE id = ?", (id_val,))
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def saveFaceQuality(self, id_val, quality):
+        try:
+            with self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO face_quality(id, quality) VALUES (?, ?)",
+                             (id_val, json.dumps(quality)))
+            return True
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return False
+
+    def syncWatermarks(self):
+        try:
+            conn = self._connection()
+            face_watermark = conn.execute(f"SELECT COALESCE(MAX(face_number), 0) FROM {self.table_name}").fetchone()[0]
+            tombstone_watermark = conn.execute("SELECT COALESCE(MAX(tombstone_number), 0) FROM face_tombstone").fetchone()[0]
+            return face_watermark, tombstone_watermark
+        except Exception as e:
+            print(f"执行SQL失败: {e}")
+            return None
+
+    def changesSince(self, face_watermark, tombstone_watermark, limit=1000):
+        conn = self._connection()
+        rows = conn.execute(
+            f"SELECT face_number, id, name, encoding FROM {self.table_name} "
+            "WHERE face_number > ? ORDER BY face_number LIMIT ?",
+            (face_watermark, limit)
+        ).fetchall()
+        tombstones = conn.execute(
+            "SELECT tombstone_number, face_number, id FROM face_tombstone "
+            "WHERE tombstone_number > ? ORDER BY tombstone_number LIMIT ?",
+            (tombstone_watermark, limit)
+        ).fetchall()
+        return rows, tombstones
+
+
+# 定义一个名为SnapshotFaceStorage的类，从内存映射的.npy特征矩阵和JSON元数据中读取人脸库，适用于只读为主的门禁终端
+class SnapshotFaceStorage(FaceStorage):
+    # 快照目录中特征矩阵和元数据的文件名
+    MATRIX_FILE = "encodings.npy"
+    META_FILE = "meta.json"
+
+    def __init__(self, directory):
+        """
+        类的构造函数。
+
+        参数:
+        - directory: 快照目录，由SnapshotFaceStorage.write生成，包含encodings.npy和meta.json两个文件。
+
+        特征矩阵以内存映射方式打开（np.load的mmap_mode='r'），加载时不需要读取和解析整个文件，
+        由操作系统按需把页面读入内存，多个进程还可以共享同一份页面缓存。
+        该后端是只读的，新的人脸需要在中心数据库录入后重新生成快照。
+        """
+        self.directory = directory
+        with open(os.path.join(directory, self.META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.ids = self.meta['ids']
+        self.names = self.meta['names']
+        self.matrix = np.load(os.path.join(directory, self.MATRIX_FILE), mmap_mode='r')
+        self._id_set = set(self.ids)
+        self._name_set = set(self.names)
+
+    @classmethod
+    def write(cls, directory, ids, names, matrix, **extra_meta):
+        """
+        把人脸库写成快照目录。
+
+        参数:
+        - directory: 快照目录，不存在时自动创建。
+        - ids, names: 学号和姓名列表。
+        - matrix: 形状为(N, 128)的特征矩阵，以float32保存。
+        - extra_meta: 额外写入meta.json的信息（例如生成时间、数据库版本）。
+
+        先写入临时文件再重命名，保证正在读取快照的进程不会读到写了一半的文件。
+        """
+        os.makedirs(directory, exist_ok=True)
+        matrix_path = os.path.join(directory, cls.MATRIX_FILE)
+        meta_path = os.path.join(directory, cls.META_FILE)
+        with open(matrix_path + ".tmp", 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, 128))
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(dict(extra_meta, ids=list(ids), names=list(names)), f, ensure_ascii=False)
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def saveFaceData(self, id_val, name_val, encoding_str):
+        print("快照存储为只读，无法录入新的人脸数据")
+        return False
+
+    def saveFaceDataBatch(self, rows, chunk_size=500):
+        return [], [(row, PermissionError("快照存储为只读")) for row in rows]
+
+    def allFaceData(self):
+        return [(i, n, row) for i, n, row in zip(self.ids, self.names, self.matrix)]
+
+    def countFaceData(self):
+        return len(self.ids)
+
+    def allFaceMatrix(self):
+        return list(self.ids), list(self.names), self.matrix
+
+    def allFaceKeys(self):
+        return list(zip(self.ids, self.names))
+
+    def record_exists(self, id_val, name_val):
+        return id_val in self._id_set or name_val in self._name_set
+
+
+def open_storage(spec="mysql", connect=True):
+    """
+    根据字符串描述创建存储后端：
+    - "mysql"：中心MySQL数据库（FaceSQL，连接参数见FaceSQL.DB_CONFIG）；connect为False时构造时不连接数据库，
+      第一次使用时才建立连接（见FaceSQL的connect参数）；
+    - "sqlite:路径"：嵌入式SQLite数据库，例如"sqlite:face.db"；
+    - "snapshot:目录"：只读的内存映射快照，例如"snapshot:gallery"。
+    """
+    kind, _, arg = spec.partition(':')
+    if kind == 'mysql':
+        from FaceSQL import FaceSQL
+        return FaceSQL(connect=connect)
+    if kind == 'sqlite':
+        return SQLiteFaceStorage(arg or "face.db")
+    if kind == 'snapshot':
+        return SnapshotFaceStorage(arg or "gallery")
+    raise ValueError(f"未知的存储后端: {spec}")
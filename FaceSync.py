@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+from FaceMetrics import SYNC_SECONDS, SNAPSHOT_LOAD_SECONDS
+from FaceStorage import SnapshotFaceStorage
+from FaceIndex import load_index
+
+# 检索索引默认保存在快照目录中的文件名
+INDEX_FILE = "index.npz"
+
+
+# 定义一个名为FaceSync的类，按水位线从数据库增量拉取新录入和已删除的人脸，使多台门禁终端的内存人脸库保持一致
+class FaceSync:
+    def __init__(self, gallery, storage, interval=5.0, batch_size=1000, lookback=50, snapshot_dir=None,
+                 snapshot_interval=60.0, index_path=None):
+        """
+        类的构造函数。
+
+        参数:
+        - gallery: 需要保持同步的FaceGallery实例。
+        - storage: 存储后端，SUPPORTS_SYNC为True时（FaceSQL和SQLiteFaceStorage）通过syncWatermarks和changesSince增量同步，
+                   其他后端只全量加载一次。
+        - interval: 后台线程的轮询间隔（秒），默认为5秒。
+        - batch_size: 每次查询最多读取的记录数，变化较多时分多页读取，默认为1000。
+        - lookback: 每次轮询额外重读水位线之前的记录数，默认为50。MySQL的自增编号按分配顺序而不是提交顺序增长，
+                    编号较小的事务可能晚于编号较大的事务提交，重读最近的一段记录可以补上这类记录；
+                    重复读到的记录内容不变，FaceGallery.add不会修改人脸库。
+        - snapshot_dir: 本地快照目录，默认为None，表示不使用快照。设置后人脸库连同水位线保存为内存映射的快照
+                        （SnapshotFaceStorage格式），下次启动时先从快照恢复人脸库（见load_snapshot），不必等待数据库。
+        - snapshot_interval: 同步到变化后两次保存快照之间的最短间隔（秒），默认为60秒；停止同步时总会保存一次。
+        - index_path: 人脸库设置了检索索引（FaceGallery的index参数）时，索引文件的保存位置，默认为None，
+                      表示保存在快照目录中（INDEX_FILE），没有快照目录时不保存。索引与快照同时保存，
+                      启动时（从快照恢复或全量加载）读取上次保存的索引，内容与人脸库一致时不必重新训练IVF聚类中心。
+
+        新记录按face_number（自增主键）增量读取，删除通过face_tombstone表中的删除标记同步。
+        每次轮询只做两次主键范围查询，耗时与两次轮询之间发生的变化数量成正比，与face表的大小无关。
+        唯一的例外是删除：如果人脸库的矩阵此前已通过快照交给了比对器，删除前需要复制一次矩阵（每次轮询最多一次）。
+        """
+        self.gallery = gallery
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lookback = lookback
+        self.face_watermark = None
+        self.tombstone_watermark = None
+        # 同步过程中见到的学号及其记录编号，用于判断删除标记对应的是不是人脸库中当前的那条记录
+        self._numbers = {}
+        # 统计信息：轮询次数、应用的新记录数和删除数，以及最近一次轮询的耗时（毫秒）
+        self.polls = 0
+        self.added = 0
+        self.removed = 0
+        self.last_poll_ms = 0.0
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_interval = snapshot_interval
+        self._last_save = 0.0
+        if index_path is None and snapshot_dir:
+            index_path = os.path.join(snapshot_dir, INDEX_FILE)
+        self.index_path = index_path
+        # 人脸库是否从快照恢复、尚未与数据库核对
+        self._restored = False
+        # 人脸库可以用于识别时置位：从快照恢复之后，或者bootstrap全量加载完成之后
+        self.ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_snapshot(self):
+        """
+        从本地快照恢复人脸库和水位线，不访问数据库，返回是否恢复成功。
+
+        快照的特征矩阵以内存映射方式打开，几千人的人脸库恢复只需几毫秒，识别可以立即开始；
+        之后bootstrap会用数据库核对快照（见bootstrap），核对之前人脸库可能缺少快照保存之后才录入的人脸。
+        快照不存在、来自其他类型的存储后端或者文件不完整时打印原因并返回False，此时由bootstrap全量加载。
+        """
+        if not self.snapshot_dir or not os.path.exists(os.path.join(self.snapshot_dir, SnapshotFaceStorage.META_FILE)):
+            return False
+        start = time.perf_counter()
+        try:
+            snapshot = SnapshotFaceStorage(self.snapshot_dir)
+        except (OSError, ValueError) as e:
+            print(f"读取人脸库快照失败: {e}")
+            return False
+        meta = snapshot.meta
+        if meta.get('source') != type(self.storage).__name__ or meta.get('face_watermark') is None:
+            print("人脸库快照不是由当前存储后端生成的，忽略快照")
+            return False
+        if not len(snapshot.ids) == len(snapshot.names) == snapshot.matrix.shape[0]:
+            print("人脸库快照不完整，忽略快照")
+            return False
+        self.gallery.replace(snapshot.ids, snapshot.names, snapshot.matrix, index=self._load_index())
+        self.face_watermark = meta['face_watermark']
+        self.tombstone_watermark = meta['tombstone_watermark']
+        self._numbers = {}
+        self._restored = True
+        self.ready.set()
+        SNAPSHOT_LOAD_SECONDS.observe(time.perf_counter() - start)
+        return True
+
+    def _load_index(self):
+        # 读取上次保存的检索索引；人脸库没有设置索引、文件不存在或无法读取时返回None，由FaceGallery.replace重新构建
+        if self.gallery.index is None or not self.index_path or not os.path.exists(self.index_path):
+            return None
+        try:
+            return load_index(self.index_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取检索索引失败: {e}")
+            return None
+
+    def _save_index(self):
+        # 把检索索引写入临时文件再重命名，写入过程中断电不会损坏上一次保存的索引
+        if self.gallery.index is None or not self.index_path:
+            return
+        directory = os.path.dirname(self.index_path)
+        temp_path = self.index_path + ".tmp"
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                self.gallery.save_index(f)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"保存检索索引失败: {e}")
+
+    def save_snapshot(self):
+        """
+        把人脸库当前的内容和水位线保存为本地快照，返回是否保存成功；人脸库设置了检索索引时同时保存索引（见index_path）。
+
+        只有支持增量同步的存储后端、并且已经完成bootstrap时才保存，保证快照中的水位线不超过人脸库的实际内容
+        （人脸库可以比水位线新，下次启动时重复读到的记录不会改变人脸库）。
+        快照先写入临时文件再重命名，写入过程中断电不会损坏上一次的快照。
+        快照和索引分别保存，两者之间人脸库发生变化也没有关系：加载时索引与人脸库不一致就重新构建。
+        """
+        if self.face_watermark is None or self._restored:
+            return False
+        self._save_index()
+        if not self.snapshot_dir:
+            self._last_save = time.monotonic()
+            return False
+        ids, names, matrix, _ = self.gallery.snapshot()
+        try:
+            SnapshotFaceStorage.write(self.snapshot_dir, ids, names, matrix, source=type(self.storage).__name__,
+                                      face_watermark=self.face_watermark,
+                                      tombstone_watermark=self.tombstone_watermark, saved_at=time.time())
+        except OSError as e:
+            print(f"保存人脸库快照失败: {e}")
+            return False
+        self._last_save = time.monotonic()
+        return True
+
+    def bootstrap(self):
+        """
+        初始化同步：先读取水位线，再全量加载人脸库。
+
+        水位线在加载之前读取，加载期间新写入的记录会在第一次轮询时再读到一次，不会遗漏。
+        人脸库已经从快照恢复时改为核对快照：数据库的水位线不小于快照中的水位线时，从快照的水位线增量同步，
+        再比较人脸数量与face表的记录数，一致时不需要全量加载；否则（数据库被重建、快照过旧等）仍然全量加载。
+        存储后端不支持增量同步（SUPPORTS_SYNC为False）时只全量加载，打印提示并返回False。
+        数据库暂时不可用时抛出异常（读不到水位线时为ConnectionError），人脸库保持原有的内容（例如快照），可以稍后再次调用。
+        """
+        if not self.storage.SUPPORTS_SYNC:
+            self.gallery.load(index=self._load_index())
+            self.ready.set()
+            print("存储后端不支持增量同步")
+            return False
+        watermarks = self.storage.syncWatermarks()
+        if watermarks is None:
+            # 支持增量同步的后端读不到水位线说明数据库暂时不可用，稍后重试
+            raise ConnectionError("无法读取同步水位线")
+        if self._restored:
+            if self._validate(watermarks):
+                return True
+            self._restored = False
+            print("人脸库快照与数据库不一致，重新全量加载")
+        self.gallery.load(index=self._load_index())
+        self._numbers = {}
+        self.ready.set()
+        self.face_watermark, self.tombstone_watermark = watermarks
+        self.save_snapshot()
+        return True
+
+    def _validate(self, watermarks):
+        # 用数据库核对从快照恢复的人脸库：先从快照的水位线增量同步，再比较记录数。
+        # 核对途中出错时保持_restored，下一次bootstrap从已经同步到的水位线继续核对
+        face_watermark, tombstone_watermark = watermarks
+        if face_watermark < self.face_watermark or tombstone_watermark < self.tombstone_watermark:
+            return False
+        added, removed = self.poll()
+        count = self.storage.countFaceData()
+        if count is None:
+            raise ConnectionError("无法读取face表的记录数，暂时使用快照中的人脸库")
+        if count != len(self.gallery):
+            return False
+        self._restored = False
+        print(f"人脸库快照已与数据库核对：新增 {added} 条，删除 {removed} 条")
+        if added or removed:
+            self.save_snapshot()
+        return True
+
+    def poll(self):
+        """
+        执行一次增量同步，返回(新增或更新的记录数, 删除的记录数)。
+
+        每一页先应用新记录再应用删除标记。删除标记中保存了被删除记录的编号，
+        只有当它不早于人脸库中该学号当前记录的编号时才删除，因此“删除后用同一学号重新录入”不会误删新记录。
+        """
+        if self.face_watermark is None:
+            raise RuntimeError("请先调用bootstrap初始化同步")
+        start = time.perf_counter()
+        added = removed = 0
+        face_from = max(0, self.face_watermark - self.lookback)
+        while True:
+            rows, tombstones = self.storage.changesSince(face_from, self.tombstone_watermark, self.batch_size)
+            for face_number, id_val, name_val, encoding in rows:
+                self._numbers[id_val] = face_number
+                if self.gallery.add(self.gallery.facetools.decoding_FaceStr(encoding), id_val, name_val):
+                    added += 1
+                face_from = face_number
+            for tombstone_number, face_number, id_val in tombstones:
+                if face_number >= self._numbers.get(id_val, 0):
+                    self._numbers.pop(id_val, None)
+                    if self.gallery.remove(id_val):
+                        removed += 1
+                self.tombstone_watermark = tombstone_number
+            if len(rows) < self.batch_size and len(tombstones) < self.batch_size:
+                break
+        self.face_watermark = max(self.face_watermark, face_from)
+        self.polls += 1
+        self.added += added
+        self.removed += removed
+        elapsed = time.perf_counter() - start
+        SYNC_SECONDS.observe(elapsed)
+        self.last_poll_ms = elapsed * 1000
+        return added, removed
+
+    def start(self, background=False):
+        """
+        启动后台轮询线程，每隔interval秒调用一次poll。尚未初始化时先调用bootstrap。
+
+        参数:
+        - background: 是否在后台线程中调用bootstrap，默认为False。人脸库已经从快照恢复时可以设置为True，
+          数据库的连接、迁移和核对都在后台完成，调用方不必等待。
+        两种方式下数据库不可用时都每隔interval秒重试一次bootstrap：background为False时start一直等到初始化完成才返回。
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if not background and (self.face_watermark is None or self._restored):
+            if not self._bootstrap_until_ready():
+                return
+        self._thread = threading.Thread(target=self._run, args=(background,), name="FaceSync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止后台轮询线程并等待其退出，设置了快照目录时保存一次快照。
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.save_snapshot()
+
+    def _bootstrap_until_ready(self):
+        # 完成数据库连接和bootstrap，数据库不可用时每隔interval秒重试，期间人脸库保持原有的内容（例如快照）；
+        # 返回是否需要继续轮询：存储后端不支持增量同步或者已经调用stop时返回False
+        while not self._stop.is_set():
+            try:
+                if self.storage.checkConnection():
+                    return self.bootstrap()
+            except Exception as e:
+                print(f"人脸库初始化失败: {e}")
+            self._stop.wait(self.interval)
+        return False
+
+    def _run(self, background=False):
+        if background and not self._bootstrap_until_ready():
+            return
+        while not self._stop.wait(self.interval):
+            try:
+                added, removed = self.poll()
+                if added or removed:
+                    print(f"人脸库同步：新增 {added} 条，删除 {removed} 条")
+                    if time.monotonic() - self._last_save >= self.snapshot_interval:
+                        self.save_snapshot()
+            except Exception as e:
+                # 数据库暂时不可用时保留水位线，下一次轮询从同一位置继续
+                print(f"人脸库同步失败: {e}")
@@ -0,0 +1,96 @@
+"""
+多张照片录入：把同一个人连拍得到的多个特征编码合并为一个模板。
+
+连拍的几帧中可能混入闭眼、侧脸、运动模糊或者检测框偏移的样本，这些样本与其他样本的距离明显偏大。
+先按样本之间的相互距离剔除离群样本，再对剩余样本取平均作为该人的模板，
+人脸库中每人仍然只有一条记录，比对开销与人数成正比，而不是与录入的照片数量成正比。
+
+本模块只依赖numpy，所有函数都是纯函数，可以直接用合成的特征编码验证。
+"""
+import numpy as np
+
+# 同一个人的两张照片在face_recognition中的距离通常小于0.4，识别阈值为0.6；
+# 连拍样本与其他样本的中位距离超过该值时，认为该样本质量不足
+DEFAULT_MAX_DISTANCE = 0.45
+# 离群判定使用的中位数绝对偏差（MAD）倍数
+DEFAULT_MAD_FACTOR = 3.0
+
+
+def pairwise_distances(encodings):
+    """
+    计算多个特征编码两两之间的欧氏距离，返回(n, n)矩阵。
+
+    参数:
+    - encodings: 形状为(n, 128)的数组或由128维编码组成的列表。
+    """
+    matrix = np.asarray(encodings, dtype=np.float64)
+    squared = np.einsum('ij,ij->i', matrix, matrix)
+    dist = squared[:, None] + squared[None, :] - 2.0 * matrix @ matrix.T
+    np.maximum(dist, 0.0, out=dist)
+    np.fill_diagonal(dist, 0.0)
+    return np.sqrt(dist)
+
+
+def reject_outliers(encodings, max_distance=DEFAULT_MAX_DISTANCE, mad_factor=DEFAULT_MAD_FACTOR):
+    """
+    按相互距离剔除离群样本。
+
+    参数:
+    - encodings: 同一个人的多个特征编码，形状为(n, 128)。
+    - max_distance: 样本到其他样本的中位距离的上限，默认为DEFAULT_MAX_DISTANCE。
+    - mad_factor: 中位距离超过所有样本中位距离的中位数加上mad_factor倍MAD时视为离群，默认为3。
+
+    每个样本的得分是它到其他样本距离的中位数，少数离群样本不会拉高正常样本的得分；
+    得分同时满足绝对上限和相对上限的样本被保留。只有一个样本时直接保留。
+    返回(保留的样本下标列表, 剔除的样本下标列表)。
+    """
+    count = len(encodings)
+    if count < 2:
+        return list(range(count)), []
+    dist = pairwise_distances(encodings)
+    # 去掉对角线上的0，每行剩下到其他样本的n-1个距离
+    others = dist[~np.eye(count, dtype=bool)].reshape(count, count - 1)
+    scores = np.median(others, axis=1)
+    center = np.median(scores)
+    mad = np.median(np.abs(scores - center))
+    limit = min(max_distance, center + mad_factor * mad) if mad > 0 else max_distance
+    kept = [i for i in range(count) if scores[i] <= limit]
+    rejected = [i for i in range(count) if scores[i] > limit]
+    return kept, rejected
+
+
+def aggregate_template(encodings):
+    """
+    把多个特征编码合并为一个模板（逐维平均），返回128维的float64数组。
+    """
+    return np.asarray(encodings, dtype=np.float64).mean(axis=0)
+
+
+def build_template(encodings, min_samples=3, max_distance=DEFAULT_MAX_DISTANCE, mad_factor=DEFAULT_MAD_FACTOR):
+    """
+    从连拍得到的特征编码生成模板：剔除离群样本后对剩余样本取平均。
+
+    参数:
+    - encodings: 同一个人的多个特征编码，无法提取编码的帧（None）会被忽略。
+    - min_samples: 剔除离群样本后至少需要保留的样本数，默认为3。
+    - max_distance, mad_factor: 含义与reject_outliers相同。
+
+    返回(模板, 质量信息)，质量信息为字典：
+    - samples: 提供的有效样本数；
+    - kept: 保留的样本数；
+    - spread: 保留的样本到模板的平均距离，越小说明连拍的各帧越一致；
+    - max_distance: 保留的样本到模板的最大距离。
+    保留的样本不足min_samples个时抛出ValueError。
+    """
+    valid = [np.asarray(e, dtype=np.float64) for e in encodings if e is not None]
+    if len(valid) < min_samples:
+        raise ValueError(f"有效的人脸样本只有 {len(valid)} 个，至少需要 {min_samples} 个")
+    kept, _ = reject_outliers(valid, max_distance, mad_factor)
+    if len(kept) < min_samples:
+        raise ValueError(f"剔除离群样本后只剩 {len(kept)} 个样本，至少需要 {min_samples} 个，请正对摄像头重新录入")
+    samples = np.vstack([valid[i] for i in kept])
+    template = aggregate_template(samples)
+    distances = np.linalg.norm(samples - template, axis=1)
+    quality = dict(samples=len(valid), kept=len(kept), spread=round(float(distances.mean()), 4),
+                   max_distance=round(float(distances.max()), 4))
+    return template, quality
@@ -1,16 +1,32 @@
+import struct
 import numpy as np
+from FaceMetrics import DB_WRITE_SECONDS
 
-# 定义一个名为FaceTools的类，用于处理面部相关的工具方法，它依赖于FaceSQL类来与数据库进行交互
+# 二进制人脸编码格式的文件头：魔数(2字节) + 格式版本(1字节) + 数据类型代码(1字节) + 维度(2字节) + 保留字段(2字节)
+# 文件头共8字节，使其后的float32/float64数据保持内存对齐，np.frombuffer可以直接零拷贝解码
+FACE_BLOB_MAGIC = b'FE'
+FACE_BLOB_VERSION = 1
+FACE_BLOB_HEADER = struct.Struct('<2sBBHH')
+# 数据类型代码与小端序numpy数据类型的对应关系
+FACE_BLOB_DTYPES = {1: np.dtype('<f4'), 2: np.dtype('<f8')}
+
+# 定义一个名为FaceTools的类，用于处理面部相关的工具方法，它依赖于FaceStorage存储接口（例如FaceSQL）来读写人脸数据
 class FaceTools:
     def __init__(self, facesql):
         """
         类的构造函数，用于初始化FaceTools类的实例。
 
         参数:
-        - facesql: 一个FaceSQL类的实例，通过这个实例来调用数据库操作相关的方法，
-                   以此实现FaceTools类中与数据库交互的功能。
+        - facesql: 一个FaceStorage存储后端的实例（MySQL版本的FaceSQL、FaceStorage中的SQLite或快照后端），
+                   通过这个实例来调用数据库操作相关的方法，以此实现FaceTools类中与数据库交互的功能。
+
+        gallery属性用于关联一个常驻内存的FaceGallery人脸库，初始为None；
+        关联之后，add_Face成功写入数据库的记录会同步追加到人脸库中，无需重新加载整张表。
         """
         self.facesql = facesql
+        self.gallery = None
+        # 数据库encoding字段是否已迁移为BLOB类型，首次写入时查询一次并缓存，None表示尚未查询
+        self._binary_storage = None
 
     def encoding_FaceStr(self, image_face_encoding):
         """
@@ -25,23 +41,78 @@ class FaceTools:
         """
         return ','.join(map(str, image_face_encoding.tolist()))
 
+    def encoding_FaceBlob(self, image_face_encoding, dtype=np.float32):
+        """
+        将面部特征编码转换为带版本文件头的二进制形式，用于存入BLOB字段。
+
+        参数:
+        - image_face_encoding: 以numpy数组形式表示的面部特征编码。
+        - dtype: 存储使用的数据类型，默认为float32（128维编码仅占512字节），也可以指定float64。
+
+        先写入8字节文件头（魔数、格式版本、数据类型代码、维度），再追加小端序的原始浮点数据。
+        返回转换后的bytes对象。
+        """
+        dtype = np.dtype(dtype).newbyteorder('<')
+        code = next(c for c, d in FACE_BLOB_DTYPES.items() if d == dtype)
+        data = np.ascontiguousarray(image_face_encoding, dtype=dtype).ravel()
+        header = FACE_BLOB_HEADER.pack(FACE_BLOB_MAGIC, FACE_BLOB_VERSION, code, data.size, 0)
+        return header + data.tobytes()
+
+    def decoding_FaceBlob(self, encoding_blob):
+        """
+        将encoding_FaceBlob生成的二进制数据还原为numpy数组形式。
+
+        参数:
+        - encoding_blob: 从BLOB字段读取出来的bytes对象（或其他支持缓冲区协议的对象）。
+
+        解析文件头并校验魔数与格式版本，然后通过np.frombuffer直接在原始缓冲区上构造数组，不发生数据复制，
+        因此返回的数组是只读的。如果文件头不合法，抛出ValueError异常。
+        """
+        magic, version, code, dim, _ = FACE_BLOB_HEADER.unpack_from(encoding_blob)
+        if magic != FACE_BLOB_MAGIC or version != FACE_BLOB_VERSION or code not in FACE_BLOB_DTYPES:
+            raise ValueError("无法识别的人脸编码二进制格式")
+        return np.frombuffer(encoding_blob, dtype=FACE_BLOB_DTYPES[code], count=dim,
+                             offset=FACE_BLOB_HEADER.size)
+
     def decoding_FaceStr(self, encoding_str):
         """
-        将存储在数据库中的面部特征编码字符串还原为numpy数组形式。
+        将存储在数据库中的面部特征编码还原为numpy数组形式。
 
         参数:
-        - encoding_str: 从数据库中读取出来的面部特征编码字符串，格式是由encoding_FaceStr方法生成的，
-                        即逗号分隔的数值字符串形式。
+        - encoding_str: 从数据库中读取出来的面部特征编码，可以是encoding_FaceStr方法生成的逗号分隔字符串，
+                        也可以是encoding_FaceBlob方法生成的二进制数据。
 
-        首先去除字符串两端可能存在的空白字符，然后按照逗号进行分割，得到一个字符串列表。
+        如果传入的是以二进制魔数开头的bytes，则交给decoding_FaceBlob零拷贝解码；
+        否则按旧的文本格式处理（TEXT字段迁移为BLOB后，尚未改写的旧记录会以bytes形式读出，需要先解码为字符串）：
+        去除字符串两端可能存在的空白字符，然后按照逗号进行分割，得到一个字符串列表。
         接着使用map函数将字符串列表中的每个元素转换为浮点数，最后将这些浮点数组成的列表转换为numpy数组，
         并返回该numpy数组，也就是还原后的面部特征编码。
         """
+        if isinstance(encoding_str, np.ndarray):
+            return encoding_str
+        if isinstance(encoding_str, (bytes, bytearray, memoryview)):
+            if bytes(encoding_str[:2]) == FACE_BLOB_MAGIC:
+                return self.decoding_FaceBlob(encoding_str)
+            encoding_str = bytes(encoding_str).decode('ascii')
         dlist = encoding_str.strip().split(',')
         dfloat = list(map(float, dlist))
         face_encoding = np.array(dfloat)
         return face_encoding
 
+    def encoding_ForStorage(self, image_face_encoding):
+        """
+        按数据库当前的字段类型选择编码格式：encoding字段已迁移为BLOB时使用二进制格式，否则仍使用逗号分隔字符串。
+        字段类型只在查询成功后缓存；查询失败时本次按旧的字符串格式写入（两种字段类型都可以保存），下次写入时重新查询。
+        """
+        if self._binary_storage is None:
+            self._binary_storage = self.facesql.encodingColumnIsBinary()
+        binary = self._binary_storage
+        if binary is None:
+            return self.encoding_FaceStr(image_face_encoding)
+        if binary:
+            return self.encoding_FaceBlob(image_face_encoding)
+        return self.encoding_FaceStr(image_face_encoding)
+
     def add_Face(self, image_face_encoding, id_val, name_val):
         """
         将给定的面部特征编码以及对应的标识、名称添加到数据库中。
@@ -51,12 +122,43 @@ class FaceTools:
         - id_val: 该面部数据记录在数据库中的唯一标识符，例如编号等。
         - name_val: 与该面部数据相关联的名称，比如人物姓名等。
 
-        首先调用encoding_FaceStr方法将面部特征编码转换为字符串形式，
+        首先调用encoding_ForStorage方法将面部特征编码转换为与数据库字段类型一致的存储形式，
         然后通过self.facesql实例（即FaceSQL类的实例）调用其saveFaceData方法，
-        将转换后的编码字符串以及对应的标识和名称保存到数据库中。
+        将转换后的编码以及对应的标识和名称保存到数据库中。
+        如果已关联人脸库（self.gallery），写入成功后同步追加到人脸库中。
+        返回写入是否成功；学号或姓名重复时，saveFaceData抛出的DuplicateRecordError异常会直接传给调用方。
+        """
+        encoding_str = self.encoding_ForStorage(image_face_encoding)
+        with DB_WRITE_SECONDS.time():
+            saved = self.facesql.saveFaceData(id_val, name_val, encoding_str)
+        if saved and self.gallery is not None:
+            self.gallery.add(image_face_encoding, id_val, name_val)
+        return saved
+
+    def add_Faces(self, faces, chunk_size=500):
+        """
+        批量将面部特征编码以及对应的标识、名称添加到数据库中。
+
+        参数:
+        - faces: 由(image_face_encoding, id_val, name_val)元组组成的列表。
+        - chunk_size: 每个事务插入的记录数量，默认为500。
+
+        先把所有编码转换为与数据库字段类型一致的存储形式，再调用facesql的saveFaceDataBatch分块插入。
+        如果已关联人脸库（self.gallery），成功写入的记录同步追加到人脸库中。
+        返回(成功写入的(id, name)列表, 失败列表)，失败列表的每个元素为((id, name), 异常)，异常的含义见saveFaceDataBatch。
         """
-        encoding_str = self.encoding_FaceStr(image_face_encoding)
-        self.facesql.saveFaceData(id_val, name_val, encoding_str)
+        encodings = {}
+        rows = []
+        for image_face_encoding, id_val, name_val in faces:
+            encodings[(id_val, name_val)] = image_face_encoding
+            rows.append((id_val, name_val, self.encoding_ForStorage(image_face_encoding)))
+        with DB_WRITE_SECONDS.time():
+            saved, failed = self.facesql.saveFaceDataBatch(rows, chunk_size=chunk_size)
+        saved_keys = [(id_val, name_val) for id_val, name_val, _ in saved]
+        if self.gallery is not None:
+            for key in saved_keys:
+                self.gallery.add(encodings[key], *key)
+        return saved_keys, [((row[0], row[1]), error) for row, error in failed]
 
     def load_faceofdatabase(self):
         """
@@ -65,22 +167,95 @@ class FaceTools:
         返回值:
         返回三个列表，分别包含面部数据记录的标识（face_ids）、名称（face_names）以及还原后的面部特征编码（face_encodings）。
 
-        首先初始化三个空列表，用于存储后续从数据库中读取的数据。
-        尝试通过self.facesql实例调用allFaceData方法获取数据库中所有的面部数据记录。
-        对于每一条记录，分别提取出标识、名称以及编码字符串，将标识和名称添加到对应的列表中，
-        并调用decoding_FaceStr方法将编码字符串还原为numpy数组后添加到面部特征编码列表中。
-        如果在加载过程中出现异常，将打印错误信息，最后返回这三个列表（即使加载失败，返回的列表可能为空）。
+        内部调用load_face_matrix流式加载，再把矩阵按行拆分为列表，保留该方法只是为了兼容旧的调用方式；
+        新代码应直接使用load_face_matrix，避免为每条记录单独持有一个小数组。
+        与原来一样，加载失败时（错误信息已由load_face_matrix打印）返回三个空列表。
+        """
+        try:
+            face_ids, face_names, matrix = self.load_face_matrix()
+        except Exception:
+            return [], [], []
+        return face_ids, face_names, list(matrix)
+
+    def load_face_matrix(self, chunk_size=1000, progress=None, dtype=np.float64):
+        """
+        从存储后端加载所有的面部数据，并把特征编码组织成一个连续的(N, 128)矩阵。
+
+        参数:
+        - chunk_size: 每次从数据库读取的记录数量，默认为1000。
+        - progress: 可选的进度回调函数，每读取一块数据调用一次progress(已加载数量, 总数量)，总数量未知时为None。
+        - dtype: 特征矩阵的数据类型，默认为float64；FaceGallery会传入自己的数据类型，避免加载后再转换一次。
+
+        返回值:
+        返回(face_ids, face_names, matrix)。
+
+        如果存储后端提供了allFaceMatrix快速路径（例如内存映射的快照），直接使用其返回的矩阵。
+        否则先查询记录总数并预先分配矩阵，再通过iterFaceData分块读取，每条记录解码后直接写入矩阵的对应行，
+        除最终的矩阵外只需要额外保存一块数据；读取过程中记录数超过预先分配的容量时（其他终端同时录入）按两倍扩容。
+        如果在加载过程中出现异常，将打印错误信息并重新抛出，调用方（FaceGallery.load）据此保留人脸库原有的内容，
+        而不是把加载失败当成空的人脸库。
         """
+        fast = self.facesql.allFaceMatrix()
+        if fast is not None:
+            return fast
         face_ids = []
         face_names = []
-        face_encodings = []
+        total = self.facesql.countFaceData()
+        matrix = np.empty((total or 0, 128), dtype=dtype)
         try:
-            face_data = self.facesql.allFaceData()
-            for row in face_data:
-                face_id, face_name, encoding_str = row
-                face_ids.append(face_id)
-                face_names.append(face_name)
-                face_encodings.append(self.decoding_FaceStr(encoding_str))
+            for rows in self.facesql.iterFaceData(chunk_size):
+                count = len(face_ids)
+                if count + len(rows) > matrix.shape[0]:
+                    grown = np.empty((max(count + len(rows), matrix.shape[0] * 2), 128), dtype=dtype)
+                    grown[:count] = matrix[:count]
+                    matrix = grown
+                for offset, (face_id, face_name, encoding_str) in enumerate(rows):
+                    matrix[count + offset] = self.decoding_FaceStr(encoding_str)
+                    face_ids.append(face_id)
+                    face_names.append(face_name)
+                if progress is not None:
+                    progress(len(face_ids), total)
         except Exception as e:
             print(f"加载数据库人脸数据失败: {e}")
-        return face_ids, face_names, face_encodings
\ No newline at end of file
+            raise
+        return face_ids, face_names, matrix[:len(face_ids)]
+
+    def migrate_encodings(self, batch_size=500):
+        """
+        将数据库中旧的逗号分隔文本编码迁移为二进制编码。
+
+        参数:
+        - batch_size: 每个事务改写的记录数量，默认为500。
+
+        迁移分两步进行：首先把encoding字段从TEXT修改为BLOB（已是BLOB时跳过），
+        然后逐行检查编码内容，只把仍是文本格式的记录改写为encoding_FaceBlob生成的二进制数据，并按批次提交。
+        迁移过程中旧记录始终可以被decoding_FaceStr正确读取，因此迁移可以中断后重复执行。
+        返回被改写的记录数量。
+        """
+        binary = self.facesql.encodingColumnIsBinary()
+        if binary is None:
+            return 0
+        if not binary:
+            if not self.facesql.convertEncodingColumnToBlob():
+                return 0
+        self._binary_storage = True
+        pending = []
+        migrated = 0
+        for face_number, encoding in self.facesql.allFaceEncodings():
+            if bytes(encoding[:2]) == FACE_BLOB_MAGIC:
+                continue
+            pending.append((self.encoding_FaceBlob(self.decoding_FaceStr(encoding)), face_number))
+            if len(pending) >= batch_size:
+                if self.facesql.updateFaceEncodings(pending):
+                    migrated += len(pending)
+                pending = []
+        if pending and self.facesql.updateFaceEncodings(pending):
+            migrated += len(pending)
+        return migrated
+
+
+if __name__ == "__main__":
+    # 作为脚本运行时，执行一次人脸编码格式迁移（TEXT逗号分隔字符串 -> BLOB二进制）
+    from FaceSQL import FaceSQL
+    count = FaceTools(FaceSQL()).migrate_encodings()
+    print(f"已迁移 {count} 条人脸编码记录")
\ No newline at end of file
@@ -0,0 +1,220 @@
+import collections
+import itertools
+from FaceMetrics import MATCHES_TOTAL, MISSES_TOTAL
+from FaceCache import search_gallery
+
+
+def box_iou(a, b):
+    """
+    计算两个人脸框的交并比（IoU）。
+
+    参数:
+    - a, b: (x, y, w, h)形式的人脸框，与cv2的detectMultiScale输出格式一致。
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+# 定义一个名为Track的类，表示连续多帧中被判定为同一个人的人脸轨迹
+class Track:
+    def __init__(self, track_id, box):
+        """
+        类的构造函数。
+
+        参数:
+        - track_id: 轨迹编号，由FaceTracker分配，单调递增。
+        - box: 该轨迹当前的人脸框(x, y, w, h)。
+
+        votes记录每个候选身份（学号，未匹配时为None）在这条轨迹上得到的匹配次数，
+        last_encoded记录最近一次提取特征编码时的帧号，unlocked表示该轨迹是否已经触发过开锁。
+        """
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.misses = 0
+        self.votes = collections.Counter()
+        self.last_encoded = None
+        self.unlocked = False
+
+
+# 定义一个名为FaceTracker的类，基于IoU将相邻帧的人脸检测结果关联成轨迹
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=5):
+        """
+        类的构造函数。
+
+        参数:
+        - iou_threshold: 检测框与已有轨迹关联所需的最小IoU，默认为0.3。
+        - max_misses: 轨迹连续多少帧没有关联到检测框后被删除，默认为5。
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes):
+        """
+        用当前帧的检测结果更新轨迹。
+
+        参数:
+        - boxes: 当前帧检测到的人脸框列表，每个元素为(x, y, w, h)。
+
+        按IoU从大到小贪心地把检测框分配给已有轨迹，未分配到的检测框创建新轨迹，
+        未分配到检测框的轨迹丢失计数加1，超过max_misses后删除。
+        返回与boxes一一对应的轨迹列表。
+        """
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b)
+             for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True
+        )
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for iou, t, b in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in used_tracks or assigned[b] is not None:
+                continue
+            used_tracks.add(t)
+            assigned[b] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            track.misses = 0 if t in used_tracks else track.misses + 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for b, box in enumerate(boxes):
+            if assigned[b] is None:
+                assigned[b] = Track(next(self._ids), box)
+                self.tracks.append(assigned[b])
+            else:
+                assigned[b].box = box
+        return assigned
+
+    def clear(self):
+        self.tracks = []
+
+
+# 定义一个名为AutoRecognizer的类，实现免点击的连续识别：每条轨迹只在出现时以及每隔若干帧提取一次特征编码
+class AutoRecognizer:
+    def __init__(self, gallery, encoder, tolerance=0.6, confirm_hits=3, reencode_interval=5, tracker=None,
+                 batch_encoder=None, cache=None, ready=None):
+        """
+        类的构造函数。
+
+        参数:
+        - gallery: FaceGallery人脸库，用于检索特征编码对应的身份。
+        - encoder: 提取特征编码的函数，接收完整画面和人脸框，返回128维编码或None（例如FaceEncoder.encode_face）。
+        - tolerance: 匹配的容忍度，默认为0.6。
+        - confirm_hits: 同一身份在一条轨迹上累计匹配多少次后触发开锁，默认为3。
+        - reencode_interval: 尚未确认身份的轨迹每隔多少帧重新提取一次特征编码，默认为5。
+        - tracker: FaceTracker实例，默认为None，表示使用默认参数新建一个。
+        - batch_encoder: 可选的批量编码函数，接收完整画面和人脸框列表，返回等长的编码列表（例如EncoderPool.encode_all）；
+          设置后同一帧中需要提取编码的多张人脸一次交给它并行处理，默认为None，表示逐张调用encoder。
+        - cache: 可选的FaceCache.RecognitionCache，与最近识别过的编码足够接近时不再检索人脸库，默认为None。
+        - ready: 可选的无参函数，返回编码器和人脸库是否可以使用（例如FaceEncoder.models_loaded），默认为None，表示总是可以使用；
+          返回False时只跟踪人脸、不提取编码，检测线程不会阻塞在模型加载上。
+
+        同一个人站在门前时，只有新轨迹出现时以及每隔reencode_interval帧才会调用一次编码器，
+        确认身份并触发开锁后该轨迹不再提取特征编码，也不会重复开锁。
+        """
+        self.gallery = gallery
+        self.encoder = encoder
+        self.tolerance = tolerance
+        self.confirm_hits = confirm_hits
+        self.reencode_interval = reencode_interval
+        self.tracker = tracker if tracker is not None else FaceTracker()
+        self.batch_encoder = batch_encoder
+        self.cache = cache
+        self.ready = ready
+        self.frame_index = 0
+        self.encode_calls = 0
+
+    def process(self, frame, boxes):
+        """
+        处理一帧画面的检测结果。
+
+        参数:
+        - frame: 当前帧图像（BGR格式）。
+        - boxes: 当前帧检测到的人脸框列表。
+
+        返回本帧新确认的身份列表，每个元素为(学号, 姓名, 距离)，调用方对每个元素执行一次开锁。
+        """
+        self.frame_index += 1
+        tracks = self.tracker.update(boxes)
+        if self.ready is not None and not self.ready():
+            return []
+        pending = []
+        for track, box in zip(tracks, boxes):
+            if track.unlocked:
+                continue
+            if track.last_encoded is not None and self.frame_index - track.last_encoded < self.reencode_interval:
+                continue
+            track.last_encoded = self.frame_index
+            pending.append((track, box))
+        if not pending:
+            return []
+
+        # 本帧需要提取编码的人脸一次提取完，再一次检索人脸库，每张人脸分别投票
+        if self.batch_encoder is not None and len(pending) > 1:
+            encodings = self.batch_encoder(frame, [box for _, box in pending])
+        else:
+            encodings = [self.encoder(frame, box) for _, box in pending]
+        self.encode_calls += len(pending)
+        valid = [(track, encoding) for (track, _), encoding in zip(pending, encodings) if encoding is not None]
+        if not valid:
+            return []
+        results = search_gallery(self.gallery, [encoding for _, encoding in valid], self.tolerance, self.cache)
+
+        events = []
+        for (track, _), result in zip(valid, results):
+            if result is not None:
+                MATCHES_TOTAL.inc()
+                track.votes[result[0]] += 1
+                if track.votes[result[0]] >= self.confirm_hits:
+                    track.unlocked = True
+                    events.append(result)
+            else:
+                MISSES_TOTAL.inc()
+                track.votes[None] += 1
+        return events
+
+    def identify(self, frame, boxes):
+        """
+        对一帧画面中的全部人脸做一次识别，不经过轨迹和投票，供界面的“识别”按钮使用，在检测线程中调用。
+
+        参数:
+        - frame: 完整画面（BGR格式）。
+        - boxes: 画面中的人脸框列表。
+
+        人脸库被标记为过期时先从数据库重新加载。
+        返回与成功提取到编码的人脸等长的列表，每个元素为(学号, 姓名, 距离)，未匹配到已知人脸时为None；
+        没有提取到任何特征编码时返回空列表，人脸库中没有人脸数据时返回None。
+        """
+        if self.batch_encoder is not None and len(boxes) > 1:
+            encodings = self.batch_encoder(frame, boxes)
+        else:
+            encodings = [self.encoder(frame, box) for box in boxes]
+        self.encode_calls += len(boxes)
+        encodings = [encoding for encoding in encodings if encoding is not None]
+        if not encodings:
+            return []
+        self.gallery.ensure_loaded()
+        if len(self.gallery) == 0:
+            return None
+        results = search_gallery(self.gallery, encodings, self.tolerance, self.cache)
+        for result in results:
+            if result is not None:
+                MATCHES_TOTAL.inc()
+            else:
+                MISSES_TOTAL.inc()
+        return results
+
+    def reset(self):
+        self.tracker.clear()
+        self.frame_index = 0
@@ -0,0 +1,109 @@
+import collections
+import threading
+import time
+
+# 采集线程连续读取失败的次数达到该值时认为摄像头已断开（或视频文件已结束），失败期间的等待时间合计约8秒
+READ_FAILURE_LIMIT = 50
+
+
+# 定义一个名为FrameStats的类，用于统计流水线某一阶段的帧率以及丢帧数量
+class FrameStats:
+    def __init__(self, name, window=1.0):
+        """
+        类的构造函数。
+
+        参数:
+        - name: 阶段名称，例如"capture"、"detect"，用于显示统计信息。
+        - window: 计算帧率使用的时间窗口（秒），默认为1秒。
+        """
+        self.name = name
+        self.window = window
+        self.frames = 0
+        self.drops = 0
+        self._times = collections.deque()
+        self._lock = threading.Lock()
+
+    def tick(self):
+        """
+        记录该阶段处理完成了一帧。
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            self._times.append(now)
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+
+    def drop(self, count=1):
+        """
+        记录该阶段丢弃了count帧。
+        """
+        with self._lock:
+            self.drops += count
+
+    @property
+    def fps(self):
+        """
+        返回最近一个时间窗口内的平均帧率。
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+            return len(self._times) / self.window
+
+    def __str__(self):
+        return f"{self.name} {self.fps:.1f}fps 丢帧{self.drops}"
+
+
+# 定义一个名为LatestFrameQueue的类，实现有界的“最新帧优先”队列：队列已满时丢弃最旧的帧，消费者总是拿到最新画面
+class LatestFrameQueue:
+    def __init__(self, maxsize=1, stats=None):
+        """
+        类的构造函数。
+
+        参数:
+        - maxsize: 队列容量，默认为1，即只保留最新的一帧。
+        - stats: 可选的FrameStats实例，因队列已满而被丢弃的帧会记入其丢帧计数。
+        """
+        self._items = collections.deque()
+        self.maxsize = maxsize
+        self.stats = stats
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        """
+        放入一帧，如果队列已满则先丢弃最旧的帧。
+        """
+        with self._cond:
+            while len(self._items) >= self.maxsize:
+                self._items.popleft()
+                if self.stats is not None:
+                    self.stats.drop()
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        取出一帧，队列为空时最多等待timeout秒；超时或队列已关闭时返回None。
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        """
+        关闭队列并唤醒所有等待中的消费者，用于停止工作线程。
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._closed = False
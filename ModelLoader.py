@@ -0,0 +1,34 @@
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+import FaceEncoder
+
+
+# 定义一个名为ModelLoader的线程类，在后台导入face_recognition并加载特征提取模型，窗口不必等待模型加载完成就可以显示
+class ModelLoader(QThread):
+    # 模型加载完成，参数为加载耗时（秒）
+    loaded = pyqtSignal(float)
+    # 模型加载失败，参数为错误信息
+    failed = pyqtSignal(str)
+
+    def __init__(self, encoder_pool=None, parent=None):
+        """
+        类的构造函数。
+
+        参数:
+        - encoder_pool: 可选的EncoderPool实例，当前进程的模型加载完成后再启动进程池的全部工作进程（各自加载一份模型），
+          避免第一次识别多张人脸时等待工作进程启动。
+        - parent: Qt父对象。
+        """
+        super(ModelLoader, self).__init__(parent)
+        self.encoder_pool = encoder_pool
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            FaceEncoder.load_models()
+            if self.encoder_pool is not None:
+                self.encoder_pool.warm_up()
+        except Exception as e:
+            self.failed.emit(f"加载人脸特征提取模型失败：{e}")
+            return
+        self.loaded.emit(time.perf_counter() - start)
@@ -0,0 +1,375 @@
+"""
+本机人脸识别服务：多个门禁摄像头客户端共用一个人脸库和一个特征提取器。
+
+客户端通过HTTP把画面（JPEG/PNG）提交给服务，服务把几毫秒内到达的请求合并为一批，
+一次完成检测、批量特征提取（FaceEncoder.encode_faces）和批量比对（一次矩阵乘法），再把结果分别返回给各个客户端。
+
+接口：
+- POST /recognize：请求体为一张图片。查询参数box=x,y,w,h表示图片中人脸的位置（客户端已经做过检测），
+  超出图片的部分被裁掉，宽高不为正或完全在图片之外时返回400；crop=1表示整张图片就是裁剪好的人脸；两者都没有时由服务在图片上检测人脸。
+  返回JSON：{"faces": [{"box": [x, y, w, h], "matched": true, "id": ..., "name": ..., "distance": ...}, ...]}
+- GET /stats：按批大小统计的批次数、请求数、每批耗时、请求延迟以及吞吐量。
+- GET /metrics：Prometheus格式的指标（见FaceMetrics）。
+
+用法：
+    python RecognitionServer.py [--port 8620] [--storage mysql] [--max-batch 16] [--max-wait-ms 5]
+"""
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from FaceStorage import open_storage
+from FaceTool import FaceTools
+from FaceGallery import FaceGallery
+from FaceSync import FaceSync
+from FaceIndex import open_index
+from FaceMetrics import METRICS, MATCHES_TOTAL, MISSES_TOTAL
+
+BATCH_SECONDS = METRICS.histogram("face_server_batch_seconds", "识别服务处理一批请求的耗时")
+REQUEST_SECONDS = METRICS.histogram("face_server_request_seconds", "识别服务单个请求从到达到返回的耗时")
+
+
+# 定义一个名为BatchStats的类，按批大小统计识别服务的处理耗时、请求延迟和吞吐量
+class BatchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        # 批大小 -> [批次数, 请求数, 处理耗时之和, 请求延迟之和]
+        self._by_size = collections.defaultdict(lambda: [0, 0, 0.0, 0.0])
+
+    def record(self, size, busy, latencies):
+        with self._lock:
+            entry = self._by_size[size]
+            entry[0] += 1
+            entry[1] += size
+            entry[2] += busy
+            entry[3] += sum(latencies)
+
+    def snapshot(self):
+        """
+        返回统计结果字典：每个批大小的批次数、请求数、平均每批耗时（毫秒）、平均每个请求的处理耗时（毫秒）、
+        平均请求延迟（毫秒，含排队等待）以及该批大小下的处理吞吐量（请求/秒）；另外给出服务启动以来的总体吞吐量。
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            sizes = {}
+            total = 0
+            for size, (batches, items, busy, latency) in sorted(self._by_size.items()):
+                total += items
+                sizes[str(size)] = dict(
+                    batches=batches,
+                    requests=items,
+                    batch_ms=round(busy * 1000 / batches, 3),
+                    per_request_ms=round(busy * 1000 / items, 3),
+                    latency_ms=round(latency * 1000 / items, 3),
+                    throughput=round(items / busy, 1) if busy > 0 else None,
+                )
+            return dict(requests=total, uptime_s=round(elapsed, 1),
+                        throughput=round(total / elapsed, 1) if elapsed > 0 else None, by_batch_size=sizes)
+
+
+# 定义一个名为MicroBatcher的类，把短时间内从多个线程提交的请求合并为一批，交给同一个处理函数
+class MicroBatcher:
+    def __init__(self, handler, max_batch=16, max_wait=0.005, stats=None):
+        """
+        类的构造函数。
+
+        参数:
+        - handler: 批处理函数，参数为请求列表，返回等长的结果列表。
+        - max_batch: 一批最多包含的请求数，默认为16。
+        - max_wait: 收到一批中的第一个请求后最多再等待多久（秒）凑批，默认为5毫秒。
+        - stats: 可选的BatchStats实例。
+
+        批处理函数只在一个后台线程中调用，因此其中使用的检测器、编码器不需要支持多线程。
+        批处理函数可以在结果列表中用异常实例表示某个请求失败，只有该请求收到这个异常，同一批中的其他请求不受影响。
+        """
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = stats
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def submit(self, item, timeout=None):
+        """
+        提交一个请求并等待其结果；该请求的结果为异常实例，或者批处理函数本身抛出异常时，抛出该异常。
+        """
+        future = concurrent.futures.Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result(timeout)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._queue.put(None)
+                    break
+                batch.append(entry)
+            self._process(batch)
+
+    def _process(self, batch):
+        start = time.perf_counter()
+        try:
+            results = self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+        busy = done - start
+        BATCH_SECONDS.observe(busy)
+        latencies = [done - arrived for _, _, arrived in batch]
+        for latency in latencies:
+            REQUEST_SECONDS.observe(latency)
+        if self.stats is not None:
+            self.stats.record(len(batch), busy, latencies)
+        for (_, future, _), value in zip(batch, results):
+            if isinstance(value, Exception):
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+
+# 定义一个名为RecognitionEngine的类，对一批画面完成检测、批量特征提取和批量比对
+class RecognitionEngine:
+    def __init__(self, gallery, face_cascade, tolerance=0.6):
+        """
+        类的构造函数。
+
+        参数:
+        - gallery: 所有客户端共用的FaceGallery人脸库。
+        - face_cascade: 已加载的OpenCV人脸检测器，用于客户端没有提供人脸框的画面。
+        - tolerance: 识别阈值，默认为0.6。
+        """
+        self.gallery = gallery
+        self.face_cascade = face_cascade
+        self.tolerance = tolerance
+
+    def process_batch(self, items):
+        """
+        处理一批请求，每个请求为(frame, boxes)，boxes为None时在画面上检测人脸。
+        返回与items等长的列表，每个元素是该画面中各张人脸的识别结果列表；某个画面检测失败时对应的元素为异常实例。
+        批量提取特征失败时改为逐张提取，提取出错的人脸只在自己的结果中标记错误，不影响同一批中的其他请求。
+        """
+        import cv2
+        from FaceEncoder import encode_faces
+        faces = []
+        owners = []
+        results = [[] for _ in items]
+        for index, (frame, boxes) in enumerate(items):
+            if boxes is None:
+                try:
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    boxes = [tuple(int(v) for v in box) for box in self.face_cascade.detectMultiScale(gray, 1.3, 5)]
+                except cv2.error as e:
+                    print(f"人脸检测失败: {e}")
+                    results[index] = e
+                    continue
+            for box in boxes:
+                faces.append((frame, box))
+                owners.append(index)
+        if not faces:
+            return results
+        try:
+            encodings = encode_faces(faces)
+        except ImportError:
+            # 没有安装face_recognition属于服务配置错误，整批返回500
+            raise
+        except Exception as e:
+            print(f"批量提取人脸特征失败，改为逐张提取: {e}")
+            encodings = [self._encode_one(frame, box) for frame, box in faces]
+        valid = [i for i, encoding in enumerate(encodings) if encoding is not None]
+        matches = []
+        face_ids = face_names = []
+        if valid:
+            matches, face_ids, face_names = self.gallery.search(np.vstack([encodings[i] for i in valid]), k=1)
+        found = dict(zip(valid, matches))
+        for i, ((_, box), owner) in enumerate(zip(faces, owners)):
+            entry = dict(box=list(box), matched=False)
+            top = found.get(i)
+            if top and top[0][1] <= self.tolerance:
+                MATCHES_TOTAL.inc()
+                index, distance = top[0]
+                entry.update(matched=True, id=face_ids[index], name=face_names[index], distance=round(distance, 4))
+            elif i in found:
+                MISSES_TOTAL.inc()
+            else:
+                entry["error"] = "无法提取人脸特征"
+            results[owner].append(entry)
+        return results
+
+    def _encode_one(self, frame, box):
+        # 单独提取一张人脸的特征编码，出错时返回None，该人脸的结果中标记为无法提取
+        from FaceEncoder import encode_face
+        try:
+            return encode_face(frame, box)
+        except Exception as e:
+            print(f"提取人脸特征失败: {e}")
+            return None
+
+
+def parse_request(body, params):
+    # 把请求体解码为BGR画面，并根据查询参数确定人脸框；返回(frame, boxes)
+    import cv2
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("无法解码图片")
+    if params.get("crop", ["0"])[0] == "1":
+        return frame, [(0, 0, frame.shape[1], frame.shape[0])]
+    if "box" in params:
+        boxes = []
+        for text in params["box"]:
+            try:
+                values = [int(v) for v in text.split(',')]
+            except ValueError:
+                raise ValueError(f"人脸框格式错误: {text}") from None
+            if len(values) != 4:
+                raise ValueError(f"人脸框格式错误: {text}")
+            boxes.append(clip_box(values, frame.shape[1], frame.shape[0], text))
+        return frame, boxes
+    return frame, None
+
+
+def clip_box(box, frame_w, frame_h, text=None):
+    # 把客户端提供的人脸框(x, y, w, h)裁剪到画面范围内；宽高不为正或与画面没有交集时抛出ValueError（返回400）
+    x, y, w, h = box
+    if w <= 0 or h <= 0:
+        raise ValueError(f"人脸框的宽度和高度必须大于0: {text or box}")
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(frame_w, x + w), min(frame_h, y + h)
+    if right <= left or bottom <= top:
+        raise ValueError(f"人脸框超出图片范围（{frame_w}x{frame_h}）: {text or box}")
+    return left, top, right - left, bottom - top
+
+
+def make_handler(batcher, stats, max_body=8 * 1024 * 1024):
+    # 生成绑定到指定批处理器的HTTP请求处理类
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def _reply(self, code, payload, content_type="application/json; charset=utf-8"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urllib.parse.urlsplit(self.path).path
+            if path == "/stats":
+                self._reply(200, stats.snapshot())
+            elif path == "/metrics":
+                self._reply(200, METRICS.export().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urllib.parse.urlsplit(self.path)
+            if url.path != "/recognize":
+                self._reply(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            if length <= 0 or length > max_body:
+                self._reply(400, {"error": "请求体为空或过大"})
+                return
+            body = self.rfile.read(length)
+            try:
+                item = parse_request(body, urllib.parse.parse_qs(url.query))
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+                return
+            try:
+                faces = batcher.submit(item, timeout=30)
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, {"faces": faces})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多摄像头共用的本机人脸识别服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只接受本机连接")
+    parser.add_argument("--port", type=int, default=8620, help="监听端口")
+    parser.add_argument("--storage", default=os.environ.get("FACE_STORAGE", "mysql"), help="存储后端")
+    parser.add_argument("--cascade", default=os.path.join('XML', 'haarcascade_frontalface_default.xml'),
+                        help="Haar人脸检测器文件路径")
+    parser.add_argument("--max-batch", type=int, default=16, help="一批最多合并的请求数")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="凑批的最长等待时间（毫秒）")
+    parser.add_argument("--tolerance", type=float, default=0.6, help="识别阈值")
+    parser.add_argument("--sync-interval", type=float, default=5.0, help="人脸库增量同步的间隔（秒）")
+    parser.add_argument("--index", default=os.environ.get("FACE_INDEX", ""),
+                        help="人脸库检索索引：空字符串表示精确暴力比对，brute，或ivf（可带参数，例如ivf:nprobe=16），"
+                             "默认读取环境变量FACE_INDEX")
+    parser.add_argument("--index-path", default=os.environ.get("FACE_INDEX_PATH") or None,
+                        help="检索索引文件的保存位置，启动时读取、同步到变化后保存，默认读取环境变量FACE_INDEX_PATH，未设置时不保存")
+    args = parser.parse_args()
+
+    import cv2
+    face_cascade = cv2.CascadeClassifier(args.cascade)
+    if face_cascade.empty():
+        print(f"无法加载人脸检测器文件: {args.cascade}")
+        return
+
+    facesql = open_storage(args.storage)
+    gallery = FaceGallery(FaceTools(facesql), index=open_index(args.index))
+    face_sync = FaceSync(gallery, facesql, interval=args.sync_interval, index_path=args.index_path)
+    face_sync.start()
+    print(f"人脸库已加载 {len(gallery)} 条记录")
+
+    stats = BatchStats()
+    engine = RecognitionEngine(gallery, face_cascade, tolerance=args.tolerance)
+    batcher = MicroBatcher(engine.process_batch, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+                           stats=stats)
+    batcher.start()
+    server = http.server.ThreadingHTTPServer((args.host, args.port), make_handler(batcher, stats))
+    server.daemon_threads = True
+    print(f"识别服务已启动: http://{args.host}:{args.port}/recognize")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        face_sync.stop()
+        print(json.dumps(stats.snapshot(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
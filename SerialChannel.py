@@ -0,0 +1,326 @@
+"""
+门锁控制器的串口通道：开锁指令排队发送、解析控制器的应答、断线自动重连，并记录开锁延迟。
+
+本模块不依赖Qt，串口的打开和读写由“传输层”对象完成：
+- 界面程序使用SerialWorker.QtSerialTransport（QSerialPort）；
+- 无界面的FaceService使用这里的PySerialTransport（pyserial）。
+传输层需要提供name属性以及open()、close()、write(data)、read(timeout)四个方法，出错时抛出OSError。
+
+与下位机的约定：
+- 上位机发送 open 表示开锁（与原来的sendOpenSignal相同，不带换行）；
+- 控制器的回复以换行结尾、不区分大小写：上电或复位后可以发送 ready，表示可以接收指令；
+  执行开锁后回复 ok（或 ack、opened），无法执行时回复 err（或 error）。
+旧固件不回复任何内容，因此默认不要求应答（require_ack=False），写入成功即视为发送完成。
+"""
+import queue
+import threading
+import time
+
+from FaceMetrics import METRICS
+
+UNLOCK_SECONDS = METRICS.histogram("face_unlock_seconds", "从识别成功请求开锁到控制器确认（或写入完成）的耗时")
+UNLOCK_FAILURES_TOTAL = METRICS.counter("face_unlock_failures_total", "开锁指令发送失败、超时或过期的次数")
+SERIAL_RECONNECTS_TOTAL = METRICS.counter("face_serial_reconnects_total", "串口断开后重新连接的次数")
+
+OPEN_COMMAND = b"open"
+ACK_REPLIES = ("ok", "ack", "opened")
+ERROR_REPLIES = ("err", "error")
+READY_REPLIES = ("ready",)
+# 自动选择串口时优先匹配的描述关键字，覆盖常见的USB转串口芯片和开发板
+PORT_KEYWORDS = ("ch340", "ch341", "cp210", "ftdi", "ft232", "pl2303", "usb-serial", "usb serial", "arduino", "stm32")
+
+
+def choose_port(ports, preferred=None):
+    """
+    从可用串口中选择门锁控制器所在的串口。
+
+    参数:
+    - ports: 可用串口列表，每个元素为(名称, 描述, 制造商)。
+    - preferred: 指定的串口名称（例如"COM3"、"/dev/ttyUSB0"），存在时直接使用；不在列表中的完整路径（例如伪终端）也直接使用。
+
+    没有指定时，优先选择描述或制造商中含有PORT_KEYWORDS关键字的串口，其次选择第一个串口；没有可用串口时返回None。
+    """
+    names = [name for name, _, _ in ports]
+    if preferred:
+        if preferred in names or preferred.startswith("/"):
+            return preferred
+        return None
+    for name, description, manufacturer in ports:
+        text = f"{description} {manufacturer}".lower()
+        if any(keyword in text for keyword in PORT_KEYWORDS):
+            return name
+    return names[0] if names else None
+
+
+def parse_reply(line):
+    """
+    解析控制器发来的一行消息，返回"ack"、"error"、"ready"之一，无法识别时返回None。
+    """
+    word = line.strip().lower()
+    if word in ACK_REPLIES:
+        return "ack"
+    if word in ERROR_REPLIES:
+        return "error"
+    if word in READY_REPLIES:
+        return "ready"
+    return None
+
+
+# 定义一个名为PySerialTransport的类，通过pyserial访问串口，供无界面的FaceService使用
+class PySerialTransport:
+    def __init__(self, port=None, baudrate=115200):
+        """
+        类的构造函数。
+
+        参数:
+        - port: 串口名称，默认为None，表示每次打开时通过serial.tools.list_ports自动选择。
+        - baudrate: 波特率，默认为115200，数据位、校验位、停止位与界面版本相同（8N1，无流控）。
+
+        pyserial在打开串口时才导入。
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.name = port
+        self.serial = None
+
+    def open(self):
+        import serial
+        from serial.tools import list_ports
+        ports = [(p.device, p.description or "", p.manufacturer or "") for p in list_ports.comports()]
+        self.name = choose_port(ports, self.port)
+        if self.name is None:
+            raise OSError(f"没有找到串口 {self.port}" if self.port else "没有找到可用的串口")
+        try:
+            self.serial = serial.Serial(self.name, baudrate=self.baudrate, bytesize=serial.EIGHTBITS,
+                                        parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, timeout=0.1)
+        except (serial.SerialException, ValueError) as e:
+            raise OSError(str(e)) from e
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+            self.serial = None
+
+    def write(self, data):
+        self.serial.write(data)
+        self.serial.flush()
+
+    def read(self, timeout):
+        self.serial.timeout = timeout
+        return self.serial.read(max(1, self.serial.in_waiting))
+
+
+# 定义一个名为SerialChannel的类，在专用线程中完成所有串口读写，调用方只需把开锁请求放入队列
+class SerialChannel:
+    def __init__(self, transport, require_ack=False, ack_timeout=1.0, retries=2, max_age=5.0,
+                 reopen_interval=1.0, max_reopen_interval=10.0):
+        """
+        类的构造函数。
+
+        参数:
+        - transport: 传输层对象（见模块说明），只在通道线程中使用。
+        - require_ack: 是否要求控制器回复ok，默认为False（兼容不回复的旧固件，写入成功即视为完成）。
+        - ack_timeout: 等待应答的时间（秒），默认为1秒。
+        - retries: 没有收到应答时重发的次数，默认为2。
+        - max_age: 开锁请求的有效时间（秒），串口断开期间排队超过该时间的请求被丢弃，默认为5秒，
+          避免人已经离开后串口恢复时才开门。
+        - reopen_interval: 串口断开或打开失败后第一次重试前等待的时间（秒），之后每次翻倍，默认为1秒。
+        - max_reopen_interval: 两次重试之间的最长等待时间（秒），默认为10秒。
+
+        回调函数（可选，在通道线程中调用）：
+        - on_unlocked(latency)：开锁完成，参数为从请求到确认（或写入完成）的耗时（秒）；
+        - on_failed(message)：开锁请求失败、超时或过期；
+        - on_connection(connected, port)：串口连接状态变化。
+        """
+        self.transport = transport
+        self.require_ack = require_ack
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+        self.max_age = max_age
+        self.reopen_interval = reopen_interval
+        self.max_reopen_interval = max_reopen_interval
+        self.on_unlocked = None
+        self.on_failed = None
+        self.on_connection = None
+        self.connected = False
+        self.ready = False
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._buffer = b""
+        # 连接失败只在第一次打印，避免设备没有插上时每次重试都打印一行
+        self._open_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def send_open(self):
+        """
+        请求开锁，立即返回。请求在通道线程中按顺序发送，结果通过on_unlocked或on_failed回调通知。
+        """
+        self._queue.put(time.monotonic())
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="SerialChannel", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        通知通道线程退出、关闭串口并等待线程结束。尚未发送的开锁请求被丢弃。
+        """
+        self._stop.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run(self):
+        """
+        通道线程的主循环：保持串口连接，依次发送队列中的开锁请求。
+        界面程序中由SerialWorker（QThread）在自己的线程里调用，其他情况下由start方法启动的线程调用。
+        """
+        delay = self.reopen_interval
+        while not self._stop.is_set():
+            if not self.connected:
+                if self._open():
+                    delay = self.reopen_interval
+                else:
+                    self._expire()
+                    self._stop.wait(delay)
+                    delay = min(delay * 2, self.max_reopen_interval)
+                    continue
+            try:
+                requested = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                # 空闲时读取控制器主动发来的消息（例如复位后的ready），同时及时发现断线
+                try:
+                    self._read_lines(0.0)
+                except OSError as e:
+                    self._lost(e)
+                continue
+            if requested is None:
+                continue
+            # 排队期间又收到的开锁请求合并为一次，延迟从最早的请求开始计算
+            while True:
+                try:
+                    extra = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    self._queue.put(None)
+                    break
+            try:
+                self._unlock(requested)
+            except OSError as e:
+                # 发送途中断线：放回队列，重新连接后在有效时间内继续发送
+                self._queue.put(requested)
+                self._lost(e)
+        self._close()
+
+    def _open(self):
+        try:
+            self.transport.open()
+        except OSError as e:
+            if str(e) != self._open_error:
+                print(f"串口连接失败: {e}")
+                self._open_error = str(e)
+            return False
+        self._open_error = None
+        self.connected = True
+        self._buffer = b""
+        if self.on_connection is not None:
+            self.on_connection(True, self.transport.name)
+        return True
+
+    def _close(self):
+        try:
+            self.transport.close()
+        except OSError:
+            pass
+        if self.connected:
+            self.connected = False
+            self.ready = False
+            if self.on_connection is not None:
+                self.on_connection(False, self.transport.name)
+
+    def _lost(self, error):
+        print(f"串口连接断开: {error}")
+        SERIAL_RECONNECTS_TOTAL.inc()
+        self._close()
+
+    def _expire(self):
+        # 串口不可用期间丢弃已经过期的开锁请求，未过期的保留到重新连接之后
+        kept = []
+        while True:
+            try:
+                requested = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if requested is None:
+                kept.append(None)
+            elif time.monotonic() - requested > self.max_age:
+                self._fail("串口不可用，开锁指令已过期")
+            else:
+                kept.append(requested)
+        for requested in kept:
+            self._queue.put(requested)
+
+    def _fail(self, message):
+        self.failed += 1
+        UNLOCK_FAILURES_TOTAL.inc()
+        if self.on_failed is not None:
+            self.on_failed(message)
+
+    def _unlock(self, requested):
+        if time.monotonic() - requested > self.max_age:
+            self._fail("开锁指令已过期")
+            return
+        for _ in range(self.retries + 1):
+            self.transport.write(OPEN_COMMAND)
+            self.sent += 1
+            if not self.require_ack:
+                self._done(requested)
+                return
+            reply = self._wait_reply(time.monotonic() + self.ack_timeout)
+            if reply == "ack":
+                self.acked += 1
+                self._done(requested)
+                return
+            if reply == "error":
+                self._fail("门锁控制器拒绝了开锁指令")
+                return
+        self._fail(f"门锁控制器在 {self.ack_timeout:.1f} 秒内没有应答")
+
+    def _done(self, requested):
+        latency = time.monotonic() - requested
+        UNLOCK_SECONDS.observe(latency)
+        if self.on_unlocked is not None:
+            self.on_unlocked(latency)
+
+    def _wait_reply(self, deadline):
+        # 读取应答直到收到ok/err或超时；期间收到的ready只更新状态
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            for reply in self._read_lines(remaining):
+                if reply in ("ack", "error"):
+                    return reply
+
+    def _read_lines(self, timeout):
+        # 读取一次串口数据，按行解析，返回本次解析出的应答列表
+        data = self.transport.read(timeout)
+        if not data:
+            return []
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        replies = []
+        for line in lines:
+            reply = parse_reply(line.decode('ascii', errors='ignore'))
+            if reply == "ready":
+                self.ready = True
+            elif reply is not None:
+                replies.append(reply)
+        return replies
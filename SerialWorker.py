@@ -0,0 +1,117 @@
+from PyQt5.QtCore import QThread, pyqtSignal, QIODevice
+from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
+from SerialChannel import SerialChannel, choose_port
+
+
+def available_ports():
+    """
+    返回本机可用的串口列表，每个元素为(名称, 描述, 制造商)，供SerialChannel.choose_port选择。
+    """
+    return [(info.portName(), info.description(), info.manufacturer()) for info in QSerialPortInfo.availablePorts()]
+
+
+# 定义一个名为QtSerialTransport的类，通过QSerialPort访问串口，供SerialChannel在SerialWorker线程中使用
+class QtSerialTransport:
+    def __init__(self, port=None, baudrate=QSerialPort.Baud115200, write_timeout=1.0):
+        """
+        类的构造函数。
+
+        参数:
+        - port: 串口名称，例如"COM3"或"/dev/ttyUSB0"，默认为None，表示每次打开时通过QSerialPortInfo自动选择。
+        - baudrate: 波特率，默认为115200，数据位8位、无校验、1位停止位、无流控，与原来的设置相同。
+        - write_timeout: 等待数据写出的最长时间（秒），默认为1秒。
+
+        QSerialPort在open方法中创建，因此属于调用open的线程（SerialWorker线程），
+        读写使用waitForBytesWritten和waitForReadyRead同步完成，不依赖事件循环，也不会阻塞界面线程。
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.write_timeout = write_timeout
+        self.name = port
+        self.serial = None
+
+    def open(self):
+        self.name = choose_port(available_ports(), self.port)
+        if self.name is None:
+            raise OSError(f"没有找到串口 {self.port}" if self.port else "没有找到可用的串口")
+        self.serial = QSerialPort()
+        self.serial.setPortName(self.name)
+        self.serial.setBaudRate(self.baudrate)
+        self.serial.setDataBits(QSerialPort.Data8)
+        self.serial.setParity(QSerialPort.NoParity)
+        self.serial.setStopBits(QSerialPort.OneStop)
+        self.serial.setFlowControl(QSerialPort.NoFlowControl)
+        if not self.serial.open(QIODevice.ReadWrite):
+            message = self.serial.errorString()
+            self.serial = None
+            raise OSError(message)
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+            self.serial = None
+
+    def _check(self):
+        # 串口被拔出后QSerialPort报告ResourceError，转换为OSError交给SerialChannel重新连接
+        if self.serial.error() == QSerialPort.ResourceError:
+            raise OSError(self.serial.errorString())
+
+    def write(self, data):
+        self.serial.write(data)
+        if not self.serial.waitForBytesWritten(int(self.write_timeout * 1000)):
+            self._check()
+            raise OSError("串口写入超时")
+
+    def read(self, timeout):
+        if not self.serial.bytesAvailable() and not self.serial.waitForReadyRead(int(timeout * 1000)):
+            self._check()
+            return b""
+        return bytes(self.serial.readAll())
+
+
+# 定义一个名为SerialWorker的线程类，在后台线程中维护门锁控制器的串口连接并发送开锁指令
+class SerialWorker(QThread):
+    # 开锁完成，参数为从请求到控制器确认（或写入完成）的耗时（毫秒）
+    unlocked = pyqtSignal(float)
+    # 开锁失败、控制器没有应答或指令已过期，参数为错误信息
+    failed = pyqtSignal(str)
+    # 串口连接状态变化，参数为是否已连接、串口名称
+    connectionChanged = pyqtSignal(bool, str)
+
+    def __init__(self, port=None, require_ack=False, parent=None):
+        """
+        类的构造函数。
+
+        参数:
+        - port: 串口名称，默认为None，表示自动选择（优先选择常见USB转串口芯片对应的串口）。
+        - require_ack: 是否等待控制器回复ok后才认为开锁完成，默认为False（兼容不回复的旧固件）。
+        - parent: Qt父对象。
+
+        串口的打开、写入、等待应答和断线重连都在本线程中完成（见SerialChannel），
+        界面线程调用send_open后立即返回，结果通过unlocked、failed和connectionChanged信号通知。
+        """
+        super(SerialWorker, self).__init__(parent)
+        self.channel = SerialChannel(QtSerialTransport(port), require_ack=require_ack)
+        self.channel.on_unlocked = lambda latency: self.unlocked.emit(latency * 1000)
+        self.channel.on_failed = self.failed.emit
+        self.channel.on_connection = lambda connected, name: self.connectionChanged.emit(connected, name or "")
+
+    @property
+    def connected(self):
+        return self.channel.connected
+
+    def send_open(self):
+        """
+        请求开锁，立即返回。串口断开期间的请求会在重新连接后发送，超过有效时间的请求被丢弃。
+        """
+        self.channel.send_open()
+
+    def run(self):
+        self.channel.run()
+
+    def stop(self):
+        """
+        通知线程关闭串口并退出，等待其结束。
+        """
+        self.channel.stop()
+        self.wait()
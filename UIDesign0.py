@@ -3,19 +3,37 @@
 
 import sys
 import os
+import time
+# 程序启动的时间，用于统计模型加载完成和第一次开锁距离启动的耗时
+STARTED_AT = time.perf_counter()
 import cv2
-import numpy as np
-import face_recognition
-import pymysql
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import (
     QWidget, QMessageBox, QLabel, QVBoxLayout,
     QHBoxLayout, QFormLayout, QLineEdit, QPushButton, QMainWindow, QApplication
 )
 from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
 from FaceTool import FaceTools
-from FaceSQL import FaceSQL
+from FaceStorage import open_storage
+from FaceGallery import FaceGallery
+from FaceIndex import open_index
+from FaceSync import FaceSync
+from EnrollWorker import EnrollWorker
+from CameraWorker import LatestFrameQueue, CaptureWorker, DetectionWorker
+from FramePreview import PreviewRenderer
+from FaceTracker import AutoRecognizer
+from FaceEncoder import encode_face, models_loaded
+from ModelLoader import ModelLoader
+from EncoderPool import EncoderPool
+from FaceDetector import FaceDetector
+from FaceMetrics import METRICS, RollingFileExporter
+from FaceCache import RecognitionCache, Debouncer
+from SerialWorker import SerialWorker
+
+# 连拍录入：采集时长（秒）、最多采集的帧数，以及剔除离群样本前至少需要的帧数
+BURST_SECONDS = 3.0
+BURST_SAMPLES = 8
+BURST_MIN_SAMPLES = 3
 
 # 定义主窗口类MyWindow，继承自QMainWindow，用于构建人脸识别系统的图形界面及相关功能实现
 class MyWindow(QMainWindow):
@@ -27,10 +45,39 @@ class MyWindow(QMainWindow):
         # 设置窗口初始大小为宽900像素，高600像素
         self.resize(900, 600)
 
-        # 初始化数据库操作类FaceSQL的实例，用于与数据库进行交互（如插入、查询数据等操作）
-        self.facesql = FaceSQL()
+        # 指标导出：设置环境变量FACE_METRICS_PORT时在本机该端口提供Prometheus格式的/metrics，
+        # 设置FACE_METRICS_FILE时每分钟把指标追加写入该文件（超过1MB自动轮转）；两者都未设置时指标只在内存中累计
+        self.metrics_server = None
+        self.metrics_file = None
+        if os.environ.get("FACE_METRICS_PORT"):
+            self.metrics_server = METRICS.serve(int(os.environ["FACE_METRICS_PORT"]))
+        if os.environ.get("FACE_METRICS_FILE"):
+            self.metrics_file = RollingFileExporter(METRICS, os.environ["FACE_METRICS_FILE"])
+            self.metrics_file.start()
+
+        # 初始化数据存储后端，用于与数据库进行交互（如插入、查询数据等操作）
+        # 默认使用中心MySQL数据库（FaceSQL），可通过环境变量FACE_STORAGE改为"sqlite:face.db"或"snapshot:目录"
+        # 构造时不连接数据库，连接、表结构迁移和人脸库加载都由FaceSync在后台线程中完成，数据库不可达时窗口也能立即显示
+        self.facesql = open_storage(os.environ.get("FACE_STORAGE", "mysql"), connect=False)
         # 初始化人脸工具类FaceTools的实例，用于处理人脸数据（如编码转换、添加人脸数据等操作），并传入facesql实例以关联数据库操作
         self.facetools = FaceTools(self.facesql)
+        # 初始化常驻内存的人脸库，启动时从数据库加载一次，之后录入的人脸通过add_Face增量追加，识别时不再重复查询整张表
+        # 人脸库较大时可以通过环境变量FACE_INDEX使用近似检索索引（例如"ivf"或"ivf:nprobe=16"，见FaceIndex.open_index），
+        # 默认为空，表示精确的暴力比对；索引与快照一起保存（环境变量FACE_INDEX_PATH可以指定其他位置），启动时不必重新训练
+        self.gallery = FaceGallery(self.facetools, index=open_index(os.environ.get("FACE_INDEX", "")))
+        self.facetools.gallery = self.gallery
+        # 增量同步：启动时全量加载一次人脸库，之后在后台线程中按水位线定期拉取其他终端录入或删除的人脸
+        # 轮询间隔可通过环境变量FACE_SYNC_INTERVAL设置（秒）；只读快照等不支持增量同步的后端只做一次全量加载
+        # 人脸库连同水位线保存在本地快照目录中（环境变量FACE_GALLERY_SNAPSHOT，默认为gallery_snapshot，设置为空时不保存），
+        # 启动时先从快照恢复人脸库，几毫秒后即可识别，再在后台与数据库核对；没有快照时在后台全量加载
+        self.face_sync = FaceSync(self.gallery, self.facesql,
+                                  interval=float(os.environ.get("FACE_SYNC_INTERVAL", "5")),
+                                  snapshot_dir=os.environ.get("FACE_GALLERY_SNAPSHOT", "gallery_snapshot") or None,
+                                  index_path=os.environ.get("FACE_INDEX_PATH") or None)
+        if self.face_sync.load_snapshot():
+            print(f"已从快照恢复 {len(self.gallery)} 条人脸记录，"
+                  f"距启动 {(time.perf_counter() - STARTED_AT) * 1000:.0f} ms")
+        self.face_sync.start(background=True)
 
         # 创建主窗口的中心部件，后续的各种布局和控件都将添加到这个部件上
         main_widget = QWidget()
@@ -49,8 +96,8 @@ class MyWindow(QMainWindow):
         self.cameraLabel.setFixedSize(640, 480)
         # 设置样式表，给显示区域添加1像素灰色实线边框，并设置背景颜色为黑色
         self.cameraLabel.setStyleSheet("border: 1px solid #ccc; background-color: #000;")
-        # 设置图像自适应标签大小，使得摄像头捕获的图像能自动缩放填充显示区域
-        self.cameraLabel.setScaledContents(True)
+        # 检测线程已经把画面按比例缩小到标签大小，这里不再让Qt缩放图像，只把图像居中显示
+        self.cameraLabel.setAlignment(Qt.AlignCenter)
         # 将摄像头显示标签添加到主布局中
         main_layout.addWidget(self.cameraLabel)
 
@@ -108,6 +155,11 @@ class MyWindow(QMainWindow):
         # 按钮区域相关设置
         self.pushButton_submit = QPushButton("提交")
         self.pushButton_recognize = QPushButton("识别")
+        # 自动识别按钮为可切换状态的按钮，按下后进入免点击的连续识别模式
+        self.pushButton_auto = QPushButton("自动识别")
+        self.pushButton_auto.setCheckable(True)
+        # 连拍录入按钮：在几秒内采集多帧人脸，合并为一个模板保存
+        self.pushButton_burst = QPushButton("连拍录入")
         self.pushButton_open_cam = QPushButton("开启摄像头")
         self.pushButton_close_cam = QPushButton("关闭摄像头")
         self.pushButton_exit = QPushButton("退出")
@@ -116,7 +168,9 @@ class MyWindow(QMainWindow):
         # 设置按钮布局内按钮之间的间距为15像素
         btn_layout.setSpacing(15)
         btn_layout.addWidget(self.pushButton_submit)
+        btn_layout.addWidget(self.pushButton_burst)
         btn_layout.addWidget(self.pushButton_recognize)
+        btn_layout.addWidget(self.pushButton_auto)
         btn_layout.addWidget(self.pushButton_open_cam)
         btn_layout.addWidget(self.pushButton_close_cam)
         btn_layout.addWidget(self.pushButton_exit)
@@ -129,12 +183,16 @@ class MyWindow(QMainWindow):
 
         right_layout.addLayout(btn_container)
 
-        # 初始化摄像头相关变量，初始时摄像头未打开，cap为None
-        self.cap = None
-        # 创建一个定时器对象，用于定时更新摄像头画面
-        self.timer = QTimer()
-        # 将定时器的超时信号连接到update_frame方法，当定时器超时时会自动调用该方法更新画面
-        self.timer.timeout.connect(self.update_frame)
+        # 初始化摄像头相关变量，初始时摄像头未打开，采集线程和检测线程均为None
+        self.capture_worker = None
+        self.detection_worker = None
+        # 创建一个定时器对象，用于每秒在状态栏刷新一次各阶段的帧率和丢帧统计
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_stats)
+        # 连拍录入的采样定时器，以及正在进行的连拍（学号、姓名、已采集的(完整画面, 人脸框)列表、开始时间）
+        self.burst_timer = QTimer()
+        self.burst_timer.timeout.connect(self.on_burst_tick)
+        self.burst = None
 
         # 加载人脸检测器相关设置
         cascade_path = os.path.join('XML', 'haarcascade_frontalface_default.xml')
@@ -148,33 +206,68 @@ class MyWindow(QMainWindow):
         if self.face_cascade.empty():
             QMessageBox.critical(self, "错误", "无法加载人脸检测器文件，请检查XML文件路径！")
             sys.exit(1)
-
-        # 初始化串口相关设置
-        self.serial = QSerialPort()
-        # 设置串口名称，这里默认设置为"COM3"，实际使用时需要根据实际连接的串口进行修改
-        self.serial.setPortName("COM3")
-        # 设置串口波特率为115200
-        self.serial.setBaudRate(QSerialPort.Baud115200)
-        # 设置数据位为8位
-        self.serial.setDataBits(QSerialPort.Data8)
-        # 设置无奇偶校验
-        self.serial.setParity(QSerialPort.NoParity)
-        # 设置停止位为1位
-        self.serial.setStopBits(QSerialPort.OneStop)
-        # 设置无流控制
-        self.serial.setFlowControl(QSerialPort.NoFlowControl)
-        # 尝试打开串口，如果打开失败则弹出警告提示框告知用户检查串口配置
-        if not self.serial.open(QtCore.QIODevice.ReadWrite):
-            QMessageBox.warning(self, "警告", "无法打开串口，请检查串口配置！")
+        # 在人脸检测器外层包装检测流水线：画面缩小一半后检测，在上一次人脸附近的区域内搜索并定期全画面扫描，画面静止时跳过检测
+        self.detector = FaceDetector(self.face_cascade, scale=0.5, full_scan_interval=15, motion_threshold=2.0)
+
+        # 门锁控制器的串口连接在后台线程中维护：打开、写入、等待应答、断线重连都不阻塞界面线程
+        # 串口名称可通过环境变量FACE_SERIAL_PORT指定（例如COM3），未指定时自动选择常见USB转串口芯片对应的串口；
+        # 控制器固件会回复ok时，设置FACE_SERIAL_ACK=1后以收到应答作为开锁完成
+        self.serial_worker = SerialWorker(os.environ.get("FACE_SERIAL_PORT") or None,
+                                          require_ack=os.environ.get("FACE_SERIAL_ACK") == "1")
+        self.serial_worker.unlocked.connect(self.on_unlocked)
+        self.serial_worker.failed.connect(self.on_unlock_failed)
+        self.serial_worker.connectionChanged.connect(self.on_serial_changed)
+        self.serial_worker.start()
+        # 最近一次开锁的耗时（毫秒），显示在状态栏中；第一次开锁时记录距离程序启动的时间
+        self.last_unlock_ms = None
+        self.first_unlock_ms = None
 
         # 绑定按钮的点击事件与对应的方法
         self.pushButton_exit.clicked.connect(self.close)
         self.pushButton_submit.clicked.connect(self.on_submit_clicked)
+        self.pushButton_burst.clicked.connect(self.on_burst_clicked)
         self.pushButton_open_cam.clicked.connect(self.open_camera)
         self.pushButton_close_cam.clicked.connect(self.close_camera)
         self.pushButton_recognize.clicked.connect(self.on_recognize_clicked)
+        self.pushButton_auto.toggled.connect(self.on_auto_toggled)
+
+        # 多进程特征提取：画面中有多张人脸时，通过共享内存把画面交给进程池，每张人脸在一个CPU核心上并行提取特征编码
+        # 工作进程数可通过环境变量FACE_ENCODE_WORKERS设置，默认为CPU核心数减1，设置为0或1时在当前线程中逐张提取
+        encode_workers = int(os.environ.get("FACE_ENCODE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+        self.encoder_pool = EncoderPool(workers=encode_workers) if encode_workers > 1 else None
+        # face_recognition的导入和模型加载需要数秒，在后台线程中完成（同时启动进程池的工作进程），窗口立即可用
+        self.model_loader = ModelLoader(self.encoder_pool)
+        self.model_loader.loaded.connect(self.on_models_loaded)
+        self.model_loader.failed.connect(self.on_models_failed)
+        self.model_loader.start()
+
+        # 初始化自动识别器：跟踪相邻帧中的人脸，每条轨迹只在出现时以及每隔若干帧提取一次特征编码，
+        # 同一身份累计匹配confirm_hits次后对该轨迹触发一次开锁；同一帧中的多张人脸交给进程池并行提取
+        # 识别结果缓存：同一个人反复识别时，编码与几秒内识别过的编码足够接近就直接返回缓存的身份，不再检索人脸库；
+        # 人脸库发生变化时缓存自动清空
+        self.recognition_cache = RecognitionCache(self.gallery, epsilon=0.2, ttl=5.0)
+        # 防抖：同一时间段内只发送一次开锁指令，同一身份的识别结果只弹出一次提示框，
+        # 间隔可通过环境变量FACE_UNLOCK_DEBOUNCE设置（秒，默认为3秒）
+        debounce = float(os.environ.get("FACE_UNLOCK_DEBOUNCE", "3"))
+        self.unlock_debouncer = Debouncer(debounce)
+        self.message_debouncer = Debouncer(debounce)
+        self.auto_recognizer = AutoRecognizer(
+            self.gallery, encode_face, tolerance=0.6, confirm_hits=3,
+            batch_encoder=self.encoder_pool.encode_all if self.encoder_pool is not None else None,
+            cache=self.recognition_cache,
+            # 模型和人脸库在后台加载完成之前只跟踪人脸，不在检测线程中等待模型加载
+            ready=lambda: models_loaded() and self.face_sync.ready.is_set())
+
+        # 录入线程：在后台提取人脸特征并批量写入数据库，数据库暂时不可用时把请求保存到本地日志稍后重试，界面不会被阻塞
+        self.enroll_worker = EnrollWorker(self.facetools, encoder=encode_face)
+        self.enroll_worker.saved.connect(self.on_enroll_saved)
+        self.enroll_worker.duplicate.connect(self.on_enroll_duplicate)
+        self.enroll_worker.failed.connect(self.on_enroll_failed)
+        self.enroll_worker.deferred.connect(self.on_enroll_deferred)
+        self.enroll_worker.start()
 
         self.detected_face = None
+        self.detected_faces = None
 
     def closeEvent(self, event):
         """
@@ -183,81 +276,137 @@ class MyWindow(QMainWindow):
         参数:
         - event: 关闭事件对象，用于控制关闭事件的接受或忽略等操作。
 
-        如果摄像头已打开，释放摄像头资源；如果串口已打开，关闭串口。然后接受关闭事件，使窗口正常关闭。
+        停止录入线程（尚未写入的录入请求保存到本地日志）和人脸库同步线程（同时保存人脸库快照，下次启动时直接恢复）以及指标导出；
+        如果摄像头已打开，停止采集和检测线程；等待模型加载线程结束并关闭特征提取进程池；关闭串口线程。然后接受关闭事件，使窗口正常关闭。
         """
-        if self.cap is not None and self.cap.isOpened():
-            self.cap.release()
-        if self.serial.isOpen():
-            self.serial.close()
+        self.enroll_worker.stop()
+        self.face_sync.stop()
+        if self.metrics_file is not None:
+            self.metrics_file.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        self.close_camera()
+        self.model_loader.wait()
+        if self.encoder_pool is not None:
+            self.encoder_pool.close()
+        self.serial_worker.stop()
         event.accept()
 
     def open_camera(self):
         """
         用于打开摄像头的方法。
 
-        如果摄像头未打开（self.cap为None或者未处于打开状态），尝试打开摄像头（通过cv2.VideoCapture(0)，0表示默认摄像头设备）。
-        如果打开失败，弹出错误提示框告知用户无法打开摄像头，并将self.cap设置为None。
-        如果打开成功，启动定时器，每30毫秒触发一次update_frame方法来更新摄像头画面。
+        如果摄像头未打开，创建一个只保留最新帧的队列，并启动两个后台线程：
+        CaptureWorker在后台打开摄像头（0表示默认摄像头设备）并持续读取画面放入队列，
+        DetectionWorker从队列中取出最新画面完成人脸检测和图像转换，处理结果通过信号交给update_frame方法显示。
+        采集跟不上检测时旧帧会被直接丢弃，界面线程不会因为检测耗时而卡顿。
         """
-        if self.cap is None or not self.cap.isOpened():
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                QMessageBox.critical(self, "错误", "无法打开摄像头")
-                self.cap = None
-                return
-        self.timer.start(30)  # 每30ms更新一次画面
+        if self.capture_worker is not None:
+            return
+        frame_queue = LatestFrameQueue(maxsize=1)
+        self.capture_worker = CaptureWorker(frame_queue, device=0)
+        frame_queue.stats = self.capture_worker.stats
+        self.detector.reset()
+        # 预览画面直接缩小到标签大小，最高帧率可通过环境变量FACE_PREVIEW_FPS设置（默认15帧/秒），与检测帧率无关
+        preview = PreviewRenderer((self.cameraLabel.width(), self.cameraLabel.height()),
+                                  max_fps=float(os.environ.get("FACE_PREVIEW_FPS", "15")))
+        self.detection_worker = DetectionWorker(frame_queue, self.detector, preview=preview)
+        self.capture_worker.error.connect(self.on_camera_error)
+        self.detection_worker.frameReady.connect(self.update_frame)
+        self.detection_worker.recognized.connect(self.on_auto_recognized)
+        self.detection_worker.identified.connect(self.on_identified)
+        self.detection_worker.identifyFailed.connect(self.on_identify_failed)
+        if self.pushButton_auto.isChecked():
+            self.detection_worker.set_auto_recognizer(self.auto_recognizer)
+        self.detection_worker.start()
+        self.capture_worker.start()
+        self.stats_timer.start(1000)  # 每秒刷新一次统计信息
 
     def close_camera(self):
         """
         用于关闭摄像头的方法。
 
-        如果摄像头已打开，停止定时器以停止画面更新，释放摄像头资源，并将self.cap设置为None。
+        如果摄像头已打开，依次停止采集线程（释放摄像头资源）和检测线程，并将相关变量设置为None。
         同时清空摄像头显示标签的内容，并将检测到的人脸图像设置为None。
         """
-        if self.cap is not None and self.cap.isOpened():
-            self.timer.stop()
-            self.cap.release()
-            self.cap = None
+        if self.capture_worker is not None:
+            self.stats_timer.stop()
+            self.capture_worker.stop()
+            self.detection_worker.stop()
+            self.capture_worker = None
+            self.detection_worker = None
+            self.statusBar().clearMessage()
+        # 检测线程停止后未完成的点击识别不会再返回结果，恢复“识别”按钮
+        self.pushButton_recognize.setEnabled(True)
         self.cameraLabel.clear()
         self.detected_face = None
+        self.detected_faces = None
 
-    def update_frame(self):
+    def on_camera_error(self, message):
+        """
+        采集线程打开摄像头失败时调用，弹出错误提示框并关闭摄像头相关线程。
         """
-        用于更新摄像头画面显示以及检测画面中的人脸的方法。
+        QMessageBox.critical(self, "错误", message)
+        self.close_camera()
 
-        如果摄像头已打开且处于可读状态，读取一帧图像，进行如下操作：
-        1. 将图像转换为灰度图，方便后续人脸检测操作。
-        2. 使用加载的人脸检测器在灰度图中检测人脸，得到人脸的位置信息（坐标、宽度、高度等）。
-        3. 遍历检测到的人脸，在原始彩色图像上绘制绿色矩形框标记人脸区域，只取第一张人脸作为后续处理的对象（break跳出循环），并将这张人脸的图像区域保存到self.detected_face变量中。
-        4. 将图像从BGR颜色空间转换为RGB颜色空间（因为后续使用的face_recognition库通常要求RGB格式图像）。
-        5. 根据图像的形状信息创建Qt的QImage对象，再将其转换为QPixmap对象，最后设置到摄像头显示标签上，实现画面更新显示。
+    def update_frame(self, qimg, detected_faces):
         """
-        if self.cap is not None and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if not ret:
-                return
+        用于更新摄像头画面显示以及保存检测到的人脸的方法，由DetectionWorker的frameReady信号在界面线程中调用。
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+        参数:
+        - qimg: 检测线程已缩小到标签大小并绘制好人脸矩形框的QImage，直接引用检测线程的预览缓冲区。
+        - detected_faces: 检测到的全部人脸，形式为(完整画面, 人脸框列表)，未检测到人脸时为None，保存到self.detected_faces供识别使用；
+          其中第一张人脸以(完整画面, 人脸框)的形式保存到self.detected_face，供录入使用。
 
-            self.detected_face = None
-            for (x, y, w, h) in faces:
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                face_roi = frame[y:y + h, x:x + w]
-                self.detected_face = face_roi
-                break  # 只处理第一张人脸
+        界面线程只需把QImage转换为QPixmap并设置到摄像头显示标签上，之后通知检测线程预览缓冲区可以重新使用。
+        预览按限速后的帧率到达，保存的人脸最多比检测结果晚一帧预览的时间，与画面上显示的人脸框一致。
+        摄像头已关闭后仍在信号队列中的画面会被忽略。
+        """
+        if self.capture_worker is None:
+            return
+        self.detected_faces = detected_faces
+        self.detected_face = (detected_faces[0], detected_faces[1][0]) if detected_faces is not None else None
+        self.cameraLabel.setPixmap(QtGui.QPixmap.fromImage(qimg))
+        self.detection_worker.preview_shown()
 
-            rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qimg = QtGui.QImage(rgb_image.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-            pixmap = QtGui.QPixmap.fromImage(qimg)
-            self.cameraLabel.setPixmap(pixmap)
+    def on_auto_toggled(self, checked):
+        """
+        “自动识别”按钮切换状态时调用。
 
-    def on_submit_clicked(self):
+        按下时把自动识别器交给检测线程，之后每帧的检测结果都会被跟踪和识别；
+        弹起时从检测线程中移除自动识别器。已有的轨迹由检测线程在下一次开启时清空，界面线程不直接调用reset。
         """
-        处理“提交”按钮点击事件的方法，用于将输入的学号、姓名以及对应的人脸特征编码保存到数据库中，
-        在保存前会进行一系列的输入合法性校验以及人脸检测相关的校验。
+        if self.detection_worker is not None:
+            self.detection_worker.set_auto_recognizer(self.auto_recognizer if checked else None)
+
+    def on_auto_recognized(self, event):
+        """
+        自动识别模式下某条轨迹确认身份时调用（每条轨迹只调用一次），在状态栏显示识别结果并发送开锁信号。
+
+        参数:
+        - event: (学号, 姓名, 距离)元组。
+        """
+        matched_id, matched_name, _ = event
+        self.statusBar().showMessage(f"识别到学号 {matched_id} 的人脸：{matched_name}", 3000)
+        self.sendOpenSignal()
+
+    def update_stats(self):
+        """
+        在状态栏显示采集、检测和预览三个阶段的帧率、丢帧统计，以及检测线程中检测和生成预览平均每帧消耗的CPU时间。
+        """
+        if self.capture_worker is not None:
+            self.statusBar().showMessage(
+                f"{self.capture_worker.stats}    {self.detection_worker.stats}    "
+                f"{self.detection_worker.preview_stats}    "
+                f"检测CPU {self.detector.cpu_ms:.1f}ms/帧    预览CPU {self.detection_worker.preview.cpu_ms:.1f}ms/帧    "
+                f"{self.recognition_cache}"
+                + (f"    开锁耗时 {self.last_unlock_ms:.1f}ms" if self.last_unlock_ms is not None else "")
+            )
+
+    def check_enroll_inputs(self):
+        """
+        校验输入框中的学号和姓名，供“提交”和“连拍录入”共用。
+        合法时返回(学号, 姓名)；不合法或已存在时弹出提示框并返回None。
         """
         # 获取输入框中学号文本并去除两端空白字符
         id_val = self.lineEdit_id.text().strip()
@@ -265,29 +414,81 @@ class MyWindow(QMainWindow):
         name_val = self.lineEdit_name.text().strip()
 
         # 输入校验
-        # 检查学号是否为空，如果为空则弹出警告提示框告知用户学号不能为空，并结束当前方法，不进行后续保存操作
+        # 检查学号是否为空，如果为空则弹出警告提示框告知用户学号不能为空，并返回None
         if not id_val:
             QMessageBox.warning(self, "输入错误", "学号不能为空！")
-            return
-        # 检查姓名是否为空，如果为空则弹出警告提示框告知用户姓名不能为空，并结束当前方法，不进行后续保存操作
+            return None
+        # 检查姓名是否为空，如果为空则弹出警告提示框告知用户姓名不能为空，并返回None
         if not name_val:
             QMessageBox.warning(self, "输入错误", "姓名不能为空！")
-            return
+            return None
 
-        # 检查学号是否全部由数字组成，如果不是则弹出警告提示框告知用户学号必须是数字，并结束当前方法
+        # 检查学号是否全部由数字组成，如果不是则弹出警告提示框告知用户学号必须是数字，并返回None
         if not id_val.isdigit():
             QMessageBox.warning(self, "输入错误", "学号必须是数字！")
-            return
-        # 检查姓名去除空格后是否全部由字母组成，如果不是则弹出警告提示框告知用户姓名必须是字母，并结束当前方法
+            return None
+        # 检查姓名去除空格后是否全部由字母组成，如果不是则弹出警告提示框告知用户姓名必须是字母，并返回None
         if not name_val.replace(' ', '').isalpha():
             QMessageBox.warning(self, "输入错误", "姓名必须是字母！")
-            return
+            return None
 
-        # 调用facesql的record_exists方法检查数据库中是否已存在相同学号或姓名的记录，
-        # 如果存在则弹出警告提示框告知用户该学号或姓名已存在，请更换，并结束当前方法
-        if self.facesql.record_exists(id_val, name_val):
+        # 在内存人脸库中检查是否已存在相同学号或姓名的记录（不访问数据库），
+        # 如果存在则弹出警告提示框告知用户该学号或姓名已存在，请更换，并返回None
+        if self.gallery.contains(id_val, name_val):
             QMessageBox.warning(self, "重复错误", "该学号或姓名已存在，请更换！")
+            return None
+        return id_val, name_val
+
+    def on_burst_clicked(self):
+        """
+        处理“连拍录入”按钮点击事件的方法。
+
+        校验学号和姓名后，在BURST_SECONDS秒内每隔一段时间采集一次检测线程保存的人脸，最多采集BURST_SAMPLES帧，
+        然后交给录入线程：逐帧提取特征编码，按相互距离剔除闭眼、侧脸、模糊等离群样本，把剩余样本合并为一个模板保存。
+        人脸库中每人仍然只有一条记录，比对开销不随录入的照片数量增加。
+        """
+        if self.burst is not None:
+            return
+        checked = self.check_enroll_inputs()
+        if checked is None:
+            return
+        if self.capture_worker is None:
+            QMessageBox.warning(self, "警告", "请先开启摄像头，并正对摄像头。")
+            return
+        self.burst = (checked[0], checked[1], [], time.monotonic())
+        self.pushButton_burst.setEnabled(False)
+        self.statusBar().showMessage("正在连拍，请正对摄像头并稍微转动头部...")
+        self.burst_timer.start(int(BURST_SECONDS * 1000 / BURST_SAMPLES))
+
+    def on_burst_tick(self):
+        """
+        连拍采样定时器的槽函数：保存当前检测到的人脸（与上一次采样不是同一帧时），采集够样本或超时后提交给录入线程。
+        """
+        id_val, name_val, faces, started = self.burst
+        if self.detected_face is not None and (not faces or faces[-1][0] is not self.detected_face[0]):
+            faces.append(self.detected_face)
+        if len(faces) < BURST_SAMPLES and time.monotonic() - started < BURST_SECONDS and self.capture_worker is not None:
+            return
+        self.burst_timer.stop()
+        self.burst = None
+        self.pushButton_burst.setEnabled(True)
+        if len(faces) < BURST_MIN_SAMPLES:
+            self.statusBar().clearMessage()
+            QMessageBox.warning(self, "警告", f"只采集到 {len(faces)} 帧人脸，请正对摄像头重新录入。")
             return
+        self.enroll_worker.submit(id_val, name_val, faces=faces)
+        self.statusBar().showMessage(f"已采集 {len(faces)} 帧，正在保存 {id_val} {name_val} 的人脸模板...")
+
+    def on_submit_clicked(self):
+        """
+        处理“提交”按钮点击事件的方法，用于将输入的学号、姓名以及对应的人脸特征编码保存到数据库中，
+        在保存前会进行一系列的输入合法性校验以及人脸检测相关的校验。
+        """
+        # 校验学号和姓名，不合法时已经弹出提示，直接结束当前方法
+        checked = self.check_enroll_inputs()
+        if checked is None:
+            return
+        id_val, name_val = checked
 
         # 检查是否检测到人脸，如果没有检测到人脸（self.detected_face为None），
         # 则弹出警告提示框告知用户未检测到人脸，请确保摄像头已开启并有正确的人脸图像，并结束当前方法
@@ -295,105 +496,166 @@ class MyWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "未检测到人脸，请确保摄像头已开启并有正确的人脸图像。")
             return
 
-        # 提取人脸特征编码相关操作
-        # 将检测到的人脸图像（BGR格式）转换为RGB格式，因为后续的face_recognition库通常要求输入的图像为RGB格式
-        rgb_face = cv2.cvtColor(self.detected_face, cv2.COLOR_BGR2RGB)
-        # 使用face_recognition库的face_encodings方法提取人脸的特征编码，返回一个包含特征编码的列表（可能包含多个人脸的编码，这里只处理检测到的第一个人脸）
-        face_encs = face_recognition.face_encodings(rgb_face)
-        # 如果没有成功提取到人脸特征编码（列表为空），则弹出警告提示框告知用户无法提取人脸特征，请重试，并结束当前方法
-        if len(face_encs) == 0:
-            QMessageBox.warning(self, "错误", "无法提取人脸特征，请重试。")
-            return
-        # 取提取到的第一个（也是唯一处理的）人脸特征编码
-        face_encoding = face_encs[0]
-
-        # 将编码存入数据库相关操作
-        try:
-            # 调用facetools的add_Face方法，将提取到的人脸特征编码以及学号、姓名信息保存到数据库中
-            self.facetools.add_Face(face_encoding, id_val, name_val)
-            # 如果保存成功，弹出信息提示框告知用户人脸数据已成功保存到数据库！
-            QMessageBox.information(self, "成功", "人脸数据已成功保存到数据库！")
-            # 调用clear_inputs方法清空学号、姓名输入框以及重置检测到的人脸图像相关变量
+        # 把检测线程保存的完整画面和人脸框交给录入线程，由后台线程提取特征编码并写入数据库，界面立即返回；
+        # 写入结果通过on_enroll_saved、on_enroll_duplicate、on_enroll_failed等槽函数通知
+        self.enroll_worker.submit(id_val, name_val, face=self.detected_face)
+        self.statusBar().showMessage(f"正在保存 {id_val} {name_val} 的人脸数据...")
+
+    def on_enroll_saved(self, id_val, name_val):
+        """
+        录入线程写入成功时调用的槽函数。弹出提示框；如果输入框中仍是这次提交的学号和姓名，则清空输入框。
+        """
+        self.statusBar().showMessage(f"{id_val} {name_val} 的人脸数据已保存", 5000)
+        QMessageBox.information(self, "成功", f"{id_val} {name_val} 的人脸数据已成功保存到数据库！")
+        if self.lineEdit_id.text().strip() == id_val and self.lineEdit_name.text().strip() == name_val:
             self.clear_inputs()
-        except Exception as e:
-            # 如果保存过程出现异常，弹出错误提示框显示具体的错误信息（数据插入失败的原因）
-            QMessageBox.critical(self, "错误", f"数据插入失败：{e}")
+
+    def on_enroll_duplicate(self, id_val, name_val):
+        """
+        数据库的唯一索引拒绝了重复的学号或姓名时调用的槽函数（例如另一台终端刚刚录入了同一个人）。
+        """
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "重复错误", f"学号{id_val}或姓名{name_val}已存在，请更换！")
+
+    def on_enroll_failed(self, id_val, name_val, error):
+        """
+        录入失败且不再重试时调用的槽函数，例如无法提取人脸特征。
+        """
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "错误", f"{id_val} {name_val}：{error}")
+
+    def on_enroll_deferred(self, pending):
+        """
+        数据库暂时不可用、录入请求被保存到本地日志时调用的槽函数，在状态栏提示等待写入的数量。
+        """
+        self.statusBar().showMessage(f"数据库暂时不可用，{pending} 条录入已保存在本地，将自动重试")
 
     def on_recognize_clicked(self):
         """
-        处理“识别”按钮点击事件的方法，用于识别当前摄像头画面中检测到的人脸是否在数据库中存在匹配记录，
-        若匹配成功会发送相应的串口信号。
+        处理“识别”按钮点击事件的方法，用于识别当前摄像头画面中检测到的每一张人脸是否在数据库中存在匹配记录，
+        只要有一张人脸匹配成功就发送相应的串口信号。
         """
-        # 检查是否检测到人脸，如果没有检测到人脸（self.detected_face为None），
+        # 检查是否检测到人脸，如果没有检测到人脸（self.detected_faces为None），
         # 则弹出警告提示框告知用户未检测到人脸，请开启摄像头并确保有面部出现在摄像头前，并结束当前方法
-        if self.detected_face is None:
+        if self.detected_faces is None:
             QMessageBox.warning(self, "警告", "未检测到人脸，请开启摄像头并确保有面部出现在摄像头前。")
             return
+        # 模型和人脸库都在后台加载，尚未完成时只在状态栏提示，不在界面线程中等待
+        if not models_loaded():
+            self.statusBar().showMessage("正在加载人脸特征提取模型，请稍候...", 3000)
+            return
+        if not self.face_sync.ready.is_set():
+            self.statusBar().showMessage("正在加载人脸库，请稍候...", 3000)
+            return
+
+        # 提取特征编码和检索人脸库（人脸库过期时还要从数据库重新加载）都交给检测线程完成，界面线程不会被阻塞；
+        # 根据检测线程保存的完整画面和全部人脸框直接提取特征编码，编码器内部不再重复检测人脸，
+        # 画面中有多张人脸且启用了进程池时，各张人脸在不同的CPU核心上并行提取。结果通过信号交给on_identified方法。
+        # 识别完成之前禁用“识别”按钮，避免重复提交
+        frame, boxes = self.detected_faces
+        self.pushButton_recognize.setEnabled(False)
+        self.detection_worker.request_recognition(self.auto_recognizer, frame, boxes)
+
+    def on_identified(self, results):
+        """
+        检测线程完成一次点击识别时调用的槽函数，在界面线程中显示识别结果并发送开锁信号。
 
-        # 提取当前人脸特征编码相关操作
-        # 将检测到的人脸图像（BGR格式）转换为RGB格式，以满足后续face_recognition库的要求
-        rgb_face = cv2.cvtColor(self.detected_face, cv2.COLOR_BGR2RGB)
-        # 使用face_recognition库的face_encodings方法提取当前人脸的特征编码，返回一个包含特征编码的列表（这里只处理第一个人脸的编码）
-        face_encs = face_recognition.face_encodings(rgb_face)
-        # 如果没有成功提取到人脸特征编码（列表为空），则弹出警告提示框告知用户无法提取人脸特征，请重试，并结束当前方法
-        if len(face_encs) == 0:
+        参数:
+        - results: AutoRecognizer.identify的返回值，每个元素为(学号, 姓名, 距离)或None；
+          空列表表示没有提取到特征编码，None表示数据库中没有人脸数据。
+        """
+        self.pushButton_recognize.setEnabled(True)
+        # 如果没有成功提取到任何人脸特征编码，则弹出警告提示框告知用户无法提取人脸特征，请重试，并结束当前方法
+        if results is not None and not results:
             QMessageBox.warning(self, "错误", "无法提取人脸特征，请重试。")
             return
-        # 获取当前人脸的特征编码
-        current_face_encoding = face_encs[0]
-
-        # 从数据库加载所有人脸特征相关操作
-        # 调用facetools的load_faceofdatabase方法从数据库中加载所有人脸数据，包括学号、姓名以及对应的人脸特征编码
-        face_ids, face_names, face_encodings = self.facetools.load_faceofdatabase()
-        # 如果数据库中没有人脸数据（加载的学号列表为空），则弹出提示框告知用户数据库中暂无人脸数据，并结束当前方法
-        if not face_ids:
+        # 如果数据库中没有人脸数据，则弹出提示框告知用户数据库中暂无人脸数据，并结束当前方法
+        if results is None:
             QMessageBox.warning(self, "提示", "数据库中暂无人脸数据。")
             return
 
-        # 使用 face_recognition 进行比较相关操作
-        # 使用face_recognition库的compare_faces方法比较当前人脸特征编码与数据库中所有人脸特征编码，
-        # tolerance参数设置比较的容忍度，返回一个布尔列表，表示是否匹配，每个元素对应数据库中的一条人脸记录
-        matches = face_recognition.compare_faces(face_encodings, current_face_encoding, tolerance=0.6)
-        # 使用face_recognition库的face_distance方法计算当前人脸特征编码与数据库中所有人脸特征编码的距离，
-        # 距离越小表示越相似，返回一个距离值列表，每个元素对应数据库中的一条人脸记录
-        face_distances = face_recognition.face_distance(face_encodings, current_face_encoding)
-
-        # 如果距离列表为空（可能由于数据库中没有有效数据等原因），则弹出识别结果提示框告知用户未匹配到已知人脸，并结束当前方法
-        if len(face_distances) == 0:
-            QMessageBox.information(self, "识别结果", "未匹配到已知人脸。")
-            return
-
-        # 找到距离最小的匹配索引，即找到与当前人脸最相似的数据库中的人脸记录索引
-        best_match_index = np.argmin(face_distances)
-        # 如果该索引对应的匹配结果为True，表示找到了匹配的人脸
-        if matches[best_match_index]:
-            # 获取匹配到的人脸的学号
-            matched_id = face_ids[best_match_index]
-            # 获取匹配到的人脸的姓名
-            matched_name = face_names[best_match_index]
-            # 弹出信息提示框告知用户识别到的学号和姓名
-            QMessageBox.information(self, "识别结果", f"识别到学号 {matched_id} 的人脸：{matched_name}")
-            # 调用sendOpenSignal方法发送串口信号（可能用于后续如开门等相关操作）
+        # 判断匹配结果相关操作：只有最近距离不超过容忍度（0.6）时才认为匹配到了已知人脸
+        matched = [result for result in results if result is not None]
+        # 同一组身份在防抖时间内重复识别时，只在状态栏显示结果，不再弹出提示框
+        key = tuple(sorted(result[0] for result in matched))
+        if matched:
+            # 弹出信息提示框告知用户识别到的学号和姓名（画面中有多张人脸时逐行列出），未匹配的人脸数量附在最后
+            unknown = len(results) - len(matched)
+            message = "\n".join(f"识别到学号 {matched_id} 的人脸：{matched_name}" for matched_id, matched_name, _ in matched)
+            if unknown:
+                message += f"\n另有 {unknown} 张人脸未匹配到已知人脸。"
+            self.show_result(key, message)
+            # 调用sendOpenSignal方法发送串口信号（可能用于后续如开门等相关操作），多张人脸匹配成功时也只发送一次
             self.sendOpenSignal()
         else:
             # 如果没有匹配到已知人脸，则弹出识别结果提示框告知用户未匹配到已知人脸
-            QMessageBox.information(self, "识别结果", "未匹配到已知人脸。")
+            self.show_result(key, "未匹配到已知人脸。")
+
+    def on_identify_failed(self, error):
+        """
+        检测线程中的点击识别出错时调用的槽函数，恢复“识别”按钮并弹出错误提示框。
+        """
+        self.pushButton_recognize.setEnabled(True)
+        QMessageBox.critical(self, "错误", error)
+
+    def show_result(self, key, message):
+        """
+        显示识别结果：同一组身份（key）在防抖时间内第一次识别时弹出提示框，之后只在状态栏显示，避免反复弹窗。
+        """
+        if self.message_debouncer.allow(key):
+            QMessageBox.information(self, "识别结果", message)
+        else:
+            self.statusBar().showMessage(message.replace("\n", "；"), 3000)
 
     def sendOpenSignal(self):
         """
-        用于发送串口信号的方法，当识别到人脸与数据库中记录匹配时调用，
-        向串口发送特定数据（这里是字节类型的"open"），前提是串口处于打开状态。
+        用于发送开锁指令的方法，当识别到人脸与数据库中记录匹配时调用。
+        指令交给串口后台线程发送（字节类型的"open"），本方法立即返回，结果由on_unlocked或on_unlock_failed处理。
+        距离上一次发送不足防抖时间时直接返回，门锁控制器不会收到一连串重复的开锁指令。
+        """
+        if not self.unlock_debouncer.allow("open"):
+            return
+        self.serial_worker.send_open()
+        if not self.serial_worker.connected:
+            # 串口断开期间的指令会在重新连接后的几秒内补发，超时则丢弃
+            self.statusBar().showMessage("串口未连接，正在重新连接门锁控制器...", 3000)
+
+    def on_unlocked(self, latency_ms):
+        """
+        开锁指令发送完成（或控制器已确认）时调用，参数为从识别成功到开锁完成的耗时（毫秒），记录下来显示在状态栏中。
+        """
+        self.last_unlock_ms = latency_ms
+        if self.first_unlock_ms is None:
+            self.first_unlock_ms = (time.perf_counter() - STARTED_AT) * 1000
+            print(f"启动后第一次开锁：距启动 {self.first_unlock_ms:.0f} ms")
+
+    def on_models_loaded(self, seconds):
+        """
+        特征提取模型在后台加载完成时调用，在状态栏提示加载耗时。
+        """
+        print(f"特征提取模型加载完成，耗时 {seconds:.1f} 秒，距启动 {time.perf_counter() - STARTED_AT:.1f} 秒")
+        self.statusBar().showMessage(f"人脸特征提取模型已加载（{seconds:.1f} 秒）", 3000)
+
+    def on_models_failed(self, message):
+        """
+        特征提取模型加载失败时调用（例如没有安装face_recognition），弹出错误提示框。
+        """
+        QMessageBox.critical(self, "错误", message)
+
+    def on_unlock_failed(self, message):
+        """
+        开锁指令发送失败、控制器没有应答或指令已过期时调用。
+        """
+        self.statusBar().showMessage(f"开锁失败：{message}", 5000)
+
+    def on_serial_changed(self, connected, port):
+        """
+        串口连接状态变化时调用，在状态栏中提示。
         """
-        if self.serial.isOpen():
-            # 定义要发送的数据为字节类型的"open"，具体含义可能根据实际连接的设备而定，比如可能用于控制门锁打开等操作
-            data = b"open"
-            # 通过串口发送数据
-            self.serial.write(data)
-            # 刷新串口缓冲区，确保数据立即发送出去
-            self.serial.flush()
+        if connected:
+            self.statusBar().showMessage(f"已连接门锁控制器（{port}）", 3000)
         else:
-            # 如果串口未打开，弹出警告提示框告知用户串口未打开，无法发送开锁指令！
-            QMessageBox.warning(self, "警告", "串口未打开，无法发送开锁指令！")
+            self.statusBar().showMessage(f"门锁控制器的串口（{port}）已断开，正在重新连接...", 5000)
 
     def clear_inputs(self):
         """
@@ -406,6 +668,7 @@ class MyWindow(QMainWindow):
         self.lineEdit_name.clear()
         # 将检测到的人脸图像相关变量设置为None，重置状态
         self.detected_face = None
+        self.detected_faces = None
 
 if __name__ == "__main__":
     # 确保XML文件夹存在，并包含haarcascade_frontalface_default.xml文件，
@@ -0,0 +1,91 @@
+"""
+对比原始全画面Haar检测与FaceDetector检测流水线每帧消耗的CPU时间。
+
+原始方式与改动前的update_frame一致：每帧转换为灰度图后直接在全分辨率画面上调用detectMultiScale(gray, 1.3, 5)。
+FaceDetector方式依次启用降采样、ROI搜索和静止画面跳帧。
+
+用法：
+    python benchmarks/bench_detection.py 录像.mp4 [--frames 300] [--scale 0.5] [--min-face 80 --max-face 400]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceDetector import FaceDetector
+
+
+def read_frames(path, limit):
+    # 读取录像中的前limit帧，全部放入内存，保证计时不包含视频解码
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(detect, frames):
+    # 返回平均每帧CPU时间（毫秒，只统计当前线程）以及检测到人脸的帧数
+    hits = 0
+    start = time.thread_time()
+    for frame in frames:
+        if len(detect(frame)) > 0:
+            hits += 1
+    return (time.thread_time() - start) * 1000 / len(frames), hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比全画面Haar检测与FaceDetector检测流水线的CPU耗时")
+    parser.add_argument("video", help="录制的门禁视频文件")
+    parser.add_argument("--frames", type=int, default=300, help="参与测试的帧数")
+    parser.add_argument("--scale", type=float, default=0.5, help="FaceDetector的降采样比例")
+    parser.add_argument("--min-face", type=int, default=None, help="原始画面中人脸的最小宽度（像素）")
+    parser.add_argument("--max-face", type=int, default=None, help="原始画面中人脸的最大宽度（像素）")
+    parser.add_argument("--cascade", default=os.path.join("XML", "haarcascade_frontalface_default.xml"),
+                        help="Haar人脸检测器文件路径")
+    args = parser.parse_args()
+
+    face_cascade = cv2.CascadeClassifier(args.cascade)
+    if face_cascade.empty():
+        print(f"无法加载人脸检测器文件: {args.cascade}")
+        sys.exit(1)
+    frames = read_frames(args.video, args.frames)
+    if not frames:
+        print(f"无法读取视频: {args.video}")
+        sys.exit(1)
+
+    def baseline(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return face_cascade.detectMultiScale(gray, 1.3, 5)
+
+    configs = [
+        ("全画面检测（原方式）", baseline, None),
+        ("降采样", None, dict(scale=args.scale, full_scan_interval=1, motion_threshold=0)),
+        ("降采样+ROI", None, dict(scale=args.scale, motion_threshold=0)),
+        ("降采样+ROI+静止跳帧", None, dict(scale=args.scale)),
+    ]
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} 帧, 分辨率 {w}x{h}")
+    base_ms = None
+    for name, detect, options in configs:
+        detector = None
+        if detect is None:
+            detector = FaceDetector(face_cascade, min_face=args.min_face, max_face=args.max_face, **options)
+            detect = detector.detect
+        ms, hits = run(detect, frames)
+        base_ms = base_ms or ms
+        extra = ""
+        if detector is not None:
+            extra = f"  ROI搜索 {detector.roi_scans}  跳帧 {detector.skipped}"
+        print(f"{name:20s} {ms:8.2f} ms/帧  ({base_ms / ms:5.2f}x)  检出 {hits}/{len(frames)}{extra}")
+
+
+if __name__ == "__main__":
+    main()
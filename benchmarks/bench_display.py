@@ -0,0 +1,106 @@
+"""
+对比摄像头画面到界面显示的两种处理方式每帧消耗的CPU时间：
+
+1. 改动前：每帧把全尺寸画面转换为RGB（cvtColor，一次全尺寸复制），在上面绘制人脸框，包装为QImage后再复制一次，
+   界面线程的QPixmap.fromImage又复制一次，最后QLabel（setScaledContents）在绘制时把全尺寸图像缩放到标签大小；
+2. 改动后：PreviewRenderer把画面直接缩小到标签大小并写入预先分配的缓冲区，人脸框画在小图上，
+   使用Format_BGR888时不做颜色转换，QImage直接引用缓冲区；预览限速到--preview-fps，检测帧率不变。
+
+安装了PyQt5时QImage的构造和复制使用真实的Qt；否则用等量的numpy复制代替，并用cv2.resize代替Qt的缩放。
+结果为“每个检测帧”平均消耗的CPU时间（time.process_time，包含所有线程），即限速后省下的预览也计入。
+
+用法：
+    python benchmarks/bench_display.py [--sizes 640x480 1280x720 1920x1080] [--frames 300]
+                                       [--detect-fps 30] [--preview-fps 15]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FramePreview import PreviewRenderer
+
+try:
+    from PyQt5 import QtGui
+except ImportError:
+    QtGui = None
+
+LABEL_SIZE = (640, 480)
+BOX = (200, 150, 220, 220)
+
+
+def to_qimage(image, bgr):
+    # 构造引用image数据的QImage；没有PyQt5时返回image本身
+    if QtGui is None:
+        return image
+    h, w, ch = image.shape
+    image_format = QtGui.QImage.Format_BGR888 if bgr else QtGui.QImage.Format_RGB888
+    return QtGui.QImage(image.data, w, h, ch * w, image_format)
+
+
+def copy_image(qimg):
+    # QImage.copy()或QPixmap.fromImage产生的一次完整复制
+    return qimg.copy() if QtGui is not None else np.array(qimg, copy=True)
+
+
+def baseline(frames):
+    # 改动前的显示路径，每个检测帧都生成预览
+    for frame in frames:
+        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        x, y, w, h = BOX
+        cv2.rectangle(rgb_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        qimg = copy_image(to_qimage(rgb_image, bgr=False))
+        pixmap = copy_image(qimg)
+        # setScaledContents在绘制时把全尺寸图像缩放到标签大小
+        if QtGui is None:
+            cv2.resize(pixmap, LABEL_SIZE, interpolation=cv2.INTER_LINEAR)
+        else:
+            pixmap.scaled(*LABEL_SIZE)
+
+
+def renderer_path(frames, detect_fps, preview_fps):
+    # 改动后的显示路径，用模拟时钟按检测帧率推进，预览限速到preview_fps
+    bgr = QtGui is None or hasattr(QtGui.QImage, "Format_BGR888")
+    renderer = PreviewRenderer(LABEL_SIZE, max_fps=preview_fps, bgr=bgr)
+    for index, frame in enumerate(frames):
+        if not renderer.due(now=index / detect_fps):
+            continue
+        image = renderer.render(frame, [BOX])
+        # 界面线程的QPixmap.fromImage复制的是已经缩小的图像
+        copy_image(to_qimage(image, bgr))
+    return renderer
+
+
+def cpu_per_frame(func, frames, *args):
+    start = time.process_time()
+    result = func(frames, *args)
+    return (time.process_time() - start) * 1000 / len(frames), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比显示路径改动前后每帧消耗的CPU时间")
+    parser.add_argument("--sizes", nargs='+', default=["640x480", "1280x720", "1920x1080"], help="摄像头分辨率")
+    parser.add_argument("--frames", type=int, default=300, help="每种分辨率处理的帧数")
+    parser.add_argument("--detect-fps", type=float, default=30.0, help="检测帧率（模拟时钟）")
+    parser.add_argument("--preview-fps", type=float, default=15.0, help="预览的最高帧率")
+    args = parser.parse_args()
+
+    print(f"Qt: {'PyQt5' if QtGui is not None else '未安装，使用numpy代替'}，标签大小 {LABEL_SIZE[0]}x{LABEL_SIZE[1]}")
+    print(f"{'分辨率':>10} {'改动前(ms)':>12} {'改动后(ms)':>12} {'不限速(ms)':>12} {'节省':>8}")
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split('x'))
+        base = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        frames = [base] * args.frames
+        before, _ = cpu_per_frame(baseline, frames)
+        after, _ = cpu_per_frame(renderer_path, frames, args.detect_fps, args.preview_fps)
+        unthrottled, _ = cpu_per_frame(renderer_path, frames, args.detect_fps, 0)
+        print(f"{size:>10} {before:12.3f} {after:12.3f} {unthrottled:12.3f} {1 - after / before:7.0%}")
+
+
+if __name__ == "__main__":
+    main()
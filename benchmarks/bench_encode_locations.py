@@ -0,0 +1,80 @@
+"""
+对比两种人脸特征提取方式的耗时：
+
+1. 旧方式：把Haar检测到的人脸区域裁剪出来交给face_recognition.face_encodings，编码器内部会在裁剪图上再检测一次人脸；
+2. 新方式：FaceEncoder.encode_face通过known_face_locations直接传入Haar人脸框，编码器跳过检测。
+
+用法：
+    python benchmarks/bench_encode_locations.py 图片1.jpg [图片2.jpg ...] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import face_recognition
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceEncoder import encode_face
+
+
+def encode_with_redetect(frame, box):
+    # 旧方式：只把人脸区域交给编码器，编码器内部重新检测人脸
+    x, y, w, h = box
+    rgb_face = cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2RGB)
+    face_encs = face_recognition.face_encodings(rgb_face)
+    return face_encs[0] if face_encs else None
+
+
+def time_call(func, frame, box, repeat):
+    # 返回平均耗时（毫秒）以及成功提取到特征编码的次数
+    success = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if func(frame, box) is not None:
+            success += 1
+    return (time.perf_counter() - start) * 1000 / repeat, success
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比重新检测与直接传入人脸框两种特征提取方式的耗时")
+    parser.add_argument("images", nargs="+", help="包含人脸的测试图片")
+    parser.add_argument("--repeat", type=int, default=20, help="每张图片重复的次数")
+    parser.add_argument("--cascade", default=os.path.join("XML", "haarcascade_frontalface_default.xml"),
+                        help="Haar人脸检测器文件路径")
+    args = parser.parse_args()
+
+    face_cascade = cv2.CascadeClassifier(args.cascade)
+    if face_cascade.empty():
+        print(f"无法加载人脸检测器文件: {args.cascade}")
+        sys.exit(1)
+
+    totals = {"redetect": [0.0, 0, 0], "known_locations": [0.0, 0, 0]}
+    for path in args.images:
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"跳过无法读取的图片: {path}")
+            continue
+        faces = face_cascade.detectMultiScale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1.3, 5)
+        if len(faces) == 0:
+            print(f"跳过未检测到人脸的图片: {path}")
+            continue
+        box = tuple(int(v) for v in faces[0])
+        for name, func in (("redetect", encode_with_redetect), ("known_locations", encode_face)):
+            ms, success = time_call(func, frame, box, args.repeat)
+            totals[name][0] += ms * args.repeat
+            totals[name][1] += success
+            totals[name][2] += args.repeat
+            print(f"{path}  {name:16s} {ms:8.2f} ms  成功 {success}/{args.repeat}")
+
+    for name, (total_ms, success, runs) in totals.items():
+        if runs:
+            print(f"平均 {name:16s} {total_ms / runs:8.2f} ms  成功率 {success / runs:.0%}")
+    if totals["redetect"][2] and totals["known_locations"][2]:
+        saved = (totals["redetect"][0] - totals["known_locations"][0]) / totals["redetect"][2]
+        print(f"每次特征提取平均节省 {saved:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+对比多人画面中逐张提取特征编码与EncoderPool多进程并行提取的耗时。
+
+对每张测试图片做一次Haar检测，得到画面中的全部人脸框，然后分别：
+1. 在当前线程中对每张人脸依次调用encode_face（改动前识别线程的做法）；
+2. 通过EncoderPool.encode_all把画面放入共享内存，由进程池并行提取全部人脸。
+人脸数量越多、CPU核心越多，并行提取的收益越明显；只有一张人脸时两者耗时接近（多出一次画面复制和进程间通信）。
+
+用法：
+    python benchmarks/bench_encode_pool.py 合影1.jpg [合影2.jpg ...] [--workers 4] [--repeat 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceEncoder import encode_face
+from EncoderPool import EncoderPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比逐张提取与多进程并行提取多人画面特征编码的耗时")
+    parser.add_argument("images", nargs="+", help="包含一张或多张人脸的测试图片")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核心数减1")
+    parser.add_argument("--repeat", type=int, default=10, help="每张图片重复的次数")
+    parser.add_argument("--cascade", default=os.path.join("XML", "haarcascade_frontalface_default.xml"),
+                        help="Haar人脸检测器文件路径")
+    args = parser.parse_args()
+
+    face_cascade = cv2.CascadeClassifier(args.cascade)
+    if face_cascade.empty():
+        print(f"无法加载人脸检测器文件: {args.cascade}")
+        sys.exit(1)
+
+    pool = EncoderPool(workers=args.workers)
+    pool.warm_up()
+    print(f"工作进程数: {pool.workers}")
+    print(f"{'图片':30s} {'人脸数':>6} {'逐张(ms)':>10} {'并行(ms)':>10} {'加速比':>8}")
+    try:
+        for path in args.images:
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"跳过无法读取的图片: {path}")
+                continue
+            boxes = [tuple(int(v) for v in box)
+                     for box in face_cascade.detectMultiScale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1.3, 5)]
+            if not boxes:
+                print(f"跳过未检测到人脸的图片: {path}")
+                continue
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                [encode_face(frame, box) for box in boxes]
+            serial = (time.perf_counter() - start) * 1000 / args.repeat
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                pool.encode_all(frame, boxes)
+            parallel = (time.perf_counter() - start) * 1000 / args.repeat
+
+            print(f"{os.path.basename(path):30s} {len(boxes):6d} {serial:10.1f} {parallel:10.1f} "
+                  f"{serial / parallel:7.2f}x")
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+比较近似检索索引（IVFIndex）与精确暴力检索（BruteForceIndex）的召回率和检索延迟。
+
+对--sizes中的每个人脸库大小生成合成人脸库（fixtures.synthetic_gallery），探针为人脸库中随机挑选的编码加上少量噪声
+（fixtures.probes_near，模拟同一个人的另一张照片）：
+1. brute：BruteForceIndex，召回率恒为1，作为延迟的参照；
+2. ivf：IVFIndex在不同nprobe下的recall@k（FaceIndex.measure_recall，相对于精确检索的前k条结果）和单次检索的延迟。
+另外给出IVF训练聚类中心的耗时，以及把索引保存到磁盘后重新加载（load_index）的耗时，后者即启动时不必重新训练的收益。
+
+门禁终端每次只检索画面中的一两张人脸，因此延迟按一次检索一个探针测量，取中位数。
+合成编码在128维空间中均匀分布，没有真实人脸编码那样的聚类结构，召回率是偏保守的估计。
+
+用法：
+    python benchmarks/bench_index.py [--sizes 10000 100000] [--nprobe 1 4 8 16 32] [--k 1 5] [--queries 200]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceIndex import BruteForceIndex, IVFIndex, load_index, measure_recall
+from fixtures import synthetic_gallery, probes_near
+
+
+def query_ms(index, queries, k):
+    # 逐个探针检索，返回单次检索耗时的中位数（毫秒）
+    index.search(queries[:1], k)
+    times = []
+    for probe in queries:
+        start = time.perf_counter()
+        index.search(probe[None, :], k)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较IVF近似检索与精确暴力检索的召回率和延迟")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10000, 100000], help="人脸库大小")
+    parser.add_argument("--nprobe", type=int, nargs='+', default=[1, 4, 8, 16, 32], help="IVF检索时访问的聚类数量")
+    parser.add_argument("--k", type=int, nargs='+', default=[1, 5], help="比较召回率的前k条结果")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF聚类数量，默认为sqrt(N)")
+    parser.add_argument("--queries", type=int, default=200, help="探针数量")
+    parser.add_argument("--noise", type=float, default=0.02, help="探针相对于人脸库编码的噪声")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="face_index_")
+    try:
+        print(f"{'表大小':>8} {'索引':>6} {'nprobe':>7} {'k':>3} {'recall@k':>9} {'ms/检索':>9} {'加速比':>7}")
+        for size in args.sizes:
+            _, _, matrix = synthetic_gallery(size, dtype=np.float32)
+            queries, _ = probes_near(matrix, args.queries, noise=args.noise)
+
+            brute = BruteForceIndex()
+            brute.rebuild(matrix)
+            brute_ms = {k: query_ms(brute, queries, k) for k in args.k}
+            for k in args.k:
+                print(f"{size:8d} {'brute':>6} {'':>7} {k:3d} {1.0:9.3f} {brute_ms[k]:9.3f} {1.0:7.1f}")
+
+            ivf = IVFIndex(nlist=args.nlist)
+            start = time.perf_counter()
+            ivf.rebuild(matrix)
+            train_ms = (time.perf_counter() - start) * 1000
+            for nprobe in args.nprobe:
+                ivf.nprobe = nprobe
+                for k in args.k:
+                    recall = measure_recall(ivf, queries, k)
+                    ms = query_ms(ivf, queries, k)
+                    print(f"{size:8d} {'ivf':>6} {nprobe:7d} {k:3d} {recall:9.3f} {ms:9.3f} {brute_ms[k] / ms:7.1f}")
+
+            path = os.path.join(workdir, f"index_{size}.npz")
+            ivf.save(path)
+            start = time.perf_counter()
+            load_index(path)
+            load_ms = (time.perf_counter() - start) * 1000
+            print(f"{size:8d} IVF聚类数 {len(ivf.centroids)}，训练 {train_ms:.0f} ms，从磁盘加载 {load_ms:.0f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
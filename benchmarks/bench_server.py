@@ -0,0 +1,88 @@
+"""
+识别服务（RecognitionServer.py）的负载测试：模拟多个摄像头客户端并发提交画面，统计吞吐量与延迟。
+
+每个客户端线程循环提交同一组测试画面（录像、图片或合成画面，见fixtures.load_frames），
+结束后打印客户端测得的延迟分位数，以及服务端 /stats 中按批大小统计的每批耗时、请求延迟和吞吐量。
+改变--clients可以观察并发增加时批大小的分布以及单个请求摊到的处理耗时。
+
+用法（先启动识别服务）：
+    python RecognitionServer.py --port 8620
+    python benchmarks/bench_server.py [--url http://127.0.0.1:8620] [--clients 1 4 8 16] [--requests 50]
+                                      [--video 录像.mp4 | --images 图片...] [--crop]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fixtures import load_frames
+
+
+def client(url, bodies, count, latencies, errors):
+    # 单个摄像头客户端：依次提交count个请求并记录每个请求的往返耗时
+    for i in range(count):
+        request = urllib.request.Request(url, data=bodies[i % len(bodies)],
+                                         headers={"Content-Type": "application/octet-stream"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+        except OSError as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run(url, bodies, clients, count):
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=client, args=(url, bodies, count, latencies, errors))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if not latencies:
+        print(f"{clients:8d} 所有请求都失败: {errors[:1]}")
+        return
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000
+    print(f"{clients:8d} {len(latencies) / elapsed:12.1f} {p50:10.2f} {p95:10.2f} {len(errors):8d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="识别服务的并发负载测试")
+    parser.add_argument("--url", default="http://127.0.0.1:8620", help="识别服务地址")
+    parser.add_argument("--clients", type=int, nargs='+', default=[1, 4, 8, 16], help="并发的客户端数量")
+    parser.add_argument("--requests", type=int, default=50, help="每个客户端提交的请求数")
+    parser.add_argument("--video", help="测试用的录像文件")
+    parser.add_argument("--images", nargs='+', default=[], help="测试用的图片文件")
+    parser.add_argument("--frames", type=int, default=20, help="使用的测试画面数量")
+    parser.add_argument("--crop", action="store_true", help="把测试画面当作裁剪好的人脸提交，跳过服务端检测")
+    args = parser.parse_args()
+
+    import cv2
+    frames, fixture = load_frames(args.video, args.images, limit=args.frames)
+    bodies = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in frames]
+    url = args.url.rstrip('/') + "/recognize" + ("?crop=1" if args.crop else "")
+    print(f"测试画面: {fixture}，共 {len(bodies)} 张")
+
+    print(f"{'clients':>8} {'req/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'errors':>8}")
+    for clients in args.clients:
+        run(url, bodies, clients, args.requests)
+
+    with urllib.request.urlopen(args.url.rstrip('/') + "/stats", timeout=10) as response:
+        print("服务端按批大小的统计：")
+        print(json.dumps(json.load(response), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
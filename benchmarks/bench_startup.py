@@ -0,0 +1,107 @@
+"""
+测量冷启动到“可以识别”的耗时：全量加载人脸库与从本地快照恢复的对比，以及导入特征提取模块的耗时。
+
+使用SQLite后端代替中心数据库，对--sizes中的每个表大小：
+1. full：FaceSync.bootstrap全量加载人脸库，然后完成第一次检索（改动前的启动方式）；
+2. snapshot：FaceSync.load_snapshot从上次保存的快照恢复人脸库，然后完成第一次检索，
+   另外单独列出后台与数据库核对快照（bootstrap）的耗时，核对期间识别不受影响；
+   核对前模拟快照保存之后另一台终端录入了--delta条记录。
+“到第一次检索”的时间即识别成功后可以发送开锁指令的最早时间（不含摄像头打开和特征提取）。
+
+最后在子进程中测量import FaceEncoder（不再导入face_recognition）和FaceEncoder.load_models（需要安装face_recognition）的耗时。
+
+用法：
+    python benchmarks/bench_startup.py [--sizes 1000 10000 100000] [--delta 10]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from FaceStorage import SQLiteFaceStorage
+from FaceTool import FaceTools
+from FaceGallery import FaceGallery
+from FaceSync import FaceSync
+
+
+def blob_rows(facetools, start, count, rng):
+    # 生成学号从start开始的count条记录，编码为二进制格式
+    matrix = rng.normal(scale=0.1, size=(count, 128)).astype(np.float32)
+    return [(str(100000 + start + i), f"person{start + i}", facetools.encoding_FaceBlob(v))
+            for i, v in enumerate(matrix)]
+
+
+def first_search_ms(path, snapshot_dir, probe, restore):
+    # 模拟一次启动：打开存储后端，恢复或加载人脸库，完成第一次检索，返回(到第一次检索的耗时, 核对耗时, 人脸数)
+    start = time.perf_counter()
+    storage = SQLiteFaceStorage(path)
+    gallery = FaceGallery(FaceTools(storage))
+    sync = FaceSync(gallery, storage, snapshot_dir=snapshot_dir)
+    if not (restore and sync.load_snapshot()):
+        sync.bootstrap()
+    gallery.search(probe[None, :], k=1)
+    ready_ms = (time.perf_counter() - start) * 1000
+    validate_ms = 0.0
+    if restore:
+        # 界面程序中这一步在FaceSync的后台线程中完成
+        start = time.perf_counter()
+        sync.bootstrap()
+        validate_ms = (time.perf_counter() - start) * 1000
+    return ready_ms, validate_ms, len(gallery)
+
+
+def import_ms(code):
+    # 在新的子进程中执行code，返回耗时（毫秒），失败时返回None
+    script = f"import sys, time; sys.path.insert(0, {ROOT!r}); t = time.perf_counter(); {code}; " \
+             f"print((time.perf_counter() - t) * 1000)"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较全量加载与从快照恢复人脸库的启动耗时")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 100000], help="face表中的记录数量")
+    parser.add_argument("--delta", type=int, default=10, help="快照保存之后其他终端新录入的记录数")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    writer = FaceTools(None)
+    workdir = tempfile.mkdtemp(prefix="face_startup_")
+    try:
+        print(f"{'表大小':>8} {'方式':>9} {'到第一次检索 ms':>16} {'后台核对 ms':>12} {'人脸数':>8}")
+        for size in args.sizes:
+            path = os.path.join(workdir, f"face_{size}.db")
+            snapshot_dir = os.path.join(workdir, f"snapshot_{size}")
+            storage = SQLiteFaceStorage(path)
+            storage.saveFaceDataBatch(blob_rows(writer, 0, size, rng), chunk_size=5000)
+            probe = rng.normal(scale=0.1, size=128)
+
+            # 上一次运行：全量加载后保存快照，之后其他终端又录入了delta条记录
+            ready_ms, _, count = first_search_ms(path, snapshot_dir, probe, restore=False)
+            storage.saveFaceDataBatch(blob_rows(writer, size, args.delta, rng), chunk_size=5000)
+            print(f"{size:8d} {'full':>9} {ready_ms:16.2f} {'':>12} {count:8d}")
+            ready_ms, validate_ms, count = first_search_ms(path, snapshot_dir, probe, restore=True)
+            print(f"{size:8d} {'snapshot':>9} {ready_ms:16.2f} {validate_ms:12.2f} {count:8d}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    encoder_ms = import_ms("import FaceEncoder")
+    models_ms = import_ms("import FaceEncoder; FaceEncoder.load_models()")
+    print(f"import FaceEncoder: {encoder_ms:.0f} ms" if encoder_ms is not None else "import FaceEncoder 失败")
+    if models_ms is not None:
+        print(f"import FaceEncoder + load_models（后台线程中完成）: {models_ms:.0f} ms")
+    else:
+        print("未安装face_recognition，跳过模型加载耗时")
+
+
+if __name__ == "__main__":
+    main()
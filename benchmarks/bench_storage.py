@@ -0,0 +1,82 @@
+"""
+对比不同存储后端加载人脸库和查询记录的耗时。
+
+使用随机生成的人脸编码填充各个后端，然后分别测量：
+- 加载：FaceTools.load_face_matrix 得到 (N, 128) 特征矩阵的时间；
+- 查询：record_exists 单次查询的平均时间。
+
+默认只测试 SQLite 与内存映射快照两个嵌入式后端；加上 --mysql 时同时测试 FaceSQL（会向 face 表写入测试数据，请使用测试库）。
+
+用法：
+    python benchmarks/bench_storage.py [--rows 10000] [--lookups 1000] [--mysql]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceStorage import SQLiteFaceStorage, SnapshotFaceStorage
+from FaceTool import FaceTools
+
+
+def synthetic_rows(count, seed=0):
+    # 生成count条学号、姓名互不相同的随机人脸数据
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(scale=0.1, size=(count, 128)).astype(np.float32)
+    ids = [str(100000 + i) for i in range(count)]
+    names = [f"person{i}" for i in range(count)]
+    return ids, names, matrix
+
+
+def measure(name, storage, ids, lookups):
+    facetools = FaceTools(storage)
+    start = time.perf_counter()
+    loaded_ids, _, matrix = facetools.load_face_matrix()
+    # 访问一次矩阵数据，保证内存映射的页面被真正读入
+    float(np.asarray(matrix).sum())
+    load_ms = (time.perf_counter() - start) * 1000
+    rng = np.random.default_rng(1)
+    keys = [ids[i] for i in rng.integers(0, len(ids), lookups)]
+    start = time.perf_counter()
+    for key in keys:
+        storage.record_exists(key, "")
+    lookup_us = (time.perf_counter() - start) * 1e6 / lookups
+    print(f"{name:10s} 加载 {len(loaded_ids):8d} 条 {load_ms:10.1f} ms    record_exists {lookup_us:10.1f} us/次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比不同存储后端的加载与查询耗时")
+    parser.add_argument("--rows", type=int, default=10000, help="人脸记录数量")
+    parser.add_argument("--lookups", type=int, default=1000, help="record_exists查询次数")
+    parser.add_argument("--mysql", action="store_true", help="同时测试MySQL后端（写入测试数据）")
+    args = parser.parse_args()
+
+    ids, names, matrix = synthetic_rows(args.rows)
+    workdir = tempfile.mkdtemp(prefix="face_bench_")
+    try:
+        writer = FaceTools(None)
+        blobs = [(i, n, writer.encoding_FaceBlob(v)) for i, n, v in zip(ids, names, matrix)]
+
+        sqlite = SQLiteFaceStorage(os.path.join(workdir, "face.db"))
+        sqlite.saveFaceDataBatch(blobs, chunk_size=5000)
+        measure("sqlite", sqlite, ids, args.lookups)
+
+        SnapshotFaceStorage.write(os.path.join(workdir, "snapshot"), ids, names, matrix)
+        measure("snapshot", SnapshotFaceStorage(os.path.join(workdir, "snapshot")), ids, args.lookups)
+
+        if args.mysql:
+            from FaceSQL import FaceSQL
+            mysql = FaceSQL()
+            mysql.saveFaceDataBatch(blobs, chunk_size=1000)
+            measure("mysql", mysql, ids, args.lookups)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+识别流水线的可重复基准测试，不需要摄像头、串口或MySQL。
+
+依次测量以下阶段，结果写入JSON文件，便于在不同提交之间比较：
+- decode：decoding_FaceStr 解码单条二进制编码和旧文本编码的耗时；
+- load：从内存存储后端（代替FaceSQL）加载人脸库，分别测量 load_face_matrix 与 load_faceofdatabase；
+- detect：检测线程每帧的工作（原 update_frame 中的全画面Haar检测，以及 FaceDetector 流水线）；
+- encode：encode_face 提取单张人脸特征编码（需要安装face_recognition，并提供含人脸的视频或图片）；
+- match：在不同规模的合成人脸库中检索最近记录，与逐行计算距离的 face_distance 方式对比。
+
+用法：
+    python benchmarks/bench_suite.py [--sizes 100 1000 10000 100000 1000000] [--load-sizes 100 1000 10000 100000]
+                                     [--video 录像.mp4 | --images 图片...] [--output bench_results.json]
+                                     [--compare 旧结果.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceTool import FaceTools
+from FaceMatcher import FaceMatcher
+from fixtures import synthetic_gallery, probes_near, memory_storage, load_frames
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(func, repeat):
+    # 调用func共repeat次，返回每次耗时（秒）的最小值和中位数
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def result(stage, name, size, seconds, per=1, unit="ms"):
+    # 生成一条结果记录，per为一次计时中包含的操作次数，记录的是单次操作的耗时
+    best, median = seconds
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    record = dict(stage=stage, name=name, size=size, unit=unit,
+                  best=round(best * scale / per, 4), median=round(median * scale / per, 4))
+    print(f"{stage:7s} {name:28s} {size if size is not None else '':>9} "
+          f"{record['best']:12.4f} {record['median']:12.4f} {unit}")
+    return record
+
+
+def bench_decode(facetools, repeat):
+    _, _, matrix = synthetic_gallery(10000)
+    blobs = [facetools.encoding_FaceBlob(v) for v in matrix]
+    texts = [facetools.encoding_FaceStr(v) for v in matrix]
+    return [
+        result("decode", "blob", None, measure(lambda: [facetools.decoding_FaceStr(b) for b in blobs], repeat),
+               per=len(blobs), unit="us"),
+        result("decode", "text", None, measure(lambda: [facetools.decoding_FaceStr(t) for t in texts], repeat),
+               per=len(texts), unit="us"),
+    ]
+
+
+def bench_load(sizes, repeat):
+    results = []
+    writer = FaceTools(None)
+    for size in sizes:
+        ids, names, matrix = synthetic_gallery(size)
+        for binary in (True, False):
+            facetools = FaceTools(memory_storage(writer, ids, names, matrix, binary=binary))
+            label = "blob" if binary else "text"
+            results.append(result("load", f"load_face_matrix/{label}", size,
+                                  measure(facetools.load_face_matrix, repeat)))
+            results.append(result("load", f"load_faceofdatabase/{label}", size,
+                                  measure(facetools.load_faceofdatabase, repeat)))
+    return results
+
+
+def resolve_cascade(path):
+    # 默认使用仓库XML目录中的检测器文件，不存在时改用OpenCV安装包自带的同名文件
+    if path is None:
+        path = os.path.join(REPO_ROOT, "XML", "haarcascade_frontalface_default.xml")
+        if not os.path.exists(path):
+            import cv2
+            path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+    return path
+
+
+def bench_detect(frames, cascade_path, repeat):
+    import cv2
+    from FaceDetector import FaceDetector
+    face_cascade = cv2.CascadeClassifier(cascade_path)
+    if face_cascade.empty():
+        print(f"无法加载人脸检测器文件 {cascade_path}，跳过detect阶段")
+        return []
+
+    def update_frame_baseline():
+        # 与改动前update_frame中每帧的处理相同：全画面灰度检测，再转换为RGB并绘制人脸框
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            for (x, y, w, h) in faces:
+                cv2.rectangle(rgb, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+    def detection_worker():
+        # 与DetectionWorker.run中每帧的处理相同（不含QImage转换）
+        detector = FaceDetector(face_cascade)
+        for frame in frames:
+            faces = detector.detect(frame)
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            for (x, y, w, h) in faces[:1]:
+                cv2.rectangle(rgb, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+    return [
+        result("detect", "update_frame_baseline", None, measure(update_frame_baseline, repeat), per=len(frames)),
+        result("detect", "detection_worker", None, measure(detection_worker, repeat), per=len(frames)),
+    ]
+
+
+def bench_encode(frames, cascade_path, repeat):
+    try:
+        import cv2
+        from FaceEncoder import encode_face, load_models
+        # FaceEncoder在第一次提取编码时才导入face_recognition，这里提前加载，没有安装时跳过本阶段
+        load_models()
+    except ImportError as e:
+        print(f"未安装face_recognition（{e}），跳过encode阶段")
+        return []
+    face_cascade = cv2.CascadeClassifier(cascade_path)
+    faces = []
+    for frame in frames:
+        boxes = face_cascade.detectMultiScale(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), 1.3, 5)
+        if len(boxes):
+            faces.append((frame, tuple(int(v) for v in boxes[0])))
+    if not faces:
+        print("测试画面中没有检测到人脸，跳过encode阶段")
+        return []
+    faces = faces[:20]
+    return [result("encode", "encode_face", None,
+                   measure(lambda: [encode_face(frame, box) for frame, box in faces], repeat), per=len(faces))]
+
+
+def bench_match(sizes, repeat, batch=8):
+    results = []
+    for size in sizes:
+        _, _, matrix = synthetic_gallery(size, dtype=np.float32)
+        probes, rows = probes_near(matrix, batch)
+        results.append(result("match", "build_matcher", size, measure(lambda: FaceMatcher(matrix), 1)))
+        matcher = FaceMatcher(matrix)
+        hits = sum(r[0][0] == row for r, row in zip(matcher.top_k(probes, k=1), rows))
+        if hits != batch:
+            print(f"警告：规模{size}时只有{hits}/{batch}个探针找到了正确的记录")
+        results.append(result("match", "top1_single", size,
+                              measure(lambda: [matcher.top_k(p, k=1) for p in probes], repeat), per=batch))
+        results.append(result("match", f"top1_batch{batch}", size,
+                              measure(lambda: matcher.top_k(probes, k=1), repeat), per=batch))
+        if size <= 100000:
+            # 改动前的方式：对每个探针用face_distance（逐行相减后求范数）计算到所有记录的距离
+            results.append(result("match", "face_distance_baseline", size,
+                                  measure(lambda: [np.linalg.norm(matrix - p, axis=1).argmin() for p in probes],
+                                          repeat), per=batch))
+        del matcher, matrix
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    # 与旧结果逐项比较中位数，比值大于1表示变慢
+    with open(path, encoding='utf-8') as f:
+        old = {(r["stage"], r["name"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\n与 {path} 比较（中位数，当前/旧）：")
+    for r in results:
+        before = old.get((r["stage"], r["name"], r["size"]))
+        if before and before["median"] > 0:
+            ratio = r["median"] / before["median"]
+            flag = "  <-- 变慢" if ratio > 1.2 else ""
+            print(f"{r['stage']:7s} {r['name']:28s} {r['size'] if r['size'] is not None else '':>9} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="识别流水线的可重复基准测试")
+    parser.add_argument("--stages", nargs='+', default=["decode", "load", "detect", "encode", "match"],
+                        help="要运行的阶段")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[100, 1000, 10000, 100000, 1000000],
+                        help="match阶段的人脸库规模")
+    parser.add_argument("--load-sizes", type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help="load阶段的人脸库规模")
+    parser.add_argument("--video", help="测试用的录像文件")
+    parser.add_argument("--images", nargs='+', default=[], help="测试用的图片文件")
+    parser.add_argument("--frames", type=int, default=100, help="detect阶段使用的帧数")
+    parser.add_argument("--cascade", default=None,
+                        help="Haar人脸检测器文件路径，默认为XML/haarcascade_frontalface_default.xml")
+    parser.add_argument("--repeat", type=int, default=5, help="每项测试重复的次数")
+    parser.add_argument("--output", default="bench_results.json", help="结果JSON文件路径")
+    parser.add_argument("--compare", help="与之比较的旧结果JSON文件")
+    args = parser.parse_args()
+
+    print(f"{'stage':7s} {'name':28s} {'size':>9} {'best':>12} {'median':>12}")
+    results = []
+    fixture = None
+    if "decode" in args.stages:
+        results += bench_decode(FaceTools(None), args.repeat)
+    if "load" in args.stages:
+        results += bench_load(args.load_sizes, min(args.repeat, 3))
+    if "detect" in args.stages or "encode" in args.stages:
+        frames, fixture = load_frames(args.video, args.images, limit=args.frames)
+        cascade = resolve_cascade(args.cascade)
+        if "detect" in args.stages:
+            results += bench_detect(frames, cascade, min(args.repeat, 3))
+        if "encode" in args.stages:
+            results += bench_encode(frames, cascade, min(args.repeat, 3))
+    if "match" in args.stages:
+        results += bench_match(args.sizes, args.repeat)
+
+    report = dict(
+        meta=dict(
+            commit=git_commit(),
+            time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            python=platform.python_version(),
+            numpy=np.__version__,
+            machine=platform.machine(),
+            processor=platform.processor(),
+            cpu_count=os.cpu_count(),
+            fixture=fixture,
+            args=vars(args),
+        ),
+        results=results,
+    )
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+测量FaceSync增量同步的耗时与face表大小、变化数量之间的关系。
+
+使用SQLite后端代替中心数据库：先写入--sizes指定数量的记录并完成bootstrap，
+然后在“另一台终端”上录入和删除--deltas指定数量的记录，测量一次poll的耗时，并与全量重新加载（FaceGallery.load）对比。
+增量同步的耗时应当只随变化数量增长，基本不随表的大小变化。
+例外是加载后的第一次删除：人脸库需要复制一次共享的特征矩阵（见FaceGallery.remove），耗时与表的大小成正比。
+
+用法：
+    python benchmarks/bench_sync.py [--sizes 1000 10000 100000] [--deltas 0 10 100 1000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceStorage import SQLiteFaceStorage
+from FaceTool import FaceTools
+from FaceGallery import FaceGallery
+from FaceSync import FaceSync
+
+
+def blob_rows(facetools, start, count, rng):
+    # 生成学号从start开始的count条记录，编码为二进制格式
+    matrix = rng.normal(scale=0.1, size=(count, 128)).astype(np.float32)
+    return [(str(100000 + start + i), f"person{start + i}", facetools.encoding_FaceBlob(v))
+            for i, v in enumerate(matrix)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量增量同步耗时与表大小、变化数量的关系")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000, 10000, 100000], help="face表中的记录数量")
+    parser.add_argument("--deltas", type=int, nargs='+', default=[0, 10, 100, 1000], help="两次同步之间的变化数量")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    writer = FaceTools(None)
+    workdir = tempfile.mkdtemp(prefix="face_sync_")
+    try:
+        for size in args.sizes:
+            path = os.path.join(workdir, f"face_{size}.db")
+            storage = SQLiteFaceStorage(path)
+            storage.saveFaceDataBatch(blob_rows(writer, 0, size, rng), chunk_size=5000)
+            gallery = FaceGallery(FaceTools(storage))
+            sync = FaceSync(gallery, storage, lookback=0)
+            sync.bootstrap()
+
+            start = time.perf_counter()
+            gallery.load()
+            load_ms = (time.perf_counter() - start) * 1000
+            print(f"表大小 {size:8d}  全量加载 {load_ms:10.2f} ms")
+
+            # 模拟另一台终端：一半变化为新录入，一半为删除
+            other = SQLiteFaceStorage(path)
+            next_id = size
+            for delta in args.deltas:
+                inserts = delta - delta // 2
+                other.saveFaceDataBatch(blob_rows(writer, next_id, inserts, rng), chunk_size=5000)
+                next_id += inserts
+                for i in range(delta // 2):
+                    other.deleteFaceData(gallery.ids[i])
+                added, removed = sync.poll()
+                print(f"    变化 {delta:6d}  增量同步 {sync.last_poll_ms:10.2f} ms  (新增 {added}, 删除 {removed}, 人脸库 {len(gallery)})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+基于伪终端（pty）的假门锁控制器，用于在Linux上不接硬件测试串口开锁通道（SerialChannel.py）。
+
+假设备打开一对伪终端，从主端读取上位机发来的 open，按参数延迟后回复 ok（或 err、或不回复），
+启动时和模拟复位后发送 ready。从端路径（例如/dev/pts/5）可以像真实串口一样交给界面程序或FaceService使用：
+
+    python benchmarks/fake_lock.py
+    FACE_SERIAL_PORT=/dev/pts/5 FACE_SERIAL_ACK=1 python UIDesign0.py
+    python FaceService.py --serial /dev/pts/5 --serial-ack
+
+加上--bench时不等待外部程序，直接用SerialChannel连续发送--unlocks次开锁请求，打印开锁延迟的分位数、
+超时和重连次数；--unplug-every N表示每N次开锁后“拔掉”一次设备（关闭伪终端并换一个新的），验证断线重连：
+
+    python benchmarks/fake_lock.py --bench [--unlocks 200] [--delay 0.005] [--silent-rate 0.05] [--unplug-every 50]
+"""
+import argparse
+import os
+import pty
+import random
+import select
+import statistics
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from SerialChannel import SerialChannel, SERIAL_RECONNECTS_TOTAL
+
+
+# 定义一个名为FakeLock的类，在后台线程中扮演门锁控制器
+class FakeLock:
+    def __init__(self, delay=0.005, silent_rate=0.0, error_rate=0.0, seed=0):
+        """
+        类的构造函数。
+
+        参数:
+        - delay: 收到open后多久回复（秒），模拟继电器动作时间，默认为5毫秒。
+        - silent_rate: 不回复的概率，模拟丢包或控制器正忙，默认为0。
+        - error_rate: 回复err的概率，默认为0。
+        - seed: 随机数种子。
+        """
+        self.delay = delay
+        self.silent_rate = silent_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.opens = 0
+        self.master = None
+        self.path = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def _open_pty(self):
+        master, slave = pty.openpty()
+        # 关闭回显和行缓冲，伪终端的行为与真实串口一致
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        # 从端保持打开，上位机关闭串口时主端不会读到EOF
+        self._slave = slave
+        self.master = master
+        os.write(master, b"ready\n")
+
+    def start(self):
+        self._open_pty()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self.path
+
+    def unplug(self):
+        """
+        模拟拔掉再插上设备：关闭当前伪终端，换一个新的从端路径，上位机需要重新打开串口。
+        """
+        with self._lock:
+            os.close(self.master)
+            os.close(self._slave)
+            self._open_pty()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        os.close(self.master)
+        os.close(self._slave)
+
+    def _run(self):
+        buffer = b""
+        while self._running:
+            with self._lock:
+                master = self.master
+                ready, _, _ = select.select([master], [], [], 0.05)
+                if not ready:
+                    continue
+                try:
+                    buffer += os.read(master, 1024)
+                except OSError:
+                    continue
+                # 上位机发送的open不带换行，直接在数据流中查找
+                while b"open" in buffer:
+                    buffer = buffer[buffer.index(b"open") + 4:]
+                    self.opens += 1
+                    roll = self.random.random()
+                    if roll < self.silent_rate:
+                        continue
+                    time.sleep(self.delay)
+                    os.write(master, b"err\n" if roll < self.silent_rate + self.error_rate else b"ok\n")
+
+
+# 定义一个名为PtyTransport的类，直接用os读写伪终端从端，不依赖pyserial或Qt，仅供本脚本测试使用
+class PtyTransport:
+    def __init__(self, lock):
+        self.lock = lock
+        self.name = None
+        self.fd = None
+
+    def open(self):
+        self.name = self.lock.path
+        try:
+            self.fd = os.open(self.name, os.O_RDWR | os.O_NOCTTY)
+        except OSError as e:
+            raise OSError(f"无法打开 {self.name}: {e}") from e
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def write(self, data):
+        os.write(self.fd, data)
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            # 伪终端的主端关闭后从端仍然可以写入，这里检查设备是否已被换掉，模拟串口被拔出时的ResourceError
+            if self.lock.path != self.name:
+                raise OSError("设备已断开")
+            return b""
+        data = os.read(self.fd, 1024)
+        if not data:
+            raise OSError("设备已断开")
+        return data
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench(args):
+    lock = FakeLock(args.delay, args.silent_rate, args.error_rate)
+    lock.start()
+    channel = SerialChannel(PtyTransport(lock), require_ack=True, ack_timeout=args.ack_timeout,
+                            reopen_interval=0.05, max_reopen_interval=0.5)
+    latencies = []
+    failures = []
+    done = threading.Semaphore(0)
+    channel.on_unlocked = lambda latency: (latencies.append(latency), done.release())
+    channel.on_failed = lambda message: (failures.append(message), done.release())
+    channel.start()
+    reconnects = SERIAL_RECONNECTS_TOTAL.value
+    start = time.perf_counter()
+    for i in range(args.unlocks):
+        if args.unplug_every and i and i % args.unplug_every == 0:
+            lock.unplug()
+        channel.send_open()
+        # 逐个等待结果，模拟相隔数秒的开锁请求，避免被合并
+        done.acquire()
+    elapsed = time.perf_counter() - start
+    channel.stop()
+    lock.stop()
+
+    print(f"开锁请求 {args.unlocks} 次，成功 {len(latencies)} 次，失败 {len(failures)} 次，"
+          f"发送 {channel.sent} 条指令，重连 {SERIAL_RECONNECTS_TOTAL.value - reconnects:.0f} 次，用时 {elapsed:.1f} 秒")
+    if latencies:
+        ms = [v * 1000 for v in latencies]
+        print(f"开锁延迟 ms：p50 {statistics.median(ms):.2f}  p95 {percentile(ms, 0.95):.2f}  "
+              f"p99 {percentile(ms, 0.99):.2f}  max {max(ms):.2f}")
+    for message in sorted(set(failures)):
+        print(f"  {failures.count(message)} 次：{message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于伪终端的假门锁控制器，以及串口开锁通道的延迟测试")
+    parser.add_argument("--delay", type=float, default=0.005, help="收到open后多久回复ok（秒）")
+    parser.add_argument("--silent-rate", type=float, default=0.0, help="不回复的概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回复err的概率")
+    parser.add_argument("--bench", action="store_true", help="直接用SerialChannel测试开锁延迟，而不是等待外部程序连接")
+    parser.add_argument("--unlocks", type=int, default=200, help="--bench时的开锁次数")
+    parser.add_argument("--ack-timeout", type=float, default=0.2, help="--bench时等待应答的时间（秒）")
+    parser.add_argument("--unplug-every", type=int, default=0, help="--bench时每隔多少次开锁拔掉一次设备，0表示不拔")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args)
+        return
+    lock = FakeLock(args.delay, args.silent_rate, args.error_rate)
+    path = lock.start()
+    print(f"假门锁控制器已就绪：{path}（Ctrl+C退出）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    lock.stop()
+    print(f"共收到 {lock.opens} 次开锁指令")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+基准测试使用的测试数据：合成人脸库、内存中的存储后端以及测试画面。
+
+这些工具只依赖numpy（测试画面另需cv2），不需要摄像头、串口或MySQL。
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceStorage import FaceStorage, DuplicateRecordError
+
+
+def synthetic_gallery(count, seed=0, dtype=np.float64):
+    """
+    生成count条学号、姓名互不相同的随机人脸数据，返回(ids, names, (count, 128)矩阵)。
+
+    编码服从均值为0、标准差为0.1的正态分布，向量长度约为1.1，与face_recognition输出的编码处于同一量级；
+    相同的seed总是生成相同的数据，保证不同提交之间的测试结果可以比较。
+    """
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(scale=0.1, size=(count, 128)).astype(dtype)
+    ids = [str(100000 + i) for i in range(count)]
+    names = [f"person{i}" for i in range(count)]
+    return ids, names, matrix
+
+
+def probes_near(matrix, count, noise=0.02, seed=1):
+    """
+    从人脸库中随机挑选count条编码并加入少量噪声，模拟同一个人的另一张照片，返回(探针矩阵, 对应的行号)。
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(matrix), count)
+    return matrix[rows] + rng.normal(scale=noise, size=(count, matrix.shape[1])).astype(matrix.dtype), rows
+
+
+# 定义一个名为MemoryFaceStorage的类，在内存中模拟FaceSQL的行为（包括唯一约束），供基准测试代替MySQL使用
+class MemoryFaceStorage(FaceStorage):
+    def __init__(self, rows=()):
+        """
+        类的构造函数。
+
+        参数:
+        - rows: 初始记录，由(id, name, encoding)元组组成，encoding为与数据库中相同的存储格式（二进制或逗号分隔字符串）。
+        """
+        self.rows = []
+        self._ids = set()
+        self._names = set()
+        for row in rows:
+            self._insert(row)
+
+    def _insert(self, row):
+        id_val, name_val, _ = row
+        if id_val in self._ids or name_val in self._names:
+            raise DuplicateRecordError("该学号或姓名已存在")
+        self.rows.append(tuple(row))
+        self._ids.add(id_val)
+        self._names.add(name_val)
+
+    def saveFaceData(self, id_val, name_val, encoding_str):
+        self._insert((id_val, name_val, encoding_str))
+        return True
+
+    def saveFaceDataBatch(self, rows, chunk_size=500):
+        saved = []
+        failed = []
+        for row in rows:
+            try:
+                self._insert(row)
+                saved.append(row)
+            except DuplicateRecordError as e:
+                failed.append((row, e))
+        return saved, failed
+
+    def allFaceData(self):
+        return list(self.rows)
+
+    def countFaceData(self):
+        return len(self.rows)
+
+    def iterFaceData(self, chunk_size=1000):
+        for start in range(0, len(self.rows), chunk_size):
+            yield self.rows[start:start + chunk_size]
+
+    def allFaceKeys(self):
+        return [(id_val, name_val) for id_val, name_val, _ in self.rows]
+
+    def record_exists(self, id_val, name_val):
+        return id_val in self._ids or name_val in self._names
+
+    def encodingColumnIsBinary(self):
+        return bool(self.rows) and isinstance(self.rows[0][2], (bytes, bytearray))
+
+
+def memory_storage(facetools, ids, names, matrix, binary=True):
+    """
+    把合成人脸库编码为数据库中的存储格式并放入MemoryFaceStorage。
+
+    参数:
+    - binary: 为True时使用二进制编码（encoding_FaceBlob），否则使用旧的逗号分隔字符串（encoding_FaceStr）。
+    """
+    encode = facetools.encoding_FaceBlob if binary else facetools.encoding_FaceStr
+    return MemoryFaceStorage((i, n, encode(v)) for i, n, v in zip(ids, names, matrix))
+
+
+def load_frames(video=None, images=(), limit=100, seed=0, size=(480, 640)):
+    """
+    读取测试画面（BGR格式），返回(画面列表, 来源说明)。
+
+    优先使用录制的视频，其次使用图片文件；两者都没有提供时生成固定种子的合成画面（平滑的随机纹理），
+    合成画面中没有人脸，只能用来测量检测本身的开销。
+    """
+    import cv2
+    if video:
+        cap = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames, f"video:{os.path.basename(video)}"
+    if images:
+        frames = [frame for frame in (cv2.imread(path) for path in images[:limit]) if frame is not None]
+        return frames, f"images:{len(frames)}"
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(limit):
+        noise = rng.integers(0, 256, size=(size[0] // 8, size[1] // 8, 3), dtype=np.uint8)
+        frames.append(cv2.resize(noise, (size[1], size[0]), interpolation=cv2.INTER_CUBIC))
+    return frames, "synthetic"